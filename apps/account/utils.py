@@ -9,6 +9,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
+from apps.core.utils.mail_pool import mail_pool
 from .models import VerifyOTP
 
 
@@ -133,7 +134,7 @@ class EmailThread(threading.Thread):
                 to=self.recipient_list,
             )
             email.content_subtype = 'html'
-            email.send(fail_silently=False)
+            mail_pool.send_messages([email])
         except Exception as e:
             print(e)
             raise ValidationError(f"Email not sent: {e}") from e
@@ -184,7 +185,7 @@ def send_login_or_logout_email(user, request, action:str):
 
         email = EmailMultiAlternatives(subject, '', from_email, to_email)
         email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=False)
+        mail_pool.send_messages([email])
     except Exception as e:
         print(e)
         raise ValidationError(f'{action} mail for {user.email} not sent {e}')
@@ -1,3 +1,18 @@
 from django.contrib import admin
-
+from .models import DeliveryLatencyStat, MessageDailyStat, MessageHourlyStat
 # Register your models here.
+
+
+@admin.register(MessageDailyStat)
+class MessageDailyStatAdmin(admin.ModelAdmin):
+    list_display = ('day', 'user', 'route', 'status', 'count')
+
+
+@admin.register(MessageHourlyStat)
+class MessageHourlyStatAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'user', 'route', 'status', 'count')
+
+
+@admin.register(DeliveryLatencyStat)
+class DeliveryLatencyStatAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'user', 'route', 'count')
@@ -1,5 +1,6 @@
-from drf_spectacular.utils import OpenApiExample, extend_schema
-from apps.analytics.serializers import DashboardMetricsSerializer
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
+from apps.analytics.serializers import DashboardMetricsSerializer, DeliveryLatencySerializer, TimeseriesSerializer
 
 dashboard_metric_doc = extend_schema(
     "Dashboard metrics",
@@ -41,3 +42,76 @@ dashboard_metric_doc = extend_schema(
         )
     ],
 )
+
+
+dashboard_timeseries_doc = extend_schema(
+    "Dashboard timeseries",
+    description=(
+        "Messages queued, sent and failed per bucket, for ranges up to a year.\n\n"
+        "Buckets are computed from hourly counts in the requested timezone, "
+        "`queued` counts accepted messages, `sent` deliveries and `failed` messages that gave up."
+    ),
+    parameters=[
+        OpenApiParameter("from", OpenApiTypes.DATETIME, OpenApiParameter.QUERY,
+                         description="Start of the range, defaults to 7 days before `to`"),
+        OpenApiParameter("to", OpenApiTypes.DATETIME, OpenApiParameter.QUERY,
+                         description="End of the range (exclusive), defaults to now"),
+        OpenApiParameter("bucket", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                         enum=["hour", "day", "week"], description="Defaults to `day`"),
+        OpenApiParameter("route", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                         description="Only count messages of this route"),
+        OpenApiParameter("tz", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                         description="IANA timezone of the buckets, e.g. `Africa/Lagos`, defaults to UTC"),
+    ],
+    responses=TimeseriesSerializer,
+    examples=[
+        OpenApiExample(
+            "Timeseries Example",
+            value={
+                "start": "2026-04-15T00:00:00+01:00",
+                "end": "2026-04-17T00:00:00+01:00",
+                "bucket": "day",
+                "tz": "Africa/Lagos",
+                "route": None,
+                "series": [
+                    {"start": "2026-04-15T00:00:00+01:00", "queued": 120, "sent": 118, "failed": 2},
+                    {"start": "2026-04-16T00:00:00+01:00", "queued": 95, "sent": 95, "failed": 0},
+                ],
+            },
+        )
+    ],
+)
+
+
+dashboard_latency_doc = extend_schema(
+    "Dashboard delivery latency",
+    description=(
+        "p50/p95/p99 time in milliseconds between a message being accepted and delivered, "
+        "for all routes and per route (slowest p95 first). Percentiles are accurate to about 1%."
+    ),
+    parameters=[
+        OpenApiParameter("from", OpenApiTypes.DATETIME, OpenApiParameter.QUERY,
+                         description="Start of the range, defaults to 7 days before `to`"),
+        OpenApiParameter("to", OpenApiTypes.DATETIME, OpenApiParameter.QUERY,
+                         description="End of the range (exclusive), defaults to now"),
+        OpenApiParameter("route", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                         description="Only this route"),
+        OpenApiParameter("tz", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                         description="Timezone of `from`/`to` without an offset, defaults to UTC"),
+    ],
+    responses=DeliveryLatencySerializer,
+    examples=[
+        OpenApiExample(
+            "Latency Example",
+            value={
+                "start": "2026-04-10T00:00:00Z",
+                "end": "2026-04-17T00:00:00Z",
+                "overall": {"count": 1520, "p50": 2150, "p95": 8400, "p99": 31200},
+                "routes": [
+                    {"route_id": 1, "route_label": "contact", "count": 1200,
+                     "p50": 2300, "p95": 9100, "p99": 33000},
+                ],
+            },
+        )
+    ],
+)
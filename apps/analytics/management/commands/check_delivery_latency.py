@@ -0,0 +1,55 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.analytics.models import DeliveryLatencyStat
+from apps.analytics.services import merged_latency_sketches, utc_hour
+from apps.core.models import Notification, NotificationType
+from apps.messaging.models import Route
+from apps.messaging.services.notification_service import MessagingNotificationService
+
+
+class Command(BaseCommand):
+    help = ("Notify route owners whose delivery latency p95 is above DELIVERY_LATENCY_ALERT_P95_MS "
+            "(run every few minutes from cron)")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window", type=int, default=settings.DELIVERY_LATENCY_ALERT_WINDOW,
+            help="Minutes of deliveries to look at, rounded to whole hours")
+        parser.add_argument(
+            "--threshold-ms", type=int, default=settings.DELIVERY_LATENCY_ALERT_P95_MS)
+        parser.add_argument(
+            "--min-count", type=int, default=settings.DELIVERY_LATENCY_ALERT_MIN_COUNT,
+            help="Ignore routes with fewer deliveries in the window")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(minutes=options["window"])
+        sketches = merged_latency_sketches(
+            DeliveryLatencyStat.objects.filter(hour__gte=utc_hour(since)))
+
+        slow = {
+            route_id: sketch for route_id, sketch in sketches.items()
+            if sketch.count >= options["min_count"]
+            and sketch.quantile(0.95) > options["threshold_ms"]
+        }
+        # one alert per route and window
+        already_alerted = set(Notification.objects.filter(
+            type=NotificationType.DELIVERY_LATENCY_ALERT,
+            content_type=ContentType.objects.get_for_model(Route),
+            object_id__in=[str(route_id) for route_id in slow],
+            created_at__gte=since,
+        ).values_list("object_id", flat=True))
+
+        alerts = 0
+        for route in Route.objects.filter(id__in=slow).select_related("user"):
+            if str(route.id) in already_alerted:
+                continue
+            sketch = slow[route.id]
+            MessagingNotificationService.delivery_latency_alert(
+                route, round(sketch.quantile(0.95)), sketch.count, options["window"])
+            alerts += 1
+
+        self.stdout.write(f"{len(slow)} slow route(s), {alerts} alert(s) sent")
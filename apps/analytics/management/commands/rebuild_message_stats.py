@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.services import rebuild_delivery_latency, rebuild_message_stats
+from apps.messaging.utils import invalidate_dashboard_cache
+
+
+class Command(BaseCommand):
+    help = "Recompute the message count and delivery latency rollups from the Message table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Only rebuild the stats of the user with this email")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(email=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+
+        rows = rebuild_message_stats(user)
+        latency_rows = rebuild_delivery_latency(user)
+        if user is not None:
+            invalidate_dashboard_cache(user.id)
+        self.stdout.write(f"Wrote {rows} message stat row(s) and {latency_rows} latency row(s)")
@@ -1,3 +1,92 @@
+from django.conf import settings
 from django.db import models
+from apps.messaging.models import Message
 
-# Create your models here.
+
+class MessageDailyStat(models.Model):
+    '''
+    Message counts per user, route and day, read by the dashboard instead of
+    scanning the Message table. One row counts the events of one status:
+
+    - queued: messages accepted that day (every message is counted once here)
+    - sent: messages delivered that day, by sent_at
+    - failed: messages that gave up for good, by the day they were accepted
+
+    Kept up to date by the send views and DeliveryService, rebuilt from the
+    Message table with `python manage.py rebuild_message_stats`.
+    '''
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="message_daily_stats")
+    route = models.ForeignKey(
+        "messaging.Route", on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Message.Status.choices)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ("-day",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "route", "day", "status"], name="unique_message_daily_stat"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "status", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.route_id} {self.status}: {self.count}"
+
+
+class MessageHourlyStat(models.Model):
+    '''
+    Same events as MessageDailyStat, per UTC hour. Backs dashboard/timeseries/,
+    which regroups the hours into hour/day/week buckets of any timezone.
+    '''
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="message_hourly_stats")
+    route = models.ForeignKey(
+        "messaging.Route", on_delete=models.CASCADE, related_name="hourly_stats")
+    hour = models.DateTimeField(help_text="start of the hour, UTC")
+    status = models.CharField(max_length=20, choices=Message.Status.choices)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ("-hour",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "route", "hour", "status"], name="unique_message_hourly_stat"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "hour"]),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.route_id} {self.status}: {self.count}"
+
+
+class DeliveryLatencyStat(models.Model):
+    '''
+    Time from accepted_at to sent_at of the messages a route delivered in one
+    UTC hour, as a LatencySketch (apps/analytics/sketch.py). Sketches of any
+    set of hours/routes merge into p50/p95/p99 without reading messages.
+    '''
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="delivery_latency_stats")
+    route = models.ForeignKey(
+        "messaging.Route", on_delete=models.CASCADE, related_name="latency_stats")
+    hour = models.DateTimeField(help_text="start of the hour, UTC")
+    count = models.PositiveIntegerField(default=0)
+    sketch = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ("-hour",)
+        constraints = [
+            models.UniqueConstraint(fields=["route", "hour"], name="unique_delivery_latency_stat"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "hour"]),
+            models.Index(fields=["hour"]),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.route_id}: {self.count} deliveries"
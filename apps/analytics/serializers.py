@@ -1,5 +1,8 @@
 # analytics/serializers.py
 
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.utils import timezone
 from rest_framework import serializers
 
 
@@ -42,3 +45,87 @@ class DashboardMetricsSerializer(serializers.Serializer):
     recent_activity = RecentActivitySerializer(many=True)
     messages_per_day = MessagesPerDaySerializer(many=True)
     messages_per_route = MessagesPerRouteSerializer(many=True)
+
+
+class RangeQuerySerializer(serializers.Serializer):
+    '''
+    `from`, `to`, `route` and `tz` query params of the dashboard endpoints.
+    `from` and `to` without an offset are read in `tz`; defaults to the last 7 days.
+    '''
+    MAX_RANGE = timedelta(days=366)
+
+    route = serializers.IntegerField(required=False)
+    tz = serializers.CharField(required=False, default="UTC")
+
+    def _zone(self):
+        # OSError: a directory of the tz database (America) or a name too long for the file system
+        try:
+            return ZoneInfo(self.initial_data.get("tz") or "UTC")
+        except (ZoneInfoNotFoundError, ValueError, OSError):
+            return ZoneInfo("UTC")
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # `from` is a python keyword, it cannot be declared as a class attribute
+        zone = self._zone() if hasattr(self, "initial_data") else None
+        fields["from"] = serializers.DateTimeField(required=False, default_timezone=zone)
+        fields["to"] = serializers.DateTimeField(required=False, default_timezone=zone)
+        return fields
+
+    def validate_tz(self, value):
+        try:
+            return ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError, OSError):
+            raise serializers.ValidationError(f"Unknown timezone '{value}'.")
+
+    def validate(self, attrs):
+        end = attrs.get("to") or timezone.now()
+        start = attrs.get("from") or end - timedelta(days=7)
+        if start >= end:
+            raise serializers.ValidationError({"from": "Must be before `to`."})
+        if end - start > self.MAX_RANGE:
+            raise serializers.ValidationError({"from": "The range can span at most 366 days."})
+        attrs["from"], attrs["to"] = start, end
+        return attrs
+
+
+class TimeseriesQuerySerializer(RangeQuerySerializer):
+    '''query params of dashboard/timeseries/'''
+    BUCKETS = ("hour", "day", "week")
+
+    bucket = serializers.ChoiceField(choices=BUCKETS, default="day")
+
+
+class TimeseriesPointSerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    queued = serializers.IntegerField()
+    sent = serializers.IntegerField()
+    failed = serializers.IntegerField()
+
+
+class TimeseriesSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(source="from")
+    end = serializers.DateTimeField(source="to")
+    bucket = serializers.CharField()
+    tz = serializers.CharField()
+    route = serializers.IntegerField(allow_null=True)
+    series = TimeseriesPointSerializer(many=True)
+
+
+class LatencySummarySerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    p50 = serializers.IntegerField(allow_null=True)
+    p95 = serializers.IntegerField(allow_null=True)
+    p99 = serializers.IntegerField(allow_null=True)
+
+
+class RouteLatencySerializer(LatencySummarySerializer):
+    route_id = serializers.IntegerField()
+    route_label = serializers.CharField()
+
+
+class DeliveryLatencySerializer(serializers.Serializer):
+    start = serializers.DateTimeField(source="from")
+    end = serializers.DateTimeField(source="to")
+    overall = LatencySummarySerializer()
+    routes = RouteLatencySerializer(many=True)
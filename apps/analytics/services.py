@@ -1,32 +1,40 @@
 # analytics/services.py
 
-from django.utils.timezone import now, timedelta
-from django.db.models import Count, Q
-from django.db.models.functions import TruncDate
-from django.core.cache import cache
-from collections import defaultdict
+from collections import Counter, defaultdict
+from datetime import datetime, time, timezone as dt_timezone
+from django.utils.timezone import localdate, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.conf import settings
 
 from apps.messaging.models import Message, Route
 from apps.key.models import APIKey
+from apps.core.utils.tiered_cache import TieredCache
+from .models import DeliveryLatencyStat, MessageDailyStat, MessageHourlyStat
+from .sketch import LatencySketch
 
 
-CACHE_TIMEOUT = 60  # seconds
+dashboard_cache = TieredCache(
+    "dashboard_metrics",
+    ttl=settings.DASHBOARD_CACHE_TTL,
+    stale_ttl=settings.DASHBOARD_CACHE_STALE_TTL,
+    local_ttl=settings.DASHBOARD_CACHE_LOCAL_TTL,
+)
 
 
 def get_dashboard_metrics(user):
-    cache_key = f"dashboard_metrics:{user.id}"
-    data = cache.get(cache_key)
+    return dashboard_cache.get_or_set(user.id, lambda: compute_dashboard_metrics(user))
 
-    if data:
-        return data
 
-    base_qs = Message.objects.filter(apikey__route__user=user)
+def compute_dashboard_metrics(user):
+    stats_qs = MessageDailyStat.objects.filter(user=user)
 
-    # ---- totals + success/fail (ONE query)
-    stats = base_qs.aggregate(
-        total=Count("id"),
-        success=Count("id", filter=Q(status="sent")),
-        failed=Count("id", filter=Q(status="failed")),
+    # ---- totals + success/fail (ONE query over the rollup)
+    stats = stats_qs.aggregate(
+        total=Sum("count", filter=Q(status=Message.Status.QUEUED)),
+        success=Sum("count", filter=Q(status=Message.Status.SENT)),
+        failed=Sum("count", filter=Q(status=Message.Status.FAILED)),
     )
 
     total = stats["total"] or 0
@@ -36,35 +44,21 @@ def get_dashboard_metrics(user):
     success_rate = (success / total * 100) if total else 0
     failed_rate = (failed / total * 100) if total else 0
 
-    # ---- today count
-    today = now().date()
-
-    messages_today = base_qs.filter(
-        sent_at__date=today
-    ).count()
-
-    # ---- recent activity
-    recent = list(
-        base_qs
-        .order_by("-sent_at")
-        .values("id","subject", "status", "sent_at")[:5]
-    )
-
-    # ---- messages per day (last 7 days)
-    last_7_days = now() - timedelta(days=7)
+    # ---- messages sent per day (last 7 days, today included)
+    today = localdate()
+    first_day = today - timedelta(days=6)
 
     raw_daily = (
-        base_qs
-        .filter(sent_at__gte=last_7_days)
-        .annotate(day=TruncDate("sent_at"))
+        stats_qs
+        .filter(status=Message.Status.SENT, day__gte=first_day)
         .values("day")
-        .annotate(count=Count("id"))
+        .annotate(total=Sum("count"))
         .order_by("day")
     )
 
     daily_map = defaultdict(int)
     for row in raw_daily:
-        daily_map[row["day"]] = row["count"]
+        daily_map[row["day"]] = row["total"]
 
     messages_per_day = []
     for i in range(7):
@@ -74,11 +68,22 @@ def get_dashboard_metrics(user):
             "count": daily_map[d]
         })
 
+    # ---- today count
+    messages_today = daily_map[today]
+
+    # ---- recent activity
+    recent = list(
+        Message.objects.filter(user=user)
+        .order_by("-sent_at")
+        .values("id","subject", "status", "sent_at")[:5]
+    )
+
     # ---- messages per route
     messages_per_route = list(
-        base_qs
-        .values("apikey__route__id", "apikey__route__label", "apikey__route__is_active", "apikey__route__created_at")
-        .annotate(count=Count("id"))
+        stats_qs
+        .filter(status=Message.Status.QUEUED)
+        .values("route__id", "route__label", "route__is_active", "route__created_at")
+        .annotate(count=Sum("count"))
         .order_by("-count")
     )
 
@@ -96,10 +101,10 @@ def get_dashboard_metrics(user):
 
     cleaned = [
         {
-            "route_id": row["apikey__route__id"],
-            "route_label": row["apikey__route__label"],
-            "route_is_active": row["apikey__route__is_active"],
-            "route_created_at": row["apikey__route__created_at"],
+            "route_id": row["route__id"],
+            "route_label": row["route__label"],
+            "route_is_active": row["route__is_active"],
+            "route_created_at": row["route__created_at"],
             "count": row["count"],
         }
         for row in messages_per_route
@@ -122,7 +127,225 @@ def get_dashboard_metrics(user):
         "messages_per_route": cleaned,
     }
 
-    cache.set(cache_key, data, CACHE_TIMEOUT)
-
     return data
 
+
+
+def message_stat_time(message, status):
+    """when a status event of the message is counted, see MessageDailyStat"""
+    if status == Message.Status.SENT:
+        return message.sent_at
+    return message.accepted_at
+
+
+def utc_hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _increment_stats(model, bucket_field, counts, status):
+    """add `counts` ({(user_id, route_id, bucket): n}) to the rows of a rollup model"""
+    for (user_id, route_id, bucket), count in counts.items():
+        lookup = {"user_id": user_id, "route_id": route_id, bucket_field: bucket, "status": status}
+        if model.objects.filter(**lookup).update(count=F("count") + count):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(count=count, **lookup)
+        except IntegrityError:
+            # another request created the row first
+            model.objects.filter(**lookup).update(count=F("count") + count)
+
+
+def record_message_stats(messages, status):
+    """
+    Count `messages` under `status` in the daily and hourly rollups, one
+    upsert per (user, route, day) and (user, route, hour).
+    Call inside the transaction that changes the messages.
+    """
+    days, hours = Counter(), Counter()
+    for message in messages:
+        if not (message.user_id and message.route_id):
+            continue  # not backfilled yet, see the backfill_message_owner command
+        at = message_stat_time(message, status)
+        days[(message.user_id, message.route_id, localdate(at))] += 1
+        hours[(message.user_id, message.route_id, utc_hour(at))] += 1
+
+    _increment_stats(MessageDailyStat, "day", days, status)
+    _increment_stats(MessageHourlyStat, "hour", hours, status)
+
+
+def rebuild_message_stats(user=None):
+    """
+    Recompute the daily and hourly rollups from the Message table, for one
+    user or everybody. Returns the number of rows written.
+    """
+    messages = Message.objects.filter(user__isnull=False, route__isnull=False)
+    if user is not None:
+        messages = messages.filter(user=user)
+
+    events = [
+        (Message.Status.QUEUED, messages, "accepted_at"),
+        (Message.Status.SENT, messages.filter(status=Message.Status.SENT), "sent_at"),
+        (Message.Status.FAILED, messages.filter(status=Message.Status.FAILED), "accepted_at"),
+    ]
+    rollups = [
+        (MessageDailyStat, "day", TruncDate),
+        (MessageHourlyStat, "hour", lambda field: TruncHour(field, tzinfo=dt_timezone.utc)),
+    ]
+
+    written = 0
+    with transaction.atomic():
+        for model, bucket_field, trunc in rollups:
+            stats = model.objects.all()
+            if user is not None:
+                stats = stats.filter(user=user)
+            stats.delete()
+
+            rows = []
+            for status, qs, date_field in events:
+                grouped = (
+                    qs.annotate(bucket=trunc(date_field))
+                    .values("bucket", "route_id", "user_id")
+                    .annotate(total=Count("id"))
+                    .order_by()
+                )
+                rows += [
+                    model(user_id=row["user_id"], route_id=row["route_id"], status=status,
+                          count=row["total"], **{bucket_field: row["bucket"]})
+                    for row in grouped
+                ]
+            model.objects.bulk_create(rows, batch_size=1000)
+            written += len(rows)
+    return written
+
+
+def _bucket_start(value, bucket, tz):
+    """start (aware, in tz) of the hour/day/week bucket holding `value`"""
+    local = value.astimezone(tz)
+    if bucket == "hour":
+        return local.replace(minute=0, second=0, microsecond=0)
+    day = local.date()
+    if bucket == "week":
+        day -= timedelta(days=day.weekday())
+    return datetime.combine(day, time.min, tzinfo=tz)
+
+
+def _next_bucket(start, bucket, tz):
+    if bucket == "hour":
+        # step in UTC so DST changes neither skip nor repeat an hour
+        return (start.astimezone(dt_timezone.utc) + timedelta(hours=1)).astimezone(tz)
+    days = 7 if bucket == "week" else 1
+    return datetime.combine(start.date() + timedelta(days=days), time.min, tzinfo=tz)
+
+
+def get_message_timeseries(user, start, end, bucket, tz, route_id=None):
+    """
+    queued/sent/failed counts per bucket between `start` and `end`, read from
+    MessageHourlyStat so the cost depends on the range, not on the number of
+    messages. An hour is counted in the bucket its start falls in.
+    """
+    qs = MessageHourlyStat.objects.filter(user=user, hour__gte=utc_hour(start), hour__lt=end)
+    if route_id is not None:
+        qs = qs.filter(route_id=route_id)
+
+    counts = defaultdict(lambda: defaultdict(int))
+    for row in qs.values("hour", "status").annotate(total=Sum("count")).order_by():
+        counts[_bucket_start(row["hour"], bucket, tz)][row["status"]] += row["total"]
+
+    series = []
+    current = _bucket_start(start, bucket, tz)
+    while current < end:
+        bucket_counts = counts.get(current, {})
+        series.append({
+            "start": current,
+            "queued": bucket_counts.get(Message.Status.QUEUED, 0),
+            "sent": bucket_counts.get(Message.Status.SENT, 0),
+            "failed": bucket_counts.get(Message.Status.FAILED, 0),
+        })
+        current = _next_bucket(current, bucket, tz)
+    return series
+
+
+def record_delivery_latency(messages):
+    """
+    Add the latency_ms of delivered messages to the sketch of their route and
+    hour. Call inside the transaction that marks them sent, the rows are
+    locked while merging so concurrent workers do not lose counts.
+    """
+    sketches = defaultdict(LatencySketch)
+    for message in messages:
+        if message.latency_ms is None or not (message.user_id and message.route_id):
+            continue
+        sketches[(message.user_id, message.route_id, utc_hour(message.sent_at))].add(message.latency_ms)
+
+    for (user_id, route_id, hour), sketch in sketches.items():
+        stat, _ = DeliveryLatencyStat.objects.select_for_update().get_or_create(
+            route_id=route_id, hour=hour, defaults={"user_id": user_id})
+        stat.sketch = LatencySketch.from_dict(stat.sketch).merge(sketch).to_dict()
+        stat.count += sketch.count
+        stat.save(update_fields=["sketch", "count"])
+
+
+def rebuild_delivery_latency(user=None):
+    """Recompute DeliveryLatencyStat from Message.latency_ms, returns the number of rows"""
+    messages = Message.objects.filter(
+        status=Message.Status.SENT, latency_ms__isnull=False,
+        user__isnull=False, route__isnull=False)
+    stats = DeliveryLatencyStat.objects.all()
+    if user is not None:
+        messages = messages.filter(user=user)
+        stats = stats.filter(user=user)
+
+    sketches = defaultdict(LatencySketch)
+    owners = {}
+    rows = messages.values_list("user_id", "route_id", "sent_at", "latency_ms").order_by()
+    for user_id, route_id, sent_at, latency_ms in rows.iterator(chunk_size=5000):
+        key = (route_id, utc_hour(sent_at))
+        sketches[key].add(latency_ms)
+        owners[key] = user_id
+
+    with transaction.atomic():
+        stats.delete()
+        DeliveryLatencyStat.objects.bulk_create([
+            DeliveryLatencyStat(user_id=owners[key], route_id=key[0], hour=key[1],
+                                count=sketch.count, sketch=sketch.to_dict())
+            for key, sketch in sketches.items()
+        ], batch_size=1000)
+    return len(sketches)
+
+
+LATENCY_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+def latency_summary(sketch):
+    summary = {"count": sketch.count}
+    for name, q in LATENCY_QUANTILES.items():
+        value = sketch.quantile(q)
+        summary[name] = round(value) if value is not None else None
+    return summary
+
+
+def merged_latency_sketches(stats):
+    """{route_id: LatencySketch} merged over a DeliveryLatencyStat queryset"""
+    merged = defaultdict(LatencySketch)
+    for route_id, sketch in stats.values_list("route_id", "sketch"):
+        merged[route_id].merge(LatencySketch.from_dict(sketch))
+    return merged
+
+
+def get_delivery_latency(user, start, end, route_id=None):
+    """p50/p95/p99 delivery latency (ms) between start and end, overall and per route"""
+    stats = DeliveryLatencyStat.objects.filter(user=user, hour__gte=utc_hour(start), hour__lt=end)
+    if route_id is not None:
+        stats = stats.filter(route_id=route_id)
+
+    per_route = merged_latency_sketches(stats)
+    labels = dict(Route.objects.filter(id__in=per_route).values_list("id", "label"))
+    overall = LatencySketch()
+    routes = []
+    for rid, sketch in per_route.items():
+        overall.merge(sketch)
+        routes.append({"route_id": rid, "route_label": labels.get(rid, ""), **latency_summary(sketch)})
+    routes.sort(key=lambda row: row["p95"] or 0, reverse=True)
+
+    return {"overall": latency_summary(overall), "routes": routes}
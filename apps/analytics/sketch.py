@@ -0,0 +1,64 @@
+import math
+
+
+class LatencySketch:
+    '''
+    Mergeable quantile sketch with logarithmic buckets (DDSketch style).
+
+    A value v > 0 falls in bucket ceil(log(v) / log(gamma)), so any quantile is
+    answered within RELATIVE_ACCURACY of the true value whatever the
+    distribution, and two sketches merge by adding their bucket counts. One
+    sketch per route and hour is a few hundred bytes of JSON at most.
+    '''
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self, buckets=None, zeros=0):
+        self.buckets = buckets or {}  # bucket index -> count
+        self.zeros = zeros  # values below 1ms
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.buckets.values())
+
+    def add(self, value, count=1):
+        if value < 1:
+            self.zeros += count
+            return
+        index = math.ceil(math.log(value) / self.LOG_GAMMA)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        return self
+
+    def quantile(self, q):
+        """estimated value at quantile q (0..1), None for an empty sketch"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # middle of the bucket (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self.GAMMA ** index / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.buckets) / (self.GAMMA + 1)
+
+    def to_dict(self):
+        return {"buckets": {str(index): count for index, count in self.buckets.items()},
+                "zeros": self.zeros}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(
+            buckets={int(index): count for index, count in data.get("buckets", {}).items()},
+            zeros=data.get("zeros", 0),
+        )
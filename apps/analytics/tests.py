@@ -1,3 +1,204 @@
-from django.test import TestCase
+import smtplib
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, override_settings
+from apps.account.models import Profile
+from apps.analytics.models import DeliveryLatencyStat, MessageDailyStat, MessageHourlyStat
+from apps.analytics.sketch import LatencySketch
+from apps.core.models import Notification, NotificationType
+from apps.analytics.services import dashboard_cache, rebuild_message_stats
+from apps.core.utils.mail_pool import mail_pool
+from apps.messaging.models import Message
+from apps.messaging.services.route_service import RouteService
+from apps.messaging.services.delivery_service import DeliveryService
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    MESSAGE_RETRY_MAX_ATTEMPTS=1,
+)
+class TestMessageDailyStat(APITestCase):
+    def setUp(self):
+        cache.clear()
+        dashboard_cache.clear_local()
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        Profile.objects.create(user=self.user, email=self.user.email)
+        self.route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        self.raw_key = keys["live"]["key"]
+
+    def send(self, count=1):
+        for _ in range(count):
+            self.client.post(
+                reverse('send-email'),
+                {"visitor_email": "visitor@gmail.com", "subject": "Hi", "body": "Hello"},
+                format='json', HTTP_X_API_KEY=self.raw_key)
+
+    def snapshot(self):
+        return (
+            sorted(MessageDailyStat.objects.values_list(
+                "user_id", "route_id", "day", "status", "count")),
+            sorted(MessageHourlyStat.objects.values_list(
+                "user_id", "route_id", "hour", "status", "count")),
+        )
+
+    def test_rollup_follows_accept_and_delivery(self):
+        self.send(3)
+        DeliveryService.process_queue(limit=2)
+        self.send(1)
+        refused = smtplib.SMTPRecipientsRefused({"inbox@gmail.com": (550, b"no such user")})
+        with mock.patch.object(mail_pool, "send_messages", side_effect=refused):
+            DeliveryService.process_queue()
+
+        counts = dict(MessageDailyStat.objects.values_list("status", "count"))
+        self.assertEqual(counts, {"queued": 4, "sent": 2, "failed": 2})
+
+        incremental = self.snapshot()
+        rebuild_message_stats()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_dashboard_reads_rollup(self):
+        self.send(2)
+        DeliveryService.process_queue()
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('dashboard_metrics'))
+
+        self.assertEqual(response.data["totals"]["messages"], 2)
+        self.assertEqual(response.data["totals"]["messages_today"], 2)
+        self.assertEqual(response.data["rates"]["success"], 100.0)
+        self.assertEqual(response.data["messages_per_route"][0]["count"], 2)
+        self.assertEqual(response.data["messages_per_day"][-1]["count"], 2)
+
+
+class TestDashboardTimeseries(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        self.route, _ = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        hour = lambda day, h: datetime(2026, 3, day, h, tzinfo=dt_timezone.utc)
+        MessageHourlyStat.objects.bulk_create([
+            MessageHourlyStat(user=self.user, route=self.route, hour=hour(1, 22), status="queued", count=2),
+            MessageHourlyStat(user=self.user, route=self.route, hour=hour(2, 1), status="queued", count=1),
+            MessageHourlyStat(user=self.user, route=self.route, hour=hour(2, 1), status="sent", count=3),
+        ])
+        self.client.force_authenticate(self.user)
+
+    def timeseries(self, **params):
+        params = {"from": "2026-03-01", "to": "2026-03-03", **params}
+        return self.client.get(reverse('dashboard_timeseries'), params)
+
+    def test_days_follow_the_requested_timezone(self):
+        lagos = self.timeseries(tz="Africa/Lagos").data["series"]
+        self.assertEqual([(p["queued"], p["sent"]) for p in lagos], [(2, 0), (1, 3)])
+        self.assertEqual(lagos[0]["start"], "2026-03-01T00:00:00+01:00")
+
+        new_york = self.timeseries(tz="America/New_York").data["series"]
+        self.assertEqual([(p["queued"], p["sent"]) for p in new_york], [(3, 3), (0, 0)])
+
+    def test_hour_and_week_buckets(self):
+        hours = self.timeseries(bucket="hour").data["series"]
+        self.assertEqual(len(hours), 48)
+        self.assertEqual(sum(p["queued"] for p in hours), 3)
+
+        weeks = self.timeseries(bucket="week").data["series"]
+        self.assertEqual([p["start"] for p in weeks],
+                         ["2026-02-23T00:00:00Z", "2026-03-02T00:00:00Z"])
+        self.assertEqual([p["queued"] for p in weeks], [2, 1])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.timeseries(tz="Mars/Base").status_code, 400)
+        self.assertEqual(self.timeseries(tz="America").status_code, 400)
+        self.assertEqual(self.timeseries(tz="A" * 300).status_code, 400)
+        self.assertEqual(self.timeseries(**{"from": "2024-01-01"}).status_code, 400)
+        self.assertEqual(self.timeseries(route=self.route.id + 1).status_code, 404)
+
+
+class TestLatencySketch(SimpleTestCase):
+    def test_quantiles_are_within_relative_accuracy(self):
+        sketch = LatencySketch()
+        for value in range(1, 10001):
+            sketch.add(value)
+
+        for q, expected in [(0.5, 5000), (0.95, 9500), (0.99, 9900)]:
+            self.assertAlmostEqual(sketch.quantile(q), expected, delta=expected * 0.02)
+
+    def test_merged_sketch_equals_sketch_of_all_values(self):
+        first, second, both = LatencySketch(), LatencySketch(), LatencySketch()
+        for value in range(0, 500):
+            first.add(value)
+            both.add(value)
+        for value in range(500, 3000, 7):
+            second.add(value)
+            both.add(value)
+
+        merged = LatencySketch.from_dict(first.to_dict()).merge(second)
+
+        self.assertEqual(merged.count, both.count)
+        self.assertEqual(merged.quantile(0.95), both.quantile(0.95))
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class TestDeliveryLatency(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        Profile.objects.create(user=self.user, email=self.user.email)
+        self.route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        self.raw_key = keys["live"]["key"]
+
+    def test_delivery_records_latency(self):
+        for _ in range(3):
+            self.client.post(
+                reverse('send-email'),
+                {"visitor_email": "visitor@gmail.com", "subject": "Hi", "body": "Hello"},
+                format='json', HTTP_X_API_KEY=self.raw_key)
+        DeliveryService.process_queue()
+
+        self.assertFalse(Message.objects.filter(latency_ms__isnull=True).exists())
+        self.assertEqual(DeliveryLatencyStat.objects.get().count, 3)
+
+        self.client.force_authenticate(self.user)
+        data = self.client.get(reverse('dashboard_latency')).data
+        self.assertEqual(data["overall"]["count"], 3)
+        self.assertEqual(data["routes"][0]["route_id"], self.route.id)
+        self.assertIsNotNone(data["routes"][0]["p95"])
+
+    def test_slow_route_owner_is_alerted_once(self):
+        sketch = LatencySketch()
+        sketch.add(10 * 60 * 1000, count=30)
+        DeliveryLatencyStat.objects.create(
+            user=self.user, route=self.route, count=30, sketch=sketch.to_dict(),
+            hour=timezone.now().replace(minute=0, second=0, microsecond=0))
+
+        call_command("check_delivery_latency", stdout=StringIO())
+        call_command("check_delivery_latency", stdout=StringIO())
+
+        alerts = Notification.objects.filter(
+            user=self.user, type=NotificationType.DELIVERY_LATENCY_ALERT)
+        self.assertEqual(alerts.count(), 1)
+        self.assertEqual(alerts.get().object_id, str(self.route.id))
@@ -1,8 +1,10 @@
 # analytics/urls.py
 
 from django.urls import path
-from .views import DashboardMetricsView
+from .views import DashboardLatencyView, DashboardMetricsView, DashboardTimeseriesView
 
 urlpatterns = [
     path("metrics/", DashboardMetricsView.as_view(), name="dashboard_metrics"),
+    path("timeseries/", DashboardTimeseriesView.as_view(), name="dashboard_timeseries"),
+    path("latency/", DashboardLatencyView.as_view(), name="dashboard_latency"),
 ]
@@ -1,10 +1,14 @@
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from apps.messaging.models import Route
 
-from .services import get_dashboard_metrics
-from .serializers import DashboardMetricsSerializer
-from .documentation.analytics.schemas import dashboard_metric_doc
+from .services import get_dashboard_metrics, get_delivery_latency, get_message_timeseries
+from .serializers import (DashboardMetricsSerializer, DeliveryLatencySerializer, RangeQuerySerializer,
+                          TimeseriesQuerySerializer, TimeseriesSerializer)
+from .documentation.analytics.schemas import (dashboard_latency_doc, dashboard_metric_doc,
+                                              dashboard_timeseries_doc)
 
 class DashboardMetricsView(APIView):
     permission_classes = [IsAuthenticated]
@@ -15,3 +19,62 @@ class DashboardMetricsView(APIView):
         qs = get_dashboard_metrics(request.user)
         data =DashboardMetricsSerializer(qs).data
         return Response(data)
+
+
+class DashboardTimeseriesView(APIView):
+    """
+    Message counts (queued, sent, failed) per hour, day or week of the
+    requested timezone, for all routes or one of them.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = TimeseriesSerializer
+
+    @dashboard_timeseries_doc
+    def get(self, request):
+        query = TimeseriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        route_id = params.get("route")
+        if route_id is not None and not Route.objects.filter(id=route_id, user=request.user).exists():
+            return Response({"detail": "Route not found."}, status=404)
+
+        series = get_message_timeseries(
+            request.user, params["from"], params["to"], params["bucket"], params["tz"],
+            route_id=route_id)
+        # datetimes are rendered with the offset of the requested timezone
+        with timezone.override(params["tz"]):
+            data = TimeseriesSerializer({
+                "from": params["from"],
+                "to": params["to"],
+                "bucket": params["bucket"],
+                "tz": params["tz"].key,
+                "route": route_id,
+                "series": series,
+            }).data
+        return Response(data)
+
+
+class DashboardLatencyView(APIView):
+    """
+    Delivery latency (accepted to sent, in ms) percentiles over a range,
+    for all routes together and per route, slowest first.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = DeliveryLatencySerializer
+
+    @dashboard_latency_doc
+    def get(self, request):
+        query = RangeQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        route_id = params.get("route")
+        if route_id is not None and not Route.objects.filter(id=route_id, user=request.user).exists():
+            return Response({"detail": "Route not found."}, status=404)
+
+        latency = get_delivery_latency(request.user, params["from"], params["to"], route_id=route_id)
+        with timezone.override(params["tz"]):
+            data = DeliveryLatencySerializer(
+                {"from": params["from"], "to": params["to"], **latency}).data
+        return Response(data)
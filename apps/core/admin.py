@@ -1,6 +1,11 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Notification, NotificationCounter
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ['id', 'type', "title", 'is_read', "object_id", 'created_at']
+
+
+@admin.register(NotificationCounter)
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ['user', 'unread', 'updated_at']
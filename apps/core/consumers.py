@@ -1,13 +1,39 @@
-import json
+import asyncio
 import logging
+import ujson
+from datetime import timezone as dt_timezone
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.core.services.counter_service import NotificationCounterService
+from apps.core.services.notification_service import NotificationService
 
 logger = logging.getLogger(__name__)
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
+    '''
+    Notifications of the connected user, live as they are created.
+
+    A reconnecting client passes `?last_seen_id=<id>` (or `?since=<ISO datetime>`)
+    and first gets what it missed in one `notifications` frame with "replay": true.
+    The group is joined before the replay is read, so nothing falls in between,
+    a notification may come twice (replay and live) and is recognised by its id.
+    "has_more" means more were missed than NOTIFICATION_REPLAY_LIMIT, reload
+    from notifications/ then.
+
+    Group messages carry their frame already encoded (NotificationService._message).
+    Frames arriving within NOTIFICATION_COALESCE_MS of each other are sent as one
+    {"type": "batch", "frames": [...]} frame, joined without decoding them.
+    '''
+
     async def connect(self):
+        self._pending = []
+        self._flush_task = None
         self.user = self.scope.get("user", AnonymousUser())
 
         if self.user.is_anonymous:
@@ -24,24 +50,84 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         logger.debug(
             f"WebSocket connection accepted and group added for {self.group_name}")
 
+        if not self.user.is_anonymous:
+            await self.replay_missed()
+
+    def _resume_cursor(self):
+        """(last_seen_id, since) from the query string, both None when there is nothing to replay"""
+        params = parse_qs(self.scope.get("query_string", b"").decode())
+        last_seen_id = params.get("last_seen_id", [None])[0]
+        if last_seen_id is not None:
+            if last_seen_id.isdigit():
+                return int(last_seen_id), None
+            logger.warning(f"Ignoring invalid last_seen_id {last_seen_id!r} on {self.group_name}")
+            return None, None
+
+        since = params.get("since", [None])[0]
+        try:
+            since = parse_datetime(since) if since else None
+        except ValueError:
+            # well formed but out of range (month 13...)
+            since = None
+        if since is None and params.get("since"):
+            logger.warning(f"Ignoring invalid since {params['since'][0]!r} on {self.group_name}")
+        if since is not None and timezone.is_naive(since):
+            since = timezone.make_aware(since, dt_timezone.utc)
+        return None, since
+
+    @database_sync_to_async
+    def _missed(self, last_seen_id, since):
+        notifications, has_more = NotificationService.missed(self.user.id, last_seen_id, since)
+        return notifications, has_more, NotificationCounterService.get(self.user.id)
+
+    async def replay_missed(self):
+        last_seen_id, since = self._resume_cursor()
+        if last_seen_id is None and since is None:
+            return
+        notifications, has_more, unread_count = await self._missed(last_seen_id, since)
+        logger.info(f"Replaying {len(notifications)} notifications to {self.group_name}")
+
+        await self.send(text_data=ujson.dumps({
+            'type': 'notifications',
+            'notifications': notifications,
+            'unread_count': unread_count,
+            'replay': True,
+            'has_more': has_more,
+        }, ensure_ascii=False, escape_forward_slashes=False))
+
     async def disconnect(self, close_code):
         logger.info(
             f"User {self.user} disconnected from {self.group_name} with close code {close_code}")
+        if self._flush_task is not None:
+            self._flush_task.cancel()
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
         logger.debug(f"User removed from group {self.group_name}")
 
+    async def queue_frame(self, text):
+        """send `text` after NOTIFICATION_COALESCE_MS, together with the frames arriving meanwhile"""
+        if not settings.NOTIFICATION_COALESCE_MS:
+            await self.send(text_data=text)
+            return
+        self._pending.append(text)
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.NOTIFICATION_COALESCE_MS / 1000)
+        texts, self._pending, self._flush_task = self._pending, [], None
+        if len(texts) == 1:
+            await self.send(text_data=texts[0])
+        else:
+            await self.send(text_data='{"type":"batch","frames":[' + ",".join(texts) + "]}")
+        logger.debug(f"Sent {len(texts)} frame(s) to {self.group_name}")
+
     async def send_notification(self, event):
-        notification_data = event.get("content", {})
-        logger.info(
-            f"Sending notification to {self.group_name}: "
-            f"id={notification_data.get('id')}, "
-            f"type={notification_data.get('type')}, "
-            f"title={notification_data.get('title')}"
-        )
-
-        await self.send(text_data=json.dumps({
-            'type': 'notification',
-            'notification': notification_data,
-        }))
-        logger.debug(
-            f"Notification sent successfully to WebSocket for {self.group_name}")
+        await self.queue_frame(event["text"])
+
+    async def send_notifications(self, event):
+        """several notifications of one bulk_create in a single frame"""
+        await self.queue_frame(event["text"])
+
+    async def send_read_state(self, event):
+        """notifications marked read elsewhere, `ids` is null after read-all"""
+        await self.queue_frame(event["text"])
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from channels.layers import InMemoryChannelLayer
+from apps.core.utils.channel_layer import SQLiteChannelLayer
+
+
+class Command(BaseCommand):
+    help = "Compare SQLiteChannelLayer with InMemoryChannelLayer: send latency and group_send fan-out"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500, help="Messages sent in each test")
+        parser.add_argument("--group-size", type=int, default=50, help="Channels in the fan-out group")
+
+    async def latency(self, layer, count, sender=None):
+        """ms between send() and receive() of one message at a time, sent by `sender` when given"""
+        sender = sender or layer
+        channel = await layer.new_channel()
+        samples = []
+        for i in range(count):
+            started = time.perf_counter()
+            await sender.send(channel, {"type": "test.message", "n": i})
+            await layer.receive(channel)
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+    async def fan_out(self, layer, count, group_size):
+        """messages delivered per second, `count` group_sends to `group_size` receiving channels"""
+        channels = [await layer.new_channel() for _ in range(group_size)]
+        for channel in channels:
+            await layer.group_add("benchmark", channel)
+
+        async def drain(channel):
+            for _ in range(count):
+                await layer.receive(channel)
+
+        started = time.perf_counter()
+        receivers = [asyncio.ensure_future(drain(channel)) for channel in channels]
+        # concurrent like NotificationService's pushes, sent in batches under the channel capacity
+        for start in range(0, count, 50):
+            await asyncio.gather(*(layer.group_send("benchmark", {"type": "test.message", "n": i})
+                                   for i in range(start, min(start + 50, count))))
+        await asyncio.gather(*receivers)
+        return count * group_size / (time.perf_counter() - started)
+
+    async def run(self, layer, options):
+        try:
+            p50, p95 = await self.latency(layer, options["messages"])
+            throughput = await self.fan_out(layer, options["messages"], options["group_size"])
+            await layer.flush()
+        finally:
+            await layer.close()
+        return p50, p95, throughput
+
+    async def across(self, receiver, sender, count):
+        try:
+            return await self.latency(receiver, count, sender=sender)
+        finally:
+            await receiver.close()
+            await sender.close()
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            layers = {
+                "InMemoryChannelLayer": InMemoryChannelLayer(capacity=1000),
+                "SQLiteChannelLayer": SQLiteChannelLayer(os.path.join(directory, "channels.sqlite3"),
+                                                         capacity=1000),
+            }
+            for name, layer in layers.items():
+                p50, p95, throughput = asyncio.run(self.run(layer, options))
+                self.stdout.write(
+                    f"{name:<22} send->receive p50 {p50:.2f} ms, p95 {p95:.2f} ms, "
+                    f"group_send fan-out {throughput:,.0f} messages/s")
+
+            # a second layer on the same file stands for another process, woken by polling only
+            path = os.path.join(directory, "channels.sqlite3")
+            receiver, sender = SQLiteChannelLayer(path), SQLiteChannelLayer(path)
+            p50, p95 = asyncio.run(self.across(receiver, sender, min(options["messages"], 100)))
+            self.stdout.write(f"{'SQLiteChannelLayer x2':<22} send->receive across processes "
+                              f"p50 {p50:.2f} ms, p95 {p95:.2f} ms (poll interval {receiver.poll_interval * 1000:.0f} ms)")
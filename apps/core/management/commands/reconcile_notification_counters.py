@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from apps.core.services.counter_service import NotificationCounterService
+
+
+class Command(BaseCommand):
+    help = "Fix unread notification counters that no longer match the notifications table (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=str, action="append", dest="users",
+            help="Only check this user id, can be repeated")
+
+    def handle(self, *args, **options):
+        fixed = NotificationCounterService.reconcile(user_ids=options["users"])
+        self.stdout.write(f"Fixed {fixed} unread counter(s)")
@@ -16,6 +16,7 @@ class NotificationType(models.TextChoices):
 
     MESSAGE_SENT = "message_sent", "Message Sent"
     MESSAGE_FAILED = "message_failed", "Message Failed"
+    DELIVERY_LATENCY_ALERT = "delivery_latency_alert", "Delivery Latency Alert"
 
     VERIFICATION_PENDING = "verification_pending", "Verification Pending"
     VERIFICATION_APPROVED = "verification_approved", "Verification Approved"
@@ -50,11 +51,16 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=["user", "is_read"]),
             models.Index(fields=["created_at"]),
+            # NotificationPagination pages of one user
+            models.Index(fields=["user", "created_at", "id"]),
+            # replay after a last_seen_id (NotificationService.missed)
+            models.Index(fields=["user", "id"]),
         ]
 
     def mark_as_read(self):
+        from apps.core.services.counter_service import NotificationCounterService
+        NotificationCounterService.mark_read(self.user_id, [self.pk])
         self.is_read = True
-        self.save(update_fields=["is_read"])
 
     def to_json(self):
         return {
@@ -70,3 +76,23 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"{self.user} - {self.type}"
+
+
+class NotificationCounter(models.Model):
+    '''
+    Unread notifications of a user, kept in step by NotificationService and the
+    read/unread endpoints so the notification bell never counts the table.
+    `python manage.py reconcile_notification_counters` fixes any drift.
+    '''
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="notification_counter"
+    )
+    # signed: a decrement must not underflow an unsigned column on MySQL
+    unread = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} - {self.unread} unread"
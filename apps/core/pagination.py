@@ -1,6 +1,20 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination
 
-class NotificationPagination(PageNumberPagination):
+
+class NotificationPagination(CursorPagination):
+    '''
+    Keyset pagination on (created_at, id): no COUNT(*) and no OFFSET scan,
+    every page is an index range read however deep the client goes.
+    '''
     page_size = 20
     page_size_query_param = "page_size"
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+
+class MessagePagination(CursorPagination):
+    '''Keyset pagination on (accepted_at, id) for message lists'''
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-accepted_at", "-id")
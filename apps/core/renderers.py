@@ -0,0 +1,19 @@
+import json
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class EventStreamRenderer(BaseRenderer):
+    '''
+    text/event-stream, lets a client that only accepts SSE reach the stream
+    endpoint. The stream itself is written by the view, this only renders the
+    responses DRF builds itself (authentication and validation errors).
+    '''
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return f"event: error\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n".encode(self.charset)
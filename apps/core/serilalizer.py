@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import  Notification
@@ -19,3 +20,18 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'user', 'type', 'is_read', "content_type",
                   'created_at', 'title', 'message', "object_id"]
+
+
+class NotificationIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
+
+
+class NotificationCursorSerializer(serializers.Serializer):
+    '''`last_seen_id` or `since` query params of the stream and poll endpoints'''
+    last_seen_id = serializers.IntegerField(required=False, min_value=1)
+    since = serializers.DateTimeField(required=False)
+    timeout = serializers.IntegerField(required=False, min_value=0)
+
+    def validate_timeout(self, value):
+        return min(value, settings.NOTIFICATION_LONG_POLL_TIMEOUT)
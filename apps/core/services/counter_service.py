@@ -0,0 +1,187 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from uuid import uuid4
+from apps.core.models import Notification, NotificationCounter
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationCounterService:
+    '''
+    Unread notification count per user, read from NotificationCounter (and the
+    cache in front of it) instead of COUNT(*) over the notifications table.
+
+    Changes go through `change()` in the transaction that creates or updates
+    the notifications, as a relative F() update so concurrent writers never
+    overwrite each other. `reconcile()` compares every counter with the table and fixes the
+    ones that drifted (rows edited in the admin, deleted notifications...).
+
+    A missing counter is created by `ensure()` from the table before the
+    transaction writes its own notifications, with INSERT ... ON CONFLICT DO
+    NOTHING (INSERT IGNORE on MySQL): when two transactions create it at once
+    the second insert waits for the first and is dropped, and both then add
+    their change on top of the same row.
+
+    A cached count is stored with the version of the counter it was read
+    under, a random token that every committed change replaces. A count read
+    before a change commits and cached after it carries the old version and
+    is never served, so a late fill cannot hide a newer value.
+    '''
+
+    @staticmethod
+    def _key(user_id):
+        return f"notification_unread:{user_id}"
+
+    @staticmethod
+    def _version_key(user_id):
+        return f"notification_unread_version:{user_id}"
+
+    @staticmethod
+    def _invalidate(user_id):
+        """call once the change is committed"""
+        cache.set(NotificationCounterService._version_key(user_id), uuid4().hex,
+                  settings.NOTIFICATION_UNREAD_CACHE_TTL)
+
+    @staticmethod
+    def _count(user_id):
+        return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+    @staticmethod
+    def ensure(user_ids):
+        """Create the missing counters of `user_ids`, call before writing their notifications"""
+        user_ids = list(dict.fromkeys(user_ids))
+        existing = set(NotificationCounter.objects.filter(
+            user_id__in=user_ids).values_list("user_id", flat=True))
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+        if not missing:
+            return
+        counts = dict(Notification.objects.filter(user_id__in=missing, is_read=False)
+                      .values("user_id").annotate(count=Count("id")).values_list("user_id", "count"))
+        NotificationCounter.objects.bulk_create([
+            NotificationCounter(user_id=user_id, unread=counts.get(user_id, 0)) for user_id in missing
+        ], ignore_conflicts=True)
+
+    @staticmethod
+    def change(user_id, delta):
+        """
+        Add `delta` to the unread count of the user, in the caller's transaction
+        and before the notifications it counts are written
+        """
+        if not delta:
+            return
+        counters = NotificationCounter.objects.filter(user_id=user_id)
+        if not counters.update(unread=Greatest(F("unread") + delta, 0), updated_at=timezone.now()):
+            # first change for this user
+            NotificationCounterService.ensure([user_id])
+            counters.update(unread=Greatest(F("unread") + delta, 0), updated_at=timezone.now())
+        transaction.on_commit(lambda: NotificationCounterService._invalidate(user_id))
+
+    @staticmethod
+    def get(user_id):
+        return NotificationCounterService.get_many([user_id])[user_id]
+
+    @staticmethod
+    def get_many(user_ids):
+        """{user_id: unread count}, one cache round trip and at most one query for the misses"""
+        user_ids = list(dict.fromkeys(user_ids))
+        key, version_key = NotificationCounterService._key, NotificationCounterService._version_key
+        cached = cache.get_many([key(user_id) for user_id in user_ids]
+                                + [version_key(user_id) for user_id in user_ids])
+
+        counts, versions = {}, {}
+        for user_id in user_ids:
+            version = cached.get(version_key(user_id))
+            value = cached.get(key(user_id))
+            if version is not None and value is not None and value[0] == version:
+                counts[user_id] = value[1]
+            else:
+                versions[user_id] = version
+
+        missing = [user_id for user_id in user_ids if user_id not in counts]
+        if missing:
+            unversioned = [user_id for user_id in missing if versions[user_id] is None]
+            if unversioned:
+                # before the query, a change committed after it replaces the version
+                for user_id in unversioned:
+                    cache.add(version_key(user_id), uuid4().hex, settings.NOTIFICATION_UNREAD_CACHE_TTL)
+                added = cache.get_many([version_key(user_id) for user_id in unversioned])
+                versions.update({user_id: added.get(version_key(user_id)) for user_id in unversioned})
+            found = dict(NotificationCounter.objects.filter(
+                user_id__in=missing).values_list("user_id", "unread"))
+            if len(found) < len(missing):
+                NotificationCounterService.ensure(missing)
+                found = dict(NotificationCounter.objects.filter(
+                    user_id__in=missing).values_list("user_id", "unread"))
+            cache.set_many({key(user_id): (versions[user_id], found[user_id])
+                            for user_id in missing if versions[user_id] is not None},
+                           settings.NOTIFICATION_UNREAD_CACHE_TTL)
+            counts.update(found)
+        return counts
+
+    @staticmethod
+    def _set_read(user_id, is_read, ids):
+        """ids of the notifications that changed, locked so a concurrent call does not count them twice"""
+        with transaction.atomic():
+            changed = list(Notification.objects.filter(user_id=user_id, is_read=not is_read, id__in=ids)
+                           .select_for_update().values_list("id", flat=True))
+            NotificationCounterService.change(user_id, -len(changed) if is_read else len(changed))
+            # under the 999 parameters of older SQLite versions
+            for start in range(0, len(changed), 500):
+                Notification.objects.filter(id__in=changed[start:start + 500]).update(is_read=is_read)
+        return changed
+
+    @staticmethod
+    def mark_read(user_id, ids):
+        """Mark the user's notifications `ids` read, returns the ids that changed"""
+        return NotificationCounterService._set_read(user_id, True, ids)
+
+    @staticmethod
+    def mark_unread(user_id, ids):
+        return NotificationCounterService._set_read(user_id, False, ids)
+
+    @staticmethod
+    def mark_all_read(user_id):
+        """
+        Mark every notification of the user read with a single UPDATE, returns how
+        many changed. A concurrent call waits on the rows this one updates and
+        then finds none of them unread, so nothing is counted twice.
+        """
+        with transaction.atomic():
+            # before the UPDATE, a counter created after it would start from the new state
+            NotificationCounterService.ensure([user_id])
+            updated = Notification.objects.filter(user_id=user_id, is_read=False).update(is_read=True)
+            NotificationCounterService.change(user_id, -updated)
+        return updated
+
+    @staticmethod
+    def reconcile(user_ids=None):
+        """Fix counters that do not match the table, returns how many were fixed"""
+        unread = Notification.objects.filter(is_read=False)
+        counters = NotificationCounter.objects.all()
+        if user_ids is not None:
+            unread = unread.filter(user_id__in=user_ids)
+            counters = counters.filter(user_id__in=user_ids)
+        actual = dict(unread.values("user_id").annotate(count=Count("id")).values_list("user_id", "count"))
+        stored = dict(counters.values_list("user_id", "unread"))
+
+        drifted = [user_id for user_id, count in stored.items() if count != actual.get(user_id, 0)]
+        fixed = 0
+        for user_id in drifted:
+            with transaction.atomic():
+                # locked, a notification created meanwhile waits for us and is counted on top
+                counter = NotificationCounter.objects.select_for_update().get(user_id=user_id)
+                count = NotificationCounterService._count(user_id)
+                if counter.unread != count:
+                    logger.info(f"Unread counter of user {user_id} was {counter.unread}, table has {count}")
+                    counter.unread = count
+                    counter.save(update_fields=["unread", "updated_at"])
+                    fixed += 1
+            NotificationCounterService._invalidate(user_id)
+
+        NotificationCounterService.ensure(set(actual) - set(stored))
+        return fixed
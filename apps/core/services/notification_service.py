@@ -1,7 +1,14 @@
+import asyncio
+from collections import defaultdict
+import ujson
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
 from django.db import transaction
 from apps.core.models import Notification
+from apps.core.utils.event_hub import notification_hub
+from .counter_service import NotificationCounterService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,31 +26,44 @@ class NotificationService:
             "is_read": notification.is_read,
             "created_at": notification.created_at.isoformat() if notification.created_at else None,
             "target_id": str(notification.object_id) if notification.object_id else None,
-            "target_type": notification.content_type.model if notification.content_type else None,
+            # get_for_id is served from ContentType's cache, the relation would be a query per notification
+            "target_type": (ContentType.objects.get_for_id(notification.content_type_id).model
+                            if notification.content_type_id else None),
         }
-        logger.debug(
-            f"Formatted notification payload for {notification.id}: {payload}")
         return payload
 
+    @staticmethod
+    def _message(handler, frame, **fields):
+        """
+        Group message carrying the WebSocket frame encoded once, every consumer of
+        the group sends the text as is instead of encoding it again per connection
+        """
+        return {
+            "type": handler,
+            "text": ujson.dumps(frame, ensure_ascii=False, escape_forward_slashes=False),
+            **fields,
+        }
+
     @staticmethod
     def _push_to_websocket(user_id, notification: Notification):
+        message = NotificationService._message("send_notification", {
+            "type": "notification",
+            "notification": NotificationService._format_payload(notification),
+            "unread_count": NotificationCounterService.get(user_id),
+        })
+        # SSE / long-poll streams of this process
+        notification_hub.publish(user_id, message)
+
         channel_layer = get_channel_layer()
         if channel_layer is None:
             logger.error(
                 f"Channel layer is not configured. Cannot push notification {notification.id} to user {user_id}")
             raise RuntimeError("Channel layer is not configured")
 
-        payload = NotificationService._format_payload(notification)
         group_name = f"notify_{str(user_id)}"
 
         try:
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    "type": "send_notification",
-                    "content": payload,
-                }
-            )
+            async_to_sync(channel_layer.group_send)(group_name, message)
             logger.info(
                 f"Successfully pushed notification {notification.id} ({notification.type}) to group {group_name}")
         except Exception as exc:
@@ -59,6 +79,94 @@ class NotificationService:
             logger.warning(
                 f"WebSocket push failed (non-blocking) for user {user_id}, notification {notification.id}: {str(exc)}")
 
+    @staticmethod
+    def _push_many_to_websocket(notifications):
+        """
+        Push notifications grouped by user: one frame per user, every group_send
+        awaited on a single event loop instead of one async_to_sync call per notification
+        """
+        by_user = defaultdict(list)
+        for notification in notifications:
+            by_user[notification.user_id].append(NotificationService._format_payload(notification))
+
+        unread_counts = NotificationCounterService.get_many(by_user)
+        messages = {}
+        for user_id, payloads in by_user.items():
+            if len(payloads) == 1:
+                message = NotificationService._message("send_notification", {
+                    "type": "notification", "notification": payloads[0], "unread_count": unread_counts[user_id]})
+            else:
+                message = NotificationService._message("send_notifications", {
+                    "type": "notifications", "notifications": payloads, "unread_count": unread_counts[user_id]})
+            messages[f"notify_{str(user_id)}"] = message
+            notification_hub.publish(user_id, message)
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            logger.error(
+                f"Channel layer is not configured. Cannot push {len(notifications)} notifications")
+            raise RuntimeError("Channel layer is not configured")
+
+        async def send_all():
+            return await asyncio.gather(
+                *(channel_layer.group_send(group_name, message) for group_name, message in messages.items()),
+                return_exceptions=True)
+
+        results = async_to_sync(send_all)()
+        failed = [(group_name, result) for group_name, result in zip(messages, results)
+                  if isinstance(result, Exception)]
+        for group_name, exc in failed:
+            logger.warning(f"WebSocket push failed (non-blocking) for group {group_name}: {str(exc)}")
+        logger.info(
+            f"Pushed {len(notifications)} notifications to {len(messages) - len(failed)}/{len(messages)} groups")
+
+    @staticmethod
+    def _safe_push_many(notifications):
+        try:
+            NotificationService._push_many_to_websocket(notifications)
+        except Exception as exc:
+            logger.warning(
+                f"WebSocket push failed (non-blocking) for {len(notifications)} notifications: {str(exc)}")
+
+    @staticmethod
+    def _push_read_state(user_id, ids):
+        """Tell the user's sockets which notifications are read now, every one of them when `ids` is None"""
+        state = {
+            "ids": None if ids is None else [str(notification_id) for notification_id in ids],
+            "unread_count": NotificationCounterService.get(user_id),
+        }
+        # ids and unread_count are kept next to the text for the SSE streams
+        message = NotificationService._message("send_read_state", {"type": "notifications_read", **state}, **state)
+        notification_hub.publish(user_id, message)
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            raise RuntimeError("Channel layer is not configured")
+        async_to_sync(channel_layer.group_send)(f"notify_{str(user_id)}", message)
+
+    @staticmethod
+    def mark_read(user_id, ids=None):
+        """
+        Mark the notifications `ids` of the user (all when None) read, returns how
+        many changed. One frame is pushed once the transaction commits, with the
+        ids that changed, or null ids when all of them were marked read.
+        """
+        if ids is None:
+            changed = NotificationCounterService.mark_all_read(user_id)
+        else:
+            changed = NotificationCounterService.mark_read(user_id, ids)
+        if changed:
+            pushed = None if ids is None else changed
+            transaction.on_commit(lambda: NotificationService._safe_push_read_state(user_id, pushed))
+        return changed if ids is None else len(changed)
+
+    @staticmethod
+    def _safe_push_read_state(user_id, ids):
+        try:
+            NotificationService._push_read_state(user_id, ids)
+        except Exception as exc:
+            logger.warning(f"WebSocket push of read state failed (non-blocking) for user {user_id}: {str(exc)}")
+
     @staticmethod
     def create(user, notification_type, title, message, content_object=None):
         logger.info(
@@ -66,13 +174,15 @@ class NotificationService:
             f"type={notification_type}, title={title}"
         )
 
-        notification = Notification.objects.create(
-            user=user,
-            type=notification_type,
-            title=title,
-            message=message,
-            content_object=content_object,
-        )
+        with transaction.atomic():
+            NotificationCounterService.change(user.id, 1)
+            notification = Notification.objects.create(
+                user=user,
+                type=notification_type,
+                title=title,
+                message=message,
+                content_object=content_object,
+            )
         logger.info(f"Notification {notification.id} saved to database")
 
         transaction.on_commit(
@@ -90,22 +200,43 @@ class NotificationService:
             data.pop('created_at', None)
 
         notifications = [Notification(**data) for data in data_list]
-        created_objs = Notification.objects.bulk_create(notifications)
+        unread = defaultdict(int)
+        for notification in notifications:
+            unread[notification.user_id] += not notification.is_read
+
+        with transaction.atomic():
+            for user_id, count in unread.items():
+                NotificationCounterService.change(user_id, count)
+            created_objs = Notification.objects.bulk_create(notifications)
 
         logger.info(
             f"Bulk created {len(created_objs)} notifications: {[str(n.id) for n in created_objs]}")
 
         transaction.on_commit(
-            lambda: [
-                NotificationService._safe_push(obj.user.id, obj)
-                for obj in created_objs
-            ]
-        )
+            lambda: NotificationService._safe_push_many(created_objs))
         logger.debug(
             f"Scheduled WebSocket pushes for {len(created_objs)} notifications on transaction commit")
 
         return created_objs
 
+    @staticmethod
+    def missed(user_id, last_seen_id=None, since=None, limit=None):
+        """
+        Payloads of the notifications after `last_seen_id` (or created after the `since`
+        datetime), oldest first, and whether there are more than `limit` of them.
+        Read as a (user, id) index range, `last_seen_id` does not have to exist anymore.
+        """
+        limit = limit or settings.NOTIFICATION_REPLAY_LIMIT
+        queryset = Notification.objects.filter(user_id=user_id)
+        if last_seen_id is not None:
+            queryset = queryset.filter(id__gt=last_seen_id).order_by("id")
+        else:
+            queryset = queryset.filter(created_at__gt=since).order_by("created_at", "id")
+
+        notifications = list(queryset[:limit + 1])
+        return ([NotificationService._format_payload(notification) for notification in notifications[:limit]],
+                len(notifications) > limit)
+
     @staticmethod
     def notify(user, notification_type, title, message, content_object=None):
         return NotificationService.create(
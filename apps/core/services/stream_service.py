@@ -0,0 +1,126 @@
+import json
+import time
+from django.conf import settings
+from django.utils import timezone
+from apps.core.utils.event_hub import notification_hub
+from .counter_service import NotificationCounterService
+from .notification_service import NotificationService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationStreamService:
+    '''
+    Notifications for clients that cannot use the WebSocket (hosts without
+    ASGI): an SSE stream and a long poll, both resuming from a cursor
+    (`last_seen_id` or `since`).
+
+    The database is the source of what is sent, read with NotificationService.missed
+    as an index range. A subscription to notification_hub wakes the reader as
+    soon as a notification is pushed in this process; without one it still reads
+    every NOTIFICATION_STREAM_POLL_INTERVAL seconds, which picks up notifications
+    created by other processes. Read state changes come from the hub only.
+
+    Each open stream holds a worker thread, so streams end after
+    NOTIFICATION_STREAM_MAX_DURATION seconds and the client reconnects with its
+    Last-Event-ID. Under WSGI that is a whole worker per listening client, the
+    stream endpoint is only served with NOTIFICATION_SSE_ENABLED; the long poll
+    holds its worker for NOTIFICATION_LONG_POLL_TIMEOUT seconds at most.
+    '''
+
+    @staticmethod
+    def _read(user_id, cursor):
+        """(payloads, has_more) after the cursor, which is moved past them"""
+        if cursor["last_seen_id"] is not None:
+            payloads, has_more = NotificationService.missed(user_id, last_seen_id=cursor["last_seen_id"])
+        else:
+            payloads, has_more = NotificationService.missed(user_id, since=cursor["since"])
+        if payloads:
+            cursor["last_seen_id"] = int(payloads[-1]["id"])
+        return payloads, has_more
+
+    @staticmethod
+    def _cursor(last_seen_id=None, since=None):
+        return {"last_seen_id": last_seen_id, "since": since or timezone.now()}
+
+    @staticmethod
+    def wait(user_id, last_seen_id=None, since=None, timeout=None):
+        """
+        Long poll: notifications after the cursor, waiting up to `timeout` seconds
+        for one to be created. Returns (payloads, has_more, last_seen_id).
+        """
+        timeout = settings.NOTIFICATION_LONG_POLL_TIMEOUT if timeout is None else timeout
+        cursor = NotificationStreamService._cursor(last_seen_id, since)
+        # subscribed before the first read, nothing created in between is missed
+        subscription = notification_hub.subscribe(user_id)
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                payloads, has_more = NotificationStreamService._read(user_id, cursor)
+                remaining = deadline - time.monotonic()
+                if payloads or remaining <= 0:
+                    return payloads, has_more, cursor["last_seen_id"]
+                if subscription.get(timeout=min(remaining, settings.NOTIFICATION_STREAM_POLL_INTERVAL)):
+                    subscription.drain()
+        finally:
+            notification_hub.unsubscribe(subscription)
+
+    @staticmethod
+    def _sse(event, data, event_id=None):
+        lines = [f"id: {event_id}"] if event_id is not None else []
+        lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+        return "\n".join(lines) + "\n\n"
+
+    @staticmethod
+    def _notifications_event(user_id, payloads, has_more):
+        return NotificationStreamService._sse("notifications", {
+            "notifications": payloads,
+            "unread_count": NotificationCounterService.get(user_id),
+            "has_more": has_more,
+        }, event_id=payloads[-1]["id"] if payloads else None)
+
+    @staticmethod
+    def stream(user_id, last_seen_id=None, since=None, duration=None):
+        """Server-Sent Events, yields the text of each event (and heartbeat comments)"""
+        duration = settings.NOTIFICATION_STREAM_MAX_DURATION if duration is None else duration
+        heartbeat = settings.NOTIFICATION_STREAM_HEARTBEAT
+        poll_interval = settings.NOTIFICATION_STREAM_POLL_INTERVAL
+        replay = last_seen_id is not None or since is not None
+        cursor = NotificationStreamService._cursor(last_seen_id, since)
+        subscription = notification_hub.subscribe(user_id)
+        try:
+            deadline = time.monotonic() + duration
+            last_write = time.monotonic()
+            # browsers reconnect after this many milliseconds once the stream ends
+            yield f"retry: {poll_interval * 1000}\n\n"
+
+            read = replay
+            while True:
+                if read or subscription.overflowed:
+                    subscription.overflowed = False
+                    payloads, has_more = NotificationStreamService._read(user_id, cursor)
+                    while payloads:
+                        yield NotificationStreamService._notifications_event(user_id, payloads, has_more)
+                        last_write = time.monotonic()
+                        payloads, has_more = (NotificationStreamService._read(user_id, cursor)
+                                              if has_more else ([], False))
+
+                now = time.monotonic()
+                if now >= deadline:
+                    return
+                if now - last_write >= heartbeat:
+                    yield ": heartbeat\n\n"
+                    last_write = now
+
+                event = subscription.get(timeout=min(poll_interval, heartbeat, deadline - now))
+                events = [event, *subscription.drain()] if event is not None else []
+                for event in events:
+                    if event["type"] == "send_read_state":
+                        yield NotificationStreamService._sse("notifications_read", {
+                            "ids": event["ids"], "unread_count": event["unread_count"]})
+                        last_write = time.monotonic()
+                # new notifications (or only the poll interval passed): read them from the database
+                read = True
+        finally:
+            notification_hub.unsubscribe(subscription)
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# instead of the SQLite file of settings.CHANNEL_LAYERS in BASE_DIR
+INMEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CHANNEL_LAYERS=INMEMORY_CHANNEL_LAYERS)
+class NotificationTestCase(APITestCase):
+    '''
+    Per-test cache (unread counters, replay state) and channel layer, and the
+    user owning the notifications, `self.user`
+    '''
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="owner@gmail.com", password="password@123")
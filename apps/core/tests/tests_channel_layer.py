@@ -0,0 +1,77 @@
+import asyncio
+import os
+import tempfile
+import time
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from apps.core.utils.channel_layer import SQLiteChannelLayer
+
+
+class TestSQLiteChannelLayer(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "channels.sqlite3")
+        # two layers on one file, as in two worker processes
+        self.first = SQLiteChannelLayer(path, capacity=2)
+        self.second = SQLiteChannelLayer(path, capacity=2)
+        # before the directory is removed
+        self.addCleanup(async_to_sync(self.first.close))
+        self.addCleanup(async_to_sync(self.second.close))
+
+    def test_group_send_reaches_channels_of_other_processes(self):
+        async def run():
+            local = await self.first.new_channel()
+            remote = await self.second.new_channel()
+            await self.first.group_add("notify_1", local)
+            await self.second.group_add("notify_1", remote)
+
+            await asyncio.gather(*(self.first.group_send("notify_1", {"type": "send.notification", "n": n})
+                                   for n in range(3)))
+            received = [await self.second.receive(remote), await self.second.receive(remote),
+                        await self.first.receive(local), await self.first.receive(local)]
+
+            await self.first.group_discard("notify_1", remote)
+            await self.first.group_send("notify_1", {"type": "send.notification", "n": 3})
+            late = await self.first.receive(local)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.second.receive(remote), 0.2)
+            await self.first.flush()
+            return received, late
+
+        received, late = async_to_sync(run)()
+
+        # capacity is 2, the third message of each channel was dropped
+        self.assertEqual([message["n"] for message in received], [0, 1, 0, 1])
+        self.assertEqual(late["n"], 3)
+
+    def test_message_claimed_after_receive_stopped_is_kept(self):
+        claim = self.first._claim
+
+        def slow_claim(*args):
+            time.sleep(0.2)
+            return claim(*args)
+
+        async def run():
+            channel = await self.first.new_channel()
+            await self.first.send(channel, {"type": "send.notification", "n": 0})
+            with patch.object(self.first, "_claim", side_effect=slow_claim):
+                # gives up while the claim of its message is still running
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.first.receive(channel), 0.05)
+                await asyncio.sleep(0.3)
+                return await asyncio.wait_for(self.first.receive(channel), 2)
+
+        self.assertEqual(async_to_sync(run)()["n"], 0)
+
+    def test_close_releases_the_database_and_the_writer_thread(self):
+        async def run():
+            await self.first.group_add("notify_1", await self.first.new_channel())
+            await self.first.close()
+
+        async_to_sync(run)()
+
+        self.assertIsNone(self.first._connection)
+        with self.assertRaises(RuntimeError):
+            self.first._executor.submit(print)
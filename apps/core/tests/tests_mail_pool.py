@@ -0,0 +1,33 @@
+import smtplib
+from unittest import mock
+from django.core import mail
+from django.test import SimpleTestCase, override_settings
+from apps.core.utils.mail_pool import SMTPConnectionPool
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   EMAIL_POOL_SIZE=1)
+class TestSMTPConnectionPool(SimpleTestCase):
+    def setUp(self):
+        self.pool = SMTPConnectionPool()
+
+    def test_connection_is_reused(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+
+    def test_send_retries_once_when_server_disconnects(self):
+        email = mail.EmailMessage("subject", "body", "from@gmail.com", ["to@gmail.com"])
+        with self.pool.connection() as conn:
+            pass
+
+        with mock.patch.object(conn, "send_messages", side_effect=[
+                smtplib.SMTPServerDisconnected("gone"), 1]) as send, \
+                mock.patch.object(conn, "close") as close:
+            sent = self.pool.send_messages([email])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(send.call_count, 2)
+        close.assert_called_once()
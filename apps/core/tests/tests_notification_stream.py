@@ -0,0 +1,149 @@
+import json
+import time
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import override_settings
+from django.urls import reverse
+from apps.core.consumers import NotificationConsumer
+from apps.core.models import NotificationType
+from apps.core.services.notification_service import NotificationService
+from apps.core.services.stream_service import NotificationStreamService
+from .base import NotificationTestCase
+
+
+@override_settings(NOTIFICATION_REPLAY_LIMIT=5)
+class TestNotificationReplay(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.notifications = NotificationService.bulk_create([
+            {"user": self.user, "type": NotificationType.MESSAGE_SENT, "title": f"Sent {i}", "message": "sent"}
+            for i in range(8)
+        ])
+
+    def connect(self, query):
+        async def first_frame():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), f"/ws/notifications/?{query}")
+            communicator.scope["user"] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            frame = None if await communicator.receive_nothing() else await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+        return async_to_sync(first_frame)()
+
+    def test_reconnect_replays_missed_notifications_in_one_frame(self):
+        frame = self.connect(f"last_seen_id={self.notifications[4].id}")
+
+        self.assertTrue(frame["replay"])
+        self.assertFalse(frame["has_more"])
+        self.assertEqual([n["title"] for n in frame["notifications"]], ["Sent 5", "Sent 6", "Sent 7"])
+        self.assertEqual(frame["unread_count"], 8)
+
+    def test_replay_continues_after_a_deleted_notification(self):
+        last_seen_id = self.notifications[4].id
+        self.notifications[4].delete()
+
+        frame = self.connect(f"last_seen_id={last_seen_id}")
+
+        self.assertEqual([n["title"] for n in frame["notifications"]], ["Sent 5", "Sent 6", "Sent 7"])
+
+    def test_invalid_since_is_ignored(self):
+        self.assertIsNone(self.connect("since=2024-13-01T00:00:00Z"))
+
+    def test_replay_is_capped(self):
+        frame = self.connect("since=2000-01-01T00:00:00Z")
+
+        self.assertTrue(frame["has_more"])
+        self.assertEqual([n["title"] for n in frame["notifications"]], [f"Sent {i}" for i in range(5)])
+
+
+@override_settings(NOTIFICATION_STREAM_POLL_INTERVAL=30, NOTIFICATION_STREAM_HEARTBEAT=30)
+class TestNotificationStream(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.notify("First")
+        self.client.force_authenticate(self.user)
+
+    def notify(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return NotificationService.create(self.user, NotificationType.MESSAGE_SENT, title, "sent")
+
+    @staticmethod
+    def data(event):
+        return json.loads(event.split("data: ", 1)[1])
+
+    def test_long_poll_answers_with_missed_notifications(self):
+        second = self.notify("Second")
+
+        response = self.client.get(reverse('notification-poll'), {"last_seen_id": self.first.id})
+
+        self.assertEqual([n["title"] for n in response.data["notifications"]], ["Second"])
+        self.assertEqual(response.data["last_seen_id"], second.id)
+        self.assertEqual(response.data["unread_count"], 2)
+
+        response = self.client.get(
+            reverse('notification-poll'), {"last_seen_id": second.id, "timeout": 0})
+        self.assertEqual(response.data["notifications"], [])
+
+    def test_stream_wakes_on_pushed_notification(self):
+        # no cursor, nothing is read before the hub wakes the stream (the poll interval is 30s)
+        events = NotificationStreamService.stream(self.user.id, duration=10)
+        self.assertTrue(next(events).startswith("retry:"))
+
+        self.notify("Second")
+        started = time.monotonic()
+        event = next(events)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn("event: notifications", event)
+        self.assertEqual([n["title"] for n in self.data(event)["notifications"]], ["Second"])
+
+        NotificationService._push_read_state(self.user.id, [self.first.id])
+        event = next(events)
+        self.assertIn("event: notifications_read", event)
+        self.assertEqual(self.data(event)["ids"], [str(self.first.id)])
+        events.close()
+
+    def test_stream_endpoint_is_disabled_by_default(self):
+        response = self.client.get(reverse('notification-stream'), HTTP_ACCEPT="text/event-stream")
+
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(NOTIFICATION_SSE_ENABLED=True)
+    def test_stream_endpoint_resumes_after_last_event_id(self):
+        self.notify("Second")
+
+        response = self.client.get(
+            reverse('notification-stream'), HTTP_ACCEPT="text/event-stream",
+            HTTP_LAST_EVENT_ID=str(self.first.id))
+        content = iter(response.streaming_content)
+        next(content)
+        event = next(content).decode()
+        response.close()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream; charset=utf-8")
+        self.assertEqual([n["title"] for n in self.data(event)["notifications"]], ["Second"])
+
+
+@override_settings(NOTIFICATION_COALESCE_MS=50)
+class TestNotificationConsumerFrames(NotificationTestCase):
+    def test_close_events_are_sent_as_one_batch(self):
+        first = NotificationService._message("send_notification", {"type": "notification", "n": 1})
+        second = NotificationService._message("send_read_state", {"type": "notifications_read", "n": 2})
+
+        async def run():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), "/ws/notifications/")
+            communicator.scope["user"] = self.user
+            await communicator.connect()
+            layer = get_channel_layer()
+            await layer.group_send(f"notify_{self.user.id}", first)
+            await layer.group_send(f"notify_{self.user.id}", second)
+            frame = await communicator.receive_json_from(timeout=5)
+            await communicator.disconnect()
+            return frame
+
+        frame = async_to_sync(run)()
+
+        self.assertEqual(frame["type"], "batch")
+        self.assertEqual([f["n"] for f in frame["frames"]], [1, 2])
@@ -0,0 +1,176 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from apps.core.models import Notification, NotificationCounter, NotificationType
+from apps.core.services.counter_service import NotificationCounterService
+from apps.core.services.notification_service import NotificationService
+from .base import NotificationTestCase
+
+
+class TestNotificationPagination(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        Notification.objects.bulk_create([
+            Notification(user=self.user, type=NotificationType.MESSAGE_SENT,
+                         title=f"Message {i}", message="sent", is_read=i % 2 == 0)
+            for i in range(25)
+        ])
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages_cover_every_notification_once(self):
+        url, ids = reverse('notification-list') + "?page_size=10", []
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn("count", response.data)
+            self.assertEqual(response.data["results"]["unread_count"], 12)
+            ids += [item["id"] for item in response.data["results"]["results"]]
+            url = response.data["next"]
+
+        expected = list(Notification.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+
+class TestNotificationFanOut(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = get_user_model().objects.create_user(email="other@gmail.com", password="password@123")
+        self.layer = get_channel_layer()
+        self.channels = {}
+        for user in (self.user, self.other):
+            channel = async_to_sync(self.layer.new_channel)()
+            async_to_sync(self.layer.group_add)(f"notify_{user.id}", channel)
+            self.channels[user.id] = channel
+
+    def test_bulk_create_sends_one_frame_per_user(self):
+        data = [{"user": self.user, "type": NotificationType.MESSAGE_SENT, "title": f"Sent {i}",
+                 "message": "sent", "content_object": self.other} for i in range(3)]
+        data.append({"user": self.other, "type": NotificationType.MESSAGE_SENT,
+                     "title": "Sent", "message": "sent"})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            NotificationService.bulk_create(data)
+        for callback in callbacks[:-1]:
+            callback()
+        # the unread counters of both users
+        with self.assertNumQueries(1):
+            callbacks[-1]()
+
+        batched = async_to_sync(self.layer.receive)(self.channels[self.user.id])
+        self.assertEqual(batched["type"], "send_notifications")
+        frame = json.loads(batched["text"])
+        self.assertEqual([n["title"] for n in frame["notifications"]], ["Sent 0", "Sent 1", "Sent 2"])
+        self.assertEqual(frame["notifications"][0]["target_type"], "customuser")
+        self.assertEqual(frame["unread_count"], 3)
+
+        single = async_to_sync(self.layer.receive)(self.channels[self.other.id])
+        self.assertEqual(single["type"], "send_notification")
+        self.assertEqual(json.loads(single["text"])["notification"]["title"], "Sent")
+
+
+class TestUnreadCounter(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            NotificationService.create(self.user, NotificationType.MESSAGE_SENT, f"Sent {i}", "sent")
+        self.client.force_authenticate(self.user)
+
+    def unread_count(self):
+        response = self.client.get(reverse('notification-list'))
+        return response.data["results"]["unread_count"]
+
+    def test_counter_follows_read_and_unread(self):
+        notification = Notification.objects.filter(user=self.user).first()
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notification-read', args=[notification.id]))
+            self.client.post(reverse('notification-read', args=[notification.id]))
+        self.assertEqual(self.unread_count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notification-unread', args=[notification.id]))
+        self.assertEqual(self.unread_count(), 3)
+
+    def test_late_fill_does_not_hide_a_newer_count(self):
+        set_many = cache.set_many
+        changed = []
+
+        def change_then_fill(*args, **kwargs):
+            # the count was read, a notification commits before it is cached
+            if not changed:
+                changed.append(True)
+                with self.captureOnCommitCallbacks(execute=True):
+                    NotificationService.create(self.user, NotificationType.MESSAGE_SENT, "Late", "sent")
+            set_many(*args, **kwargs)
+
+        with patch.object(cache, "set_many", side_effect=change_then_fill):
+            self.assertEqual(NotificationCounterService.get(self.user.id), 3)
+        self.assertEqual(NotificationCounterService.get(self.user.id), 4)
+
+    def test_counter_starts_from_notifications_made_before_it(self):
+        other = get_user_model().objects.create_user(email="other@gmail.com", password="password@123")
+        Notification.objects.create(user=other, type=NotificationType.MESSAGE_SENT, title="Old", message="sent")
+
+        NotificationService.create(other, NotificationType.MESSAGE_SENT, "New", "sent")
+
+        self.assertEqual(NotificationCounter.objects.get(user=other).unread, 2)
+
+    def test_reconcile_fixes_drift(self):
+        Notification.objects.filter(user=self.user).update(is_read=True)
+        self.assertEqual(self.unread_count(), 3)
+
+        call_command("reconcile_notification_counters", stdout=StringIO())
+
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 0)
+        self.assertEqual(self.unread_count(), 0)
+
+
+class TestBulkRead(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        NotificationService.bulk_create([
+            {"user": self.user, "type": NotificationType.MESSAGE_SENT, "title": f"Sent {i}", "message": "sent"}
+            for i in range(30)
+        ])
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(f"notify_{self.user.id}", self.channel)
+        self.client.force_authenticate(self.user)
+
+    def test_read_by_ids_is_one_update_and_one_frame(self):
+        ids = list(Notification.objects.filter(user=self.user).values_list("id", flat=True)[:20])
+        Notification.objects.filter(id=ids[0]).update(is_read=True)
+        NotificationCounter.objects.filter(user=self.user).update(unread=29)
+        other = get_user_model().objects.create_user(email="other@gmail.com", password="password@123")
+        foreign = Notification.objects.create(
+            user=other, type=NotificationType.MESSAGE_SENT, title="Not yours", message="sent")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('notification-read-many'), {"ids": ids + [foreign.id]}, format='json')
+
+        self.assertEqual(response.data["updated"], 19)
+        self.assertFalse(Notification.objects.get(id=foreign.id).is_read)
+        frame = async_to_sync(self.layer.receive)(self.channel)
+        self.assertEqual(frame["type"], "send_read_state")
+        # only the notifications this request changed: not the foreign one, nor the one already read
+        self.assertEqual(sorted(frame["ids"]), sorted(str(i) for i in ids[1:]))
+        self.assertEqual(frame["unread_count"], 10)
+
+    def test_read_all(self):
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(5):
+            # the counter lookup, one UPDATE of the notifications and one of the counter, in a savepoint
+            response = self.client.post(reverse('notification-read-all'))
+
+        self.assertEqual(response.data["updated"], 30)
+        self.assertFalse(Notification.objects.filter(user=self.user, is_read=False).exists())
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 0)
+        frame = json.loads(async_to_sync(self.layer.receive)(self.channel)["text"])
+        self.assertIsNone(frame["ids"])
+        self.assertEqual(frame["unread_count"], 0)
@@ -0,0 +1,71 @@
+import threading
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from apps.core.utils.tiered_cache import TieredCache
+from .base import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestTieredCache(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TieredCache("test", ttl=60, stale_ttl=600, local_ttl=5)
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_local_hit_skips_shared_cache(self):
+        self.assertEqual(self.cache.get_or_set(1, self.compute), 1)
+        with mock.patch.object(cache, "get_many") as get_many:
+            self.assertEqual(self.cache.get_or_set(1, self.compute), 1)
+        get_many.assert_not_called()
+
+    def test_invalidate_serves_stale_while_another_process_recomputes(self):
+        self.cache.get_or_set(1, self.compute)
+        self.cache.invalidate(1)
+
+        cache.add("test:lease:1", 1)  # held by another process
+        self.assertEqual(self.cache.get_or_set(1, self.compute), 1)
+        self.assertEqual(self.calls, 1)
+
+        cache.delete("test:lease:1")
+        self.assertEqual(self.cache.get_or_set(1, self.compute), 2)
+
+    def test_expired_lease_taken_by_another_process_is_kept(self):
+        def compute():
+            # our lease expired and another process took it meanwhile
+            cache.set("test:lease:1", "other", 30)
+            return self.compute()
+
+        self.assertEqual(self.cache.get_or_set(1, compute), 1)
+        self.assertEqual(cache.get("test:lease:1"), "other")
+
+    def test_concurrent_misses_compute_once(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_compute():
+            started.set()
+            release.wait(5)
+            return self.compute()
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(self.cache.get_or_set(1, slow_compute)))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(self.cache.get_or_set(1, slow_compute)))
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(results, [1, 1])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache._flights, {})
+
+    def test_flight_locks_are_dropped_after_use(self):
+        for scope in range(100):
+            self.cache.get_or_set(scope, self.compute)
+        self.assertEqual(self.cache._flights, {})
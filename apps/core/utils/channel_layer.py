@@ -0,0 +1,326 @@
+import asyncio
+import random
+import sqlite3
+import string
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS channel_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        expires REAL NOT NULL,
+        body BLOB NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS channel_messages_owner ON channel_messages (owner, id)",
+    "CREATE INDEX IF NOT EXISTS channel_messages_channel ON channel_messages (channel, id)",
+    "CREATE INDEX IF NOT EXISTS channel_messages_expires ON channel_messages (expires)",
+    """CREATE TABLE IF NOT EXISTS channel_groups (
+        group_name TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        expires REAL NOT NULL,
+        PRIMARY KEY (group_name, channel))""",
+    "CREATE INDEX IF NOT EXISTS channel_groups_channel ON channel_groups (channel)",
+)
+
+
+class _Receiver:
+    """channels waiting in receive() on one event loop, and the task reading their messages"""
+
+    def __init__(self):
+        self.queues = {}  # channel -> asyncio.Queue
+        self.task = None
+        self.wake = asyncio.Event()  # set by sends of this process, no need to wait for the next poll
+        self.changed = False  # a channel started waiting, read even if the database did not change
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    '''
+    Channel layer for several processes on one host (daphne workers, the
+    delivery worker) without Redis: messages and group memberships live in a
+    SQLite database in WAL mode, shared through the file system.
+
+    - every process (layer instance) has its own prefix for the channels of
+      new_channel(), and one task per event loop reads the messages of all the
+      channels waiting in receive() with a single query per poll. Between polls
+      `PRAGMA data_version` tells whether another process wrote anything, so an
+      idle layer does not read the table
+    - sends and group_sends of one process are written by one thread; the ones
+      queued while a write is running are written together in the next
+      transaction, and a group_send is one INSERT per member channel, with the
+      message encoded (msgpack) once
+    - messages expire after `expiry` seconds (the channel is then dropped from
+      its groups, like InMemoryChannelLayer does) and memberships after
+      `group_expiry`
+
+    `python manage.py benchmark_channel_layer` compares it with InMemoryChannelLayer.
+    '''
+    extensions = ["groups", "flush"]
+    CLEANUP_INTERVAL = 10  # seconds between two purges of expired rows
+    IDLE_READ_INTERVAL = 1  # read at least this often even if data_version did not change
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.02, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.client_id = uuid.uuid4().hex[:12]
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-channel-layer")
+        self._connection = None  # only used from the executor thread
+        self._data_version = None
+        self._wrote = False  # messages written by this process, data_version only counts other processes
+        self._last_read = 0
+        self._last_cleanup = 0
+        self._pending = []  # (kind, args, future) waiting for the next write
+        self._pending_lock = threading.Lock()
+        self._write_scheduled = False
+        self._receivers = {}  # event loop -> _Receiver
+        self._closed = False
+
+    # ---- database, executor thread only
+    def _db(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _write(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+            self._write_scheduled = False
+        if not pending:
+            return
+
+        db = self._db()
+        now = time.time()
+        results = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for kind, args, _ in pending:
+                results.append(getattr(self, f"_write_{kind}")(db, now, *args))
+            db.execute("COMMIT")
+            self._wrote = self._wrote or any(kind in ("send", "group_send") for kind, _, _ in pending)
+        except Exception as exc:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            for _, _, future in pending:
+                future.set_exception(exc)
+            return
+        for (_, _, future), result in zip(pending, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _queue_write(self, kind, *args):
+        future = Future()
+        with self._pending_lock:
+            self._pending.append((kind, args, future))
+            schedule = not self._write_scheduled
+            self._write_scheduled = True
+        if schedule:
+            self._executor.submit(self._write)
+        return asyncio.wrap_future(future)
+
+    def _full_channels(self, db, now, channels):
+        full = set()
+        channels = list(channels)
+        # under SQLite's limit of 999 parameters per statement
+        for start in range(0, len(channels), 500):
+            chunk = channels[start:start + 500]
+            rows = db.execute(
+                f"SELECT channel, COUNT(*) FROM channel_messages WHERE channel IN "
+                f"({', '.join('?' * len(chunk))}) AND expires >= ? GROUP BY channel", (*chunk, now))
+            full.update(channel for channel, count in rows if count >= self.get_capacity(channel))
+        return full
+
+    def _write_send(self, db, now, channel, body):
+        if self._full_channels(db, now, [channel]):
+            return ChannelFull(channel)
+        db.execute("INSERT INTO channel_messages (owner, channel, expires, body) VALUES (?, ?, ?, ?)",
+                   (self.non_local_name(channel), channel, now + self.expiry, body))
+        return None
+
+    def _write_group_send(self, db, now, group, body):
+        channels = [channel for (channel,) in db.execute(
+            "SELECT channel FROM channel_groups WHERE group_name = ? AND expires >= ?", (group, now))]
+        full = self._full_channels(db, now, channels)
+        db.executemany("INSERT INTO channel_messages (owner, channel, expires, body) VALUES (?, ?, ?, ?)", [
+            (self.non_local_name(channel), channel, now + self.expiry, body)
+            for channel in channels if channel not in full])
+        return len(channels) - len(full)
+
+    def _write_group_add(self, db, now, group, channel):
+        db.execute("INSERT OR REPLACE INTO channel_groups (group_name, channel, expires) VALUES (?, ?, ?)",
+                   (group, channel, now + self.group_expiry))
+
+    def _write_group_discard(self, db, now, group, channel):
+        db.execute("DELETE FROM channel_groups WHERE group_name = ? AND channel = ?", (group, channel))
+
+    def _cleanup(self, db, now):
+        db.execute("BEGIN IMMEDIATE")
+        # a channel whose messages expire is not read anymore, its consumer is gone
+        db.execute("DELETE FROM channel_groups WHERE expires < ? OR channel IN "
+                   "(SELECT channel FROM channel_messages WHERE expires < ?)", (now, now))
+        db.execute("DELETE FROM channel_messages WHERE expires < ?", (now,))
+        db.execute("COMMIT")
+        self._last_cleanup = now
+
+    def _claim(self, channels, force):
+        """messages of the waiting `channels`, left in the table until they are delivered: [(id, channel, body)]"""
+        db = self._db()
+        now = time.time()
+        if now - self._last_cleanup > self.CLEANUP_INTERVAL:
+            self._cleanup(db, now)
+
+        version = db.execute("PRAGMA data_version").fetchone()[0]
+        if (not force and not self._wrote and version == self._data_version
+                and now - self._last_read < self.IDLE_READ_INTERVAL):
+            return []
+        self._data_version, self._last_read, self._wrote = version, now, False
+
+        owners = list({self.non_local_name(channel) for channel in channels})
+        waiting = set(channels)
+        return [row for row in db.execute(
+            f"SELECT id, channel, body FROM channel_messages WHERE owner IN ({', '.join('?' * len(owners))}) "
+            f"AND expires >= ? ORDER BY id", (*owners, now)) if row[1] in waiting]
+
+    def _delete(self, ids):
+        """remove the delivered messages"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            db.execute(f"DELETE FROM channel_messages WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+        db.execute("COMMIT")
+
+    def _claim_one(self, channel):
+        """oldest message of a channel shared by several processes, None when there is none (SQLite >= 3.35)"""
+        row = self._db().execute(
+            "DELETE FROM channel_messages WHERE id = (SELECT id FROM channel_messages "
+            "WHERE channel = ? AND expires >= ? ORDER BY id LIMIT 1) RETURNING body",
+            (channel, time.time())).fetchone()
+        return row[0] if row else None
+
+    # ---- channel layer API
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        await self._queue_write("send", channel, msgpack.packb(message, use_bin_type=True))
+        self._wake_receivers()
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._queue_write("group_send", group, msgpack.packb(message, use_bin_type=True))
+        self._wake_receivers()
+
+    def _wake_receivers(self):
+        for loop, receiver in list(self._receivers.items()):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(receiver.wake.set)
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._queue_write("group_add", group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        await self._queue_write("group_discard", group, channel)
+
+    async def new_channel(self, prefix="specific."):
+        return "%s.%s!%s" % (
+            prefix, self.client_id, "".join(random.choice(string.ascii_letters) for _ in range(12)))
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if "!" not in channel:
+            return await self._receive_shared(channel)
+
+        loop = asyncio.get_running_loop()
+        receiver = self._receivers.setdefault(loop, _Receiver())
+        queue = receiver.queues.get(channel)
+        if queue is None:
+            queue = receiver.queues[channel] = asyncio.Queue()
+            receiver.changed = True
+        if receiver.task is None or receiver.task.done():
+            receiver.task = loop.create_task(self._poll(loop, receiver))
+        try:
+            return await queue.get()
+        finally:
+            if queue.empty():
+                receiver.queues.pop(channel, None)
+
+    async def _receive_shared(self, channel):
+        while True:
+            body = await self._run(self._claim_one, channel)
+            if body is not None:
+                return msgpack.unpackb(body, raw=False)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self, loop, receiver):
+        try:
+            while receiver.queues:
+                force, receiver.changed = receiver.changed, False
+                delivered = []
+                for message_id, channel, body in await self._run(self._claim, list(receiver.queues), force):
+                    # a receive() may have stopped while the claim ran, its messages stay
+                    # in the table for the next one
+                    queue = receiver.queues.get(channel)
+                    if queue is not None:
+                        queue.put_nowait(msgpack.unpackb(body, raw=False))
+                        delivered.append(message_id)
+                # channels of new_channel() are only read by the process that made them,
+                # no other reader can take these rows before they are deleted
+                if delivered:
+                    await self._run(self._delete, delivered)
+                try:
+                    await asyncio.wait_for(receiver.wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                receiver.wake.clear()
+        finally:
+            if self._receivers.get(loop) is receiver and not receiver.queues:
+                del self._receivers[loop]
+
+    async def flush(self):
+        def flush():
+            db = self._db()
+            db.execute("DELETE FROM channel_messages")
+            db.execute("DELETE FROM channel_groups")
+        await self._run(flush)
+
+    async def close(self):
+        """Stop the receivers and release the database and the writer thread, the layer is unusable after"""
+        if self._closed:
+            return
+        self._closed = True
+        for receiver in list(self._receivers.values()):
+            if receiver.task is not None:
+                receiver.task.cancel()
+        self._receivers.clear()
+
+        def close():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        # queued after the pending writes, the connection belongs to the executor thread
+        await self._run(close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,81 @@
+import queue
+import threading
+from collections import defaultdict
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    '''
+    Events of one user for one open stream. The queue is bounded: when the
+    reader falls behind, events are dropped and `overflowed` is set, the
+    reader then catches up from the database instead.
+    '''
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """next event, None when nothing came within `timeout` seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """events queued so far, without waiting"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class NotificationEventHub:
+    '''
+    In-process fan-out of the events NotificationService sends to the channel
+    layer, for the SSE and long-poll endpoints of hosts without WebSockets.
+
+    It only reaches streams served by the process that created the
+    notification (a web request), events of other processes (the delivery
+    worker) are picked up by the streams' periodic database catch-up.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)  # user id -> subscriptions
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions[str(user_id)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        user_id = str(subscription.user_id)
+        with self._lock:
+            subscriptions = self._subscriptions.get(user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(str(user_id), ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+notification_hub = NotificationEventHub()
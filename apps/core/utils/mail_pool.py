@@ -0,0 +1,112 @@
+import atexit
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+import logging
+
+logger = logging.getLogger(__name__)
+
+# errors meaning the server dropped the session, the connection can simply be reopened
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class SMTPConnectionPool:
+    '''
+    Keeps up to EMAIL_POOL_SIZE authenticated mail connections open per process,
+    so sending a message does not pay a new TLS handshake and login every time.
+
+    Connections idle for longer than EMAIL_POOL_MAX_IDLE seconds are reopened
+    before use, and a send that fails because the server hung up is retried
+    once on a fresh session.
+    '''
+
+    def __init__(self):
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _acquire(self):
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < settings.EMAIL_POOL_SIZE
+                if can_create:
+                    self._created += 1
+            if can_create:
+                return get_connection(fail_silently=False)
+            # every connection is busy, wait for one to come back
+            conn, last_used = self._idle.get(timeout=settings.EMAIL_POOL_TIMEOUT)
+
+        if time.monotonic() - last_used > settings.EMAIL_POOL_MAX_IDLE:
+            # the server has most likely timed the session out already
+            self._reset(conn)
+        return conn
+
+    def _release(self, conn):
+        self._idle.put((conn, time.monotonic()))
+
+    @staticmethod
+    def _reset(conn):
+        try:
+            conn.close()
+        except Exception as exc:
+            logger.debug(f"Ignoring error while closing mail connection: {exc}")
+
+    @contextmanager
+    def connection(self):
+        """Borrow an open connection, it goes back to the pool when the block exits"""
+        conn = self._acquire()
+        try:
+            conn.open()  # no-op when the session is still open
+            yield conn
+        except RECONNECT_ERRORS:
+            self._reset(conn)
+            raise
+        finally:
+            self._release(conn)
+
+    def send_messages(self, email_messages, connection=None):
+        """
+        Send EmailMessage objects over a pooled session, returns the number sent.
+        Pass a connection borrowed with `connection()` to send several batches
+        over the same session.
+        """
+        if connection is None:
+            with self.connection() as conn:
+                return self.send_messages(email_messages, connection=conn)
+
+        try:
+            return connection.send_messages(email_messages)
+        except RECONNECT_ERRORS as exc:
+            logger.info(f"Mail server dropped the connection ({exc}), reconnecting")
+            self._reset(connection)
+            connection.open()
+            return connection.send_messages(email_messages)
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._reset(conn)
+            with self._lock:
+                self._created -= 1
+
+
+mail_pool = SMTPConnectionPool()
+atexit.register(mail_pool.close_all)
+
+
+@receiver(setting_changed)
+def _reset_pool_on_email_settings_change(setting, **kwargs):
+    # tests switch EMAIL_BACKEND with override_settings
+    if setting.startswith("EMAIL_"):
+        mail_pool.close_all()
@@ -0,0 +1,171 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TieredCache:
+    '''
+    Two level cache for values that are expensive to compute (dashboard metrics).
+
+    - L1: a small per-process dict, read without touching the shared cache for
+      `local_ttl` seconds (a DatabaseCache hit is itself a SQL query)
+    - L2: django's default cache, shared by every process
+
+    Every scope (e.g. a user id) has a version token in L2. invalidate() swaps
+    the token instead of deleting the value, so the previous value is still
+    there to serve while a single caller recomputes (stale-while-revalidate).
+    Values are stale once their version no longer matches or `ttl` passed, and
+    are dropped `stale_ttl` seconds after that.
+
+    Only one thread per process and one process (through a lease in L2) recomputes
+    a scope at a time, the others get the stale value or wait for the new one.
+    '''
+
+    def __init__(self, namespace, ttl, stale_ttl, local_ttl, max_local_entries=1024,
+                 lease_timeout=30, wait_timeout=5):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.local_ttl = local_ttl
+        self.max_local_entries = max_local_entries
+        self.lease_timeout = lease_timeout
+        self.wait_timeout = wait_timeout
+        self._local = OrderedDict()  # scope -> (expires, value)
+        self._lock = threading.Lock()
+        self._flights = {}  # scope -> [lock of the thread computing it, threads using the lock]
+
+    def _key(self, kind, scope):
+        return f"{self.namespace}:{kind}:{scope}"
+
+    # ---- L1
+    def _local_get(self, scope):
+        with self._lock:
+            entry = self._local.get(scope)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._local[scope]
+                return None
+            self._local.move_to_end(scope)
+            return entry
+
+    def _local_set(self, scope, value):
+        with self._lock:
+            self._local[scope] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(scope)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+    # ---- L2
+    def _read(self, scope):
+        """(version, entry) from the shared cache in one round trip"""
+        version_key, value_key = self._key("version", scope), self._key("value", scope)
+        found = cache.get_many([version_key, value_key])
+        return found.get(version_key), found.get(value_key)
+
+    @staticmethod
+    def _is_fresh(version, entry):
+        return (entry is not None and version is not None and
+                entry["version"] == version and entry["fresh_until"] > time.time())
+
+    def _current_version(self, scope):
+        version_key = self._key("version", scope)
+        cache.add(version_key, uuid.uuid4().hex, None)
+        return cache.get(version_key)
+
+    def _flight_enter(self, scope):
+        with self._lock:
+            flight = self._flights.setdefault(scope, [threading.Lock(), 0])
+            flight[1] += 1
+            return flight[0]
+
+    def _flight_exit(self, scope):
+        """dropped with its last user, _flights only holds the scopes being computed"""
+        with self._lock:
+            flight = self._flights[scope]
+            flight[1] -= 1
+            if not flight[1]:
+                del self._flights[scope]
+
+    def get_or_set(self, scope, compute):
+        """Return the cached value of `scope`, calling `compute()` when it has to be rebuilt"""
+        local = self._local_get(scope)
+        if local is not None:
+            return local[1]
+
+        version, entry = self._read(scope)
+        if self._is_fresh(version, entry):
+            self._local_set(scope, entry["value"])
+            return entry["value"]
+
+        flight = self._flight_enter(scope)
+        if entry is not None:
+            acquired = flight.acquire(blocking=False)
+        else:
+            acquired = flight.acquire(timeout=self.wait_timeout)
+        if not acquired:
+            self._flight_exit(scope)
+            # another thread of this process is already recomputing
+            return entry["value"] if entry is not None else compute()
+
+        try:
+            # it may have been rebuilt while we waited for the lock
+            version, entry = self._read(scope)
+            if self._is_fresh(version, entry):
+                self._local_set(scope, entry["value"])
+                return entry["value"]
+
+            lease_key = self._key("lease", scope)
+            lease = uuid.uuid4().hex
+            if not cache.add(lease_key, lease, self.lease_timeout):
+                # another process is recomputing
+                if entry is not None:
+                    return entry["value"]
+                entry = self._wait_for_value(scope)
+                if entry is not None:
+                    return entry["value"]
+
+            try:
+                return self._compute(scope, compute)
+            finally:
+                # ours unless it expired during compute() and another process took it since
+                if cache.get(lease_key) == lease:
+                    cache.delete(lease_key)
+        finally:
+            flight.release()
+            self._flight_exit(scope)
+
+    def _wait_for_value(self, scope):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            version, entry = self._read(scope)
+            if self._is_fresh(version, entry):
+                return entry
+        logger.warning(f"Gave up waiting for {self._key('value', scope)}, computing it")
+        return None
+
+    def _compute(self, scope, compute):
+        # read the version before computing, an invalidate() while we compute
+        # leaves the new value stale right away instead of hiding the change
+        version = self._current_version(scope)
+        value = compute()
+        entry = {"version": version, "fresh_until": time.time() + self.ttl, "value": value}
+        cache.set(self._key("value", scope), entry, self.ttl + self.stale_ttl)
+        self._local_set(scope, value)
+        return value
+
+    def invalidate(self, scope):
+        """Mark the value of `scope` stale in every process (within local_ttl for other processes)"""
+        cache.set(self._key("version", scope), uuid.uuid4().hex, None)
+        with self._lock:
+            self._local.pop(scope, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
@@ -1,11 +1,20 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
 from .models import Notification
+from .services.counter_service import NotificationCounterService
+from .services.notification_service import NotificationService
+from .services.stream_service import NotificationStreamService
 from .pagination import NotificationPagination
-from .serilalizer import NotificationSerializer, NotificationListSerializer
+from .renderers import EventStreamRenderer
+from .serilalizer import (NotificationSerializer, NotificationListSerializer, NotificationIdsSerializer,
+                          NotificationCursorSerializer)
 
 
 
@@ -23,11 +32,11 @@ class NotificationListView(ReadOnlyModelViewSet):
         return NotificationSerializer
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(user=self.request.user).order_by('-created_at', '-id')
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        unread_count = queryset.filter(is_read=False).count()
+        unread_count = NotificationCounterService.get(request.user.id)
 
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -47,8 +56,7 @@ class NotificationListView(ReadOnlyModelViewSet):
         notification = self.get_object()
 
         if not notification.is_read:
-            notification.is_read = True
-            notification.save(update_fields=["is_read"])
+            notification.mark_as_read()
 
         serializer = self.get_serializer(notification)
         return Response(data={
@@ -61,8 +69,7 @@ class NotificationListView(ReadOnlyModelViewSet):
         notification = self.get_object()
 
         if not notification.is_read:
-            notification.is_read = True
-            notification.save(update_fields=["is_read"])
+            notification.mark_as_read()
 
         return Response(data={
             "message": "Notification marked as read successfully",
@@ -73,9 +80,72 @@ class NotificationListView(ReadOnlyModelViewSet):
         notification = self.get_object()
 
         if notification.is_read:
-            notification.is_read = False
-            notification.save(update_fields=["is_read"])
+            NotificationCounterService.mark_unread(request.user.id, [notification.pk])
 
         return Response(data={
             "message": "Notification marked as unread successfully",
         }, status=200)
+
+    @action(detail=False, methods=['post'], url_path='read-all', url_name='read-all')
+    def read_all(self, request, *args, **kwargs):
+        changed = NotificationService.mark_read(request.user.id)
+
+        return Response(data={
+            "message": "All notifications marked as read successfully",
+            "updated": changed,
+        }, status=200)
+
+    @action(detail=False, methods=['post'], url_path='read', url_name='read-many')
+    def read_many(self, request, *args, **kwargs):
+        serializer = NotificationIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = NotificationService.mark_read(request.user.id, serializer.validated_data["ids"])
+
+        return Response(data={
+            "message": "Notifications marked as read successfully",
+            "updated": changed,
+        }, status=200)
+
+    def _cursor(self, request):
+        query = NotificationCursorSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data
+
+    @action(detail=False, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer],
+            pagination_class=None)
+    def stream(self, request, *args, **kwargs):
+        """
+        Server-Sent Events fallback of the WebSocket. Resumes after the Last-Event-ID
+        header the browser sends on reconnect, else after ?last_seen_id= or ?since=
+        Off unless NOTIFICATION_SSE_ENABLED (each open stream holds a worker), use poll/ then
+        """
+        if not settings.NOTIFICATION_SSE_ENABLED:
+            raise NotFound("Notification streams are disabled, use notifications/poll/.")
+        cursor = self._cursor(request)
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if last_event_id.isdigit():
+            cursor["last_seen_id"] = int(last_event_id)
+
+        response = StreamingHttpResponse(
+            NotificationStreamService.stream(
+                request.user.id, last_seen_id=cursor.get("last_seen_id"), since=cursor.get("since")),
+            content_type="text/event-stream; charset=utf-8")
+        response["Cache-Control"] = "no-cache"
+        # no buffering by nginx in front of the app
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def poll(self, request, *args, **kwargs):
+        """Long poll: answers as soon as there is a notification after the cursor, or after ?timeout= seconds"""
+        cursor = self._cursor(request)
+        notifications, has_more, last_seen_id = NotificationStreamService.wait(
+            request.user.id, last_seen_id=cursor.get("last_seen_id"), since=cursor.get("since"),
+            timeout=cursor.get("timeout"))
+
+        return Response(data={
+            "notifications": notifications,
+            "unread_count": NotificationCounterService.get(request.user.id),
+            "has_more": has_more,
+            "last_seen_id": last_seen_id,
+        }, status=200)
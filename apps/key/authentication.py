@@ -1,6 +1,8 @@
+import time
 from drf_spectacular.extensions import OpenApiAuthenticationExtension
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from .cache import ApiKeyPrincipal, apikey_auth_cache
 from .utils import hash_key
 from .models import APIKey
 
@@ -11,6 +13,7 @@ class ApiKeyAuthentication(BaseAuthentication):
       - X-Api-Key: <raw>  (preferred)
       - ?apikey=<raw>     (fallback for static forms)
     Returns (user, api_key_obj) if valid.
+    Valid and unknown keys are cached per process, see apps/key/cache.py
     """
 
     def authenticate(self, request):
@@ -21,16 +24,27 @@ class ApiKeyAuthentication(BaseAuthentication):
                 "API key required in 'X-Api-Key' header or 'apikey' query parameter")
 
         key_hash = hash_key(raw)
+        hit, principal = apikey_auth_cache.get(key_hash)
+        if hit:
+            if principal is None:
+                raise AuthenticationFailed("Invalid API key")
+            return principal.to_instances()
+
         try:
+            # before the query: a revocation committed after it is newer than the cached entry
+            loaded_at = time.time()
             obj = APIKey.objects.select_related(
-                "route__user").filter(key_hash=key_hash, is_active=True,
-                                      revoked_at__isnull=True).first()
+                "route__user__profile").filter(key_hash=key_hash, is_active=True,
+                                               revoked_at__isnull=True).first()
 
             if not obj:
+                apikey_auth_cache.set_unknown(key_hash)
                 raise AuthenticationFailed("Invalid API key")
 
             if not obj.is_active or not obj.route:
                 raise AuthenticationFailed("API key invalid")
+
+            apikey_auth_cache.set(key_hash, ApiKeyPrincipal.from_apikey(obj), loaded_at)
             return (obj.route.user, obj)
 
         except APIKey.DoesNotExist:
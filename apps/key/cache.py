@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+@dataclass(frozen=True)
+class ApiKeyPrincipal:
+    '''
+    What ApiKeyAuthentication needs to know about a valid key, small enough
+    to keep thousands of them in memory
+    '''
+    key_id: int
+    key_hash: str
+    prefix: str
+    env_choice: str
+    route_id: int
+    route_label: str
+    route_channel: str
+    route_is_active: bool
+    route_config: dict
+    route_recipient_emails: str
+    user_id: object
+    user_email: str
+    plan: str
+
+    @classmethod
+    def from_apikey(cls, obj):
+        """build from an APIKey loaded with select_related('route__user__profile')"""
+        route, user = obj.route, obj.route.user
+        profile = getattr(user, "profile", None)
+        return cls(
+            key_id=obj.id,
+            key_hash=obj.key_hash,
+            prefix=obj.prefix,
+            env_choice=obj.env_choice,
+            route_id=route.id,
+            route_label=route.label,
+            route_channel=route.channel,
+            route_is_active=route.is_active,
+            route_config=route.config,
+            route_recipient_emails=route.recipient_emails,
+            user_id=user.id,
+            user_email=user.email,
+            plan=profile.plan if profile else "free",
+        )
+
+    def to_instances(self):
+        """
+        (user, apikey) model instances without a query. Only the cached fields
+        are loaded, any other field is deferred and fetched on access.
+        """
+        from apps.key.models import APIKey
+        from apps.messaging.models import Route
+
+        user = _from_db(get_user_model(), id=self.user_id, email=self.user_email, is_active=True)
+        route = _from_db(
+            Route, id=self.route_id, label=self.route_label, user_id=self.user_id,
+            channel=self.route_channel, is_active=self.route_is_active,
+            recipient_emails=self.route_recipient_emails, config=self.route_config)
+        apikey = _from_db(
+            APIKey, id=self.key_id, env_choice=self.env_choice, key_hash=self.key_hash,
+            prefix=self.prefix, is_active=True, is_revoked=False, route_id=self.route_id)
+        route.user = user
+        apikey.route = route
+        apikey.principal = self
+        return user, apikey
+
+
+def _from_db(model, **values):
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+class ApiKeyAuthCache:
+    '''
+    Per-process LRU/TTL cache of key_hash -> ApiKeyPrincipal in front of the
+    api key lookup, plus a separate short lived negative cache for unknown
+    hashes so repeated bad keys do not reach the database.
+
+    APIKey.revoke/regenerate and Route updates call invalidate_route(), which
+    also writes the time of the change in the shared django cache. A hit is
+    only used when its principal was loaded after the last change of its
+    route. Each process reads that time at most once per
+    APIKEY_AUTH_REVOCATION_CHECK_INTERVAL seconds per route, so hits make no
+    query and a revocation reaches the other processes within that interval.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valid = OrderedDict()  # key_hash -> (expires, principal, loaded_at)
+        self._unknown = OrderedDict()  # key_hash -> expires
+        self._invalidated = {}  # route_id -> (checked until, time of the last change or None)
+
+    @staticmethod
+    def _route_key(route_id):
+        return f"apikey-auth:route-invalidated:{route_id}"
+
+    def get(self, key_hash):
+        """(hit, principal), a hit with principal None is a known bad key"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._valid.get(key_hash)
+            if entry is not None:
+                if entry[0] <= now:
+                    del self._valid[key_hash]
+                    entry = None
+                else:
+                    self._valid.move_to_end(key_hash)
+
+        if entry is not None:
+            _, principal, loaded_at = entry
+            invalidated_at = self._invalidated_at(principal.route_id, now)
+            if invalidated_at is None or invalidated_at < loaded_at:
+                return True, principal
+            # changed by another process since it was loaded
+            with self._lock:
+                if self._valid.get(key_hash) is entry:
+                    del self._valid[key_hash]
+            return False, None
+
+        with self._lock:
+
+            expires = self._unknown.get(key_hash)
+            if expires is not None:
+                if expires > now:
+                    return True, None
+                del self._unknown[key_hash]
+        return False, None
+
+    def _invalidated_at(self, route_id, now):
+        """time of the last change of the route, read from the shared cache once per interval"""
+        checked = self._invalidated.get(route_id)
+        if checked is not None and checked[0] > now:
+            return checked[1]
+        invalidated_at = cache.get(self._route_key(route_id))
+        with self._lock:
+            if len(self._invalidated) >= settings.APIKEY_AUTH_CACHE_SIZE:
+                self._invalidated.clear()
+            self._invalidated[route_id] = (
+                now + settings.APIKEY_AUTH_REVOCATION_CHECK_INTERVAL, invalidated_at)
+        return invalidated_at
+
+    @staticmethod
+    def _put(store, key_hash, value):
+        store[key_hash] = value
+        store.move_to_end(key_hash)
+        while len(store) > settings.APIKEY_AUTH_CACHE_SIZE:
+            store.popitem(last=False)
+
+    def set(self, key_hash, principal, loaded_at):
+        """`loaded_at`: time.time() taken before the query that loaded the principal"""
+        with self._lock:
+            self._unknown.pop(key_hash, None)
+            self._put(self._valid, key_hash,
+                      (time.monotonic() + settings.APIKEY_AUTH_CACHE_TTL, principal, loaded_at))
+
+    def set_unknown(self, key_hash):
+        with self._lock:
+            self._put(self._unknown, key_hash,
+                      time.monotonic() + settings.APIKEY_AUTH_NEGATIVE_TTL)
+
+    def invalidate_route(self, route_id):
+        """call once the change is committed"""
+        # entries older than this are gone from every process after one TTL
+        invalidated_at = time.time()
+        cache.set(self._route_key(route_id), invalidated_at,
+                  settings.APIKEY_AUTH_CACHE_TTL * 2 + settings.APIKEY_AUTH_REVOCATION_CHECK_INTERVAL)
+        with self._lock:
+            self._invalidated[route_id] = (
+                time.monotonic() + settings.APIKEY_AUTH_REVOCATION_CHECK_INTERVAL, invalidated_at)
+            stale = [key_hash for key_hash, (_, principal, _) in self._valid.items()
+                     if principal.route_id == route_id]
+            for key_hash in stale:
+                del self._valid[key_hash]
+
+    def clear(self):
+        with self._lock:
+            self._valid.clear()
+            self._unknown.clear()
+            self._invalidated.clear()
+
+
+apikey_auth_cache = ApiKeyAuthCache()
@@ -3,6 +3,7 @@ import uuid
 from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
+from .cache import apikey_auth_cache
 from .utils import hash_key
 
 
@@ -58,6 +59,8 @@ class APIKey(models.Model):
             is_revoked=True,
             revoked_at=timezone.now()
         )
+        route_id = self.route_id
+        transaction.on_commit(lambda: apikey_auth_cache.invalidate_route(route_id))
 
     def regenerate(self):
         """
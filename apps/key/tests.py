@@ -1,3 +1,90 @@
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, override_settings
+from apps.key.authentication import ApiKeyAuthentication
+from apps.key.cache import ApiKeyAuthCache, apikey_auth_cache
+from apps.key.models import APIKey
+from apps.messaging.services.route_service import RouteService
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestApiKeyAuthentication(APITestCase):
+    def setUp(self):
+        cache.clear()
+        apikey_auth_cache.clear()
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        self.route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        self.raw_key = keys["live"]["key"]
+        self.apikey = APIKey.objects.get(id=keys["live"]["id"])
+
+    def authenticate(self, raw_key):
+        request = APIRequestFactory().post("/", HTTP_X_API_KEY=raw_key)
+        return ApiKeyAuthentication().authenticate(Request(request))
+
+    def test_cached_key_authenticates_without_queries(self):
+        user, apikey = self.authenticate(self.raw_key)
+        self.assertEqual(apikey.id, self.apikey.id)
+
+        with self.assertNumQueries(0):
+            user, apikey = self.authenticate(self.raw_key)
+            self.assertEqual(user.id, self.user.id)
+            self.assertEqual(apikey.route.id, self.route.id)
+            self.assertEqual(apikey.route.user_id, self.user.id)
+
+    def test_revoked_key_is_rejected_right_away(self):
+        self.authenticate(self.raw_key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apikey.revoke()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.raw_key)
+
+    def test_cache_hits_check_revocations_once_per_interval(self):
+        self.authenticate(self.raw_key)
+
+        with mock.patch.object(cache, "get", wraps=cache.get) as get:
+            for _ in range(3):
+                self.authenticate(self.raw_key)
+
+        self.assertEqual(get.call_count, 1)
+
+    @override_settings(APIKEY_AUTH_REVOCATION_CHECK_INTERVAL=0)
+    def test_key_revoked_by_another_process_is_rejected(self):
+        self.authenticate(self.raw_key)
+
+        # what revoke() does in another process, with its own in-memory cache
+        APIKey.objects.filter(id=self.apikey.id).update(
+            is_active=False, is_revoked=True, revoked_at=timezone.now())
+        ApiKeyAuthCache().invalidate_route(self.route.id)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.raw_key)
+
+    def test_route_update_refreshes_cached_route(self):
+        self.authenticate(self.raw_key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.route.is_active = False
+            self.route.save()
+
+        _, apikey = self.authenticate(self.raw_key)
+        self.assertFalse(apikey.route.is_active)
+
+    def test_unknown_key_is_negatively_cached(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate("inb_live_unknown")
+
+        with self.assertNumQueries(0):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate("inb_live_unknown")
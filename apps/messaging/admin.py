@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Message, Route, UserUsage
+from .models import IdempotencyKey, Message, Route, UserUsage
 # Register your models here.
 
 
@@ -16,3 +16,8 @@ class MessageAdmin(admin.ModelAdmin):
 @admin.register(UserUsage)
 class UserUsageAdmin(admin.ModelAdmin):
     list_display = ('user', 'total_requests', 'requests_today')
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'apikey', 'response_status', 'expires_at')
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_message_search_index(sender, using, **kwargs):
+    from .services.search_service import MessageSearchIndex
+    MessageSearchIndex.ensure_table(using)
 
 
 class MessagingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.messaging'
+
+    def ready(self):
+        # the full text table is not a model, create it after every migrate
+        post_migrate.connect(create_message_search_index, sender=self)
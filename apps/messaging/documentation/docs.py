@@ -62,15 +62,32 @@ MESSAGE_500 = OpenApiExample(
 )
 
 
-SEND_EMAIL_200 = OpenApiExample(
-    "Successful Message Send",
+SEND_EMAIL_202 = OpenApiExample(
+    "Message Queued",
     value={
-        "detail": "Message sent successfully.",
+        "detail": "Message queued for delivery.",
+        "status": "queued",
         "preview_link": "../messages/123/",
         "api_key_prefix": "8h97nI"
     },
     response_only=True,
-    status_codes=["200"],
+    status_codes=["202"],
+)
+
+SEND_EMAIL_BULK_202 = OpenApiExample(
+    "Messages Queued",
+    value={
+        "detail": "1 message(s) queued for delivery, 1 rejected.",
+        "accepted": 1,
+        "rejected": 1,
+        "results": [
+            {"index": 0, "status": "queued", "id": 124, "preview_link": "../messages/124/"},
+            {"index": 1, "status": "rejected", "errors": {"visitor_email": ["Enter a valid email address."]}}
+        ],
+        "api_key_prefix": "8h97nI"
+    },
+    response_only=True,
+    status_codes=["202"],
 )
 
 SEND_EMAIL_400 = OpenApiExample(
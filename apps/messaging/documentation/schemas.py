@@ -1,9 +1,9 @@
-from drf_spectacular.utils import OpenApiExample, extend_schema_view, extend_schema, OpenApiParameter, OpenApiResponse
+from drf_spectacular.utils import OpenApiExample, extend_schema_view, extend_schema, OpenApiParameter, OpenApiResponse, inline_serializer
 from drf_spectacular.types import OpenApiTypes
 from apps.messaging.serializers.api_key_and_route_serializer import RouteApiKeySerializer
 from apps.messaging.serializers.main_serializers import UserUsageSerializer, RouteSerializer, MessageSerializer
 from .docs import (
-    ROUTE_400, ROUTE_404, ROUTE_500, ROUTE_204, MESSAGE_404, MESSAGE_500, ROUTEAPIKEY_CREATE_201_RESPONSE, ROUTEAPIKEY_CREATE_400_RESPONSE, ROUTEAPIKEY_UPDATE_200_RESPONSE, ROUTEAPIKEY_DELETE_204_RESPONSE, SEND_EMAIL_200,
+    ROUTE_400, ROUTE_404, ROUTE_500, ROUTE_204, MESSAGE_404, MESSAGE_500, ROUTEAPIKEY_CREATE_201_RESPONSE, ROUTEAPIKEY_CREATE_400_RESPONSE, ROUTEAPIKEY_UPDATE_200_RESPONSE, ROUTEAPIKEY_DELETE_204_RESPONSE, SEND_EMAIL_202, SEND_EMAIL_BULK_202,
     SEND_EMAIL_400, SEND_EMAIL_401, SEND_EMAIL_403, SEND_EMAIL_429, SEND_EMAIL_500
 )
 
@@ -105,12 +105,11 @@ message_docs = extend_schema_view(
     list=extend_schema(
         summary='List sent messages',
         description=(
-            'Returns a list of messages sent via delivery routes.\n\n'
-            'You can search by:\n'
-            '- `apikey key_hash`\n'
-            '- `recipient_email`\n'
-            '- `status` (e.g., `sent`, `failed`, `queued`)\n\n'
-            '**Example:** `?search=sent`'
+            'Returns a list of messages sent via delivery routes, newest first.\n\n'
+            'Full text search over subject, visitor email, recipients and body, '
+            'every word must match, the last letters of a word may be left out.\n'
+            'Filter by `status` (e.g., `sent`, `failed`, `queued`).\n\n'
+            '**Example:** `?search=refund&status=failed`'
         ),
         responses={
             200: MessageSerializer(many=True),
@@ -123,7 +122,38 @@ message_docs = extend_schema_view(
                 name='search',
                 type=OpenApiTypes.STR,
                 location=OpenApiParameter.QUERY,
-                description='Search by `apikey__key_hash`, `recipient_email`, or `status`.'
+                description='Words to look for in subject, visitor email, recipients and body.'
+            )
+        ]
+    ),
+    export=extend_schema(
+        summary='Export messages',
+        description=(
+            'Streams every message matching the filters of the list (`search`, `status`) in one '
+            'download, newest first, without pagination.\n\n'
+            '`export_format` is `csv` (default) or `ndjson`, one JSON object per line. The body is '
+            'gzipped when the request sends `Accept-Encoding: gzip`.\n\n'
+            '**Example:** `?export_format=ndjson&status=failed`'
+        ),
+        responses={
+            (200, 'text/csv'): OpenApiTypes.STR,
+            (200, 'application/x-ndjson'): OpenApiTypes.STR,
+            400: OpenApiTypes.OBJECT,
+        },
+        tags=['Messages'],
+        parameters=[
+            OpenApiParameter(
+                name='export_format',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                enum=['csv', 'ndjson'],
+                description='File format, csv by default.'
+            ),
+            OpenApiParameter(
+                name='search',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Words to look for in subject, visitor email, recipients and body.'
             )
         ]
     ),
@@ -179,15 +209,19 @@ send_email_with_apikey_doc = extend_schema(
         "  \"website\": \"\"\n"
         "}\n"
         "```\n\n"
+        "### 📬 Delivery\n"
+        "The message is stored with status `queued` and the request returns `202` immediately. "
+        "A background worker (`python manage.py deliver_messages`) sends it; "
+        "follow the `preview_link` to check when it becomes `sent` or `failed`.\n\n"
         "### 📊 Rate Limiting\n"
         "This endpoint is been throttled :10 mail per minutes."
     ),
     request=MessageSerializer,
     responses={
-        200: OpenApiResponse(
+        202: OpenApiResponse(
             response=MessageSerializer,
-            description="Message successfully sent.",
-            examples=[SEND_EMAIL_200],
+            description="Message accepted and queued for delivery.",
+            examples=[SEND_EMAIL_202],
         ),
         400: OpenApiResponse(
             description="Validation or spam check failed.",
@@ -216,7 +250,76 @@ send_email_with_apikey_doc = extend_schema(
             type=str,
             location=OpenApiParameter.QUERY,
             description="Your API key (must be valid and active)."
-        )
+        ),
+        OpenApiParameter(
+            name="Idempotency-Key",
+            type=str,
+            location=OpenApiParameter.HEADER,
+            required=False,
+            description=(
+                "Optional unique value per submission (e.g. a UUID). Retrying with the same key "
+                "within 24 hours returns the original response without sending the email again."
+            )
+        ),
+    ]
+)
+
+
+send_email_bulk_doc = extend_schema(
+    summary="Send many emails via API Key",
+    description=(
+        "Queue up to 500 messages in one request instead of one request per message. "
+        "Authentication, honeypot and `Idempotency-Key` work exactly like `send-email/`.\n\n"
+        "Every item is validated on its own: valid items are queued even when others are rejected. "
+        "`results` holds one entry per item, matched by `index`. "
+        "The request fails with `400` only when no item is valid.\n\n"
+        "```json\n"
+        "{\n"
+        "  \"messages\": [\n"
+        "    {\"visitor_email\": \"jane@example.com\", \"subject\": \"Order #1\", \"body\": \"...\"},\n"
+        "    {\"visitor_email\": \"john@example.com\", \"subject\": \"Order #2\", \"body\": \"...\"}\n"
+        "  ]\n"
+        "}\n"
+        "```\n\n"
+        "### 📊 Rate Limiting\n"
+        "This endpoint is been throttled :10 requests per minutes."
+    ),
+    request=inline_serializer(
+        name="BulkSendEmailRequest",
+        fields={"messages": MessageSerializer(many=True)},
+    ),
+    responses={
+        202: OpenApiResponse(
+            description="At least one message accepted and queued for delivery.",
+            examples=[SEND_EMAIL_BULK_202],
+        ),
+        400: OpenApiResponse(
+            description="No valid message in the request.",
+            examples=[SEND_EMAIL_400],
+        ),
+        401: OpenApiResponse(
+            description="Missing or invalid API key.",
+            examples=[SEND_EMAIL_401],
+        ),
+        429: OpenApiResponse(
+            description="Rate limit exceeded.",
+            examples=[SEND_EMAIL_429],
+        ),
+    },
+    parameters=[
+        OpenApiParameter(
+            name="apikey",
+            type=str,
+            location=OpenApiParameter.QUERY,
+            description="Your API key (must be valid and active)."
+        ),
+        OpenApiParameter(
+            name="Idempotency-Key",
+            type=str,
+            location=OpenApiParameter.HEADER,
+            required=False,
+            description="Optional unique value per request, retries with the same key are not queued again."
+        ),
     ]
 )
 
@@ -0,0 +1,23 @@
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+from .services.search_service import MessageSearchIndex
+
+
+class MessageSearchFilter(SearchFilter):
+    '''
+    `?search=` backed by the message full text index, falls back to the
+    view's search_fields (icontains) where the index is not available or
+    cannot match a term
+    '''
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if (not terms or not MessageSearchIndex.is_available(queryset.db)
+                or not MessageSearchIndex.can_match(terms, using=queryset.db)):
+            return super().filter_queryset(request, queryset, view)
+
+        match = MessageSearchIndex.match_sql(terms, using=queryset.db)
+        if match is None:
+            return queryset
+        sql, params = match
+        return queryset.filter(pk__in=RawSQL(sql, params))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from apps.messaging.services.archive_service import MessageArchiveService
+
+
+class Command(BaseCommand):
+    help = ("Move sent/failed messages older than their plan's MESSAGE_RETENTION_DAYS to "
+            "compressed archive segments (run daily from cron)")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Messages per batch, defaults to MESSAGE_ARCHIVE_BATCH_SIZE")
+        parser.add_argument(
+            "--max-batches", type=int, default=None,
+            help="Stop after this many batches, the rest is archived by the next run")
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only count the messages that would be archived")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            count = MessageArchiveService.expired().count()
+            self.stdout.write(f"{count} message(s) past retention")
+            return
+
+        archived = MessageArchiveService.archive(
+            batch_size=options["batch_size"], max_batches=options["max_batches"])
+        self.stdout.write(f"Archived {archived} message(s)")
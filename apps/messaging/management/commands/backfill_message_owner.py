@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from apps.key.models import APIKey
+from apps.messaging.models import Message
+
+
+class Command(BaseCommand):
+    help = "Copy route and user from the api key onto messages saved before they were stored on Message"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Number of messages updated per transaction")
+
+    def handle(self, *args, **options):
+        keys = APIKey.objects.filter(id=OuterRef("apikey_id"))
+        pending = Message.objects.filter(user__isnull=True, apikey__isnull=False)
+        last_id, updated = 0, 0
+
+        while True:
+            ids = list(
+                pending.filter(id__gt=last_id).order_by("id")
+                .values_list("id", flat=True)[:options["batch_size"]]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                updated += Message.objects.filter(id__in=ids).update(
+                    route_id=Subquery(keys.values("route_id")[:1]),
+                    user_id=Subquery(keys.values("route__user_id")[:1]),
+                )
+            last_id = ids[-1]
+            self.stdout.write(f"Backfilled {updated} message(s) up to id {last_id}")
+
+        self.stdout.write(f"Done, {updated} message(s) backfilled")
@@ -0,0 +1,41 @@
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.messaging.services.delivery_service import DeliveryService
+
+
+class Command(BaseCommand):
+    help = "Deliver queued messages. Runs until stopped unless --once is passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Process a single batch and exit (useful for cron)")
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.MESSAGE_DELIVERY_BATCH_SIZE,
+            help="Number of messages claimed per batch")
+        parser.add_argument(
+            "--interval", type=float, default=settings.MESSAGE_DELIVERY_POLL_INTERVAL,
+            help="Seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **options):
+        self._running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write("Message delivery worker started")
+        while self._running:
+            processed = DeliveryService.process_queue(options["batch_size"])
+            if processed:
+                self.stdout.write(f"Processed {processed} message(s)")
+
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["interval"])
+        self.stdout.write("Message delivery worker stopped")
+
+    def _stop(self, signum, frame):
+        # finish the current batch before exiting
+        self._running = False
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.messaging.services.idempotency_service import IdempotencyService
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key records (run daily from cron)"
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyService.purge_expired()
+        self.stdout.write(f"Deleted {deleted} expired idempotency key(s)")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.messaging.models import Message
+from apps.messaging.services.search_service import MessageSearchIndex
+
+
+class Command(BaseCommand):
+    help = "Index every message in the full text search table (after enabling search on existing data)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Number of messages indexed per statement")
+
+    def handle(self, *args, **options):
+        if not MessageSearchIndex.ensure_table():
+            raise CommandError("Full text search is not supported on this database")
+
+        batch, indexed = [], 0
+        messages = Message.objects.only(
+            "id", "subject", "visitor_email", "recipient_emails", "body").order_by("id")
+        for message in messages.iterator(chunk_size=options["batch_size"]):
+            batch.append(message)
+            if len(batch) >= options["batch_size"]:
+                MessageSearchIndex.index_messages(batch)
+                indexed += len(batch)
+                batch = []
+        MessageSearchIndex.index_messages(batch)
+        indexed += len(batch)
+        self.stdout.write(f"Indexed {indexed} message(s)")
@@ -0,0 +1,34 @@
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.messaging.services.archive_service import MessageArchiveService
+
+
+class Command(BaseCommand):
+    help = ("Put archived messages back in the messages table. Restored messages past retention "
+            "are archived again by the next archive_messages run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Restore every segment of the user with this email")
+        parser.add_argument("--segment", action="append", default=[],
+                            help="Path of a segment to restore, can be repeated")
+
+    def handle(self, *args, **options):
+        segments = [Path(path) for path in options["segment"]]
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(email=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+            segments += MessageArchiveService.segments(user.id)
+        if not segments:
+            raise CommandError("Nothing to restore, pass --user or --segment")
+
+        restored = 0
+        for path in segments:
+            if not path.exists():
+                raise CommandError(f"Segment {path} does not exist")
+            count = MessageArchiveService.restore_segment(path)
+            restored += count
+            self.stdout.write(f"Restored {count} message(s) from {path}")
+        self.stdout.write(f"Done, {restored} message(s) restored")
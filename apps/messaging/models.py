@@ -1,5 +1,5 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.urls import reverse
 from django.core.validators import FileExtensionValidator
@@ -27,7 +27,8 @@ class Route(models.Model):
     # CHANNEL_EMAIL = "email"
     # CHANNEL_CHOICES = [(CHANNEL_EMAIL, "Email")]
 
-    uid = models.UUIDField(default=uuid.uuid4, editable=False, null=True)
+    # indexed: bulk sends read their rows back by uid on MySQL (no RETURNING)
+    uid = models.UUIDField(default=uuid.uuid4, editable=False, null=True, db_index=True)
     label = models.CharField(max_length=100, blank=True)
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="routes")
@@ -43,6 +44,15 @@ class Route(models.Model):
     deleted_at = models.DateTimeField(null=True, blank=True)
     is_deleted = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            # api keys of this route cache route settings for authentication
+            from apps.key.cache import apikey_auth_cache
+            route_id = self.id
+            transaction.on_commit(lambda: apikey_auth_cache.invalidate_route(route_id))
+
     def delete(self, using=None, keep_parents=False):
         # override default delete to soft delete
         self.is_deleted = True
@@ -61,13 +71,22 @@ class Message(models.Model):
 
     class Status(models.TextChoices):
         QUEUED = "queued", "Queued"
+        SENDING = "sending", "Sending"
         SENT = "sent", "Sent"
         FAILED = "failed", "Failed"
 
     apikey = models.ForeignKey(
-        "key.APIKey", on_delete=models.CASCADE, related_name="messages"
+        "key.APIKey", on_delete=models.SET_NULL, null=True, blank=True, related_name="messages"
     )
-    uid = models.UUIDField(default=uuid.uuid4, editable=False, null=True)
+    # route of the key at ingest, kept when the key is deleted
+    route = models.ForeignKey(
+        Route, on_delete=models.SET_NULL, null=True, blank=True, related_name="messages")
+    # owner of the key at ingest, copied so lists and stats do not join through apikey
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="messages")
+    # indexed: bulk sends read their rows back by uid on MySQL (no RETURNING)
+    uid = models.UUIDField(default=uuid.uuid4, editable=False, null=True, db_index=True)
 
     recipient_emails = models.TextField(
         help_text='Comma separated emails that receive the message', validators=[validate_email_list])
@@ -77,9 +96,16 @@ class Message(models.Model):
     body = models.JSONField()
     accepted_at = models.DateTimeField(auto_now_add=True)
     sent_at = models.DateTimeField(null=True, blank=True)
+    # sent_at - accepted_at, set on delivery
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
     status = models.CharField(
         max_length=20, default="queued", choices=Status.choices
     )
+    # set when a delivery worker picks the message up, see DeliveryService
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # retry bookkeeping, next_attempt_at is cleared once the message is sent or gave up
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, null=True, blank=True)
     error = models.TextField(blank=True)
     attachments = models.FileField(
         upload_to="messages/attachments/", blank=True, null=True,
@@ -88,6 +114,18 @@ class Message(models.Model):
 
     class Meta:
         ordering = ("-accepted_at", '-sent_at')
+        indexes = [
+            # due messages for the delivery worker, claims left by a crashed worker
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["status", "claimed_at"]),
+            # MessagePagination, per user and across all messages (staff)
+            models.Index(fields=["user", "accepted_at", "id"]),
+            models.Index(fields=["accepted_at", "id"]),
+            # ?status= on the staff message list
+            models.Index(fields=["status", "accepted_at", "id"]),
+            # dashboard recent activity
+            models.Index(fields=["user", "sent_at"]),
+        ]
 
     def __str__(self):
         return f"{self.status.upper()} → {self.recipient_emails} from {self.visitor_email}"
@@ -96,13 +134,38 @@ class Message(models.Model):
         return reverse("messages-detail", kwargs={"pk": self.pk})
 
 
+class IdempotencyKey(models.Model):
+    '''
+    Response of an accepted send request, replayed when the client retries
+    with the same Idempotency-Key header instead of creating a new message
+    '''
+    apikey = models.ForeignKey(
+        "key.APIKey", on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["apikey", "key"], name="unique_idempotency_key_per_apikey"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.apikey_id})"
+
+
 class UserUsage(models.Model):
     '''
     Tracks per-user usage irregardless of api-key activeness
-    at the end of the day use a cron job to set the total request= total+Today, 
-    group when setting 
+    written in batches by services.usage_service.UsageAccumulator,
+    requests_today starts over on the first request of a new day
     '''
-    uid = models.UUIDField(default=uuid.uuid4, editable=False, null=True)
+    # indexed: bulk sends read their rows back by uid on MySQL (no RETURNING)
+    uid = models.UUIDField(default=uuid.uuid4, editable=False, null=True, db_index=True)
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name='usage')
     total_requests = models.PositiveIntegerField(default=0)
@@ -1,10 +1,11 @@
+import smtplib
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.db.models import F
 from rest_framework.exceptions import ValidationError
-from apps.messaging.models import UserUsage
+from apps.messaging.models import Message
+from apps.core.utils.mail_pool import mail_pool
 
 
 def safe_email_header(value: str) -> str:
@@ -45,76 +46,77 @@ def format_body(body):
     return f"<p>{body}</p>"
 
 
-def send_message_email(message):
+def is_retryable_error(exc):
     '''
-    send message using persist message object
-    setup cron job to resend failed message
+    5xx answers about the message itself (bad recipient, rejected content) are
+    permanent, anything else (network, timeouts, 4xx, our own login) may succeed later
+    '''
+    exc = exc.__cause__ or exc
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code < 500
+    return True
+
+
+def build_message_email(message, now):
+    '''
+    build the EmailMultiAlternatives for a persisted message without sending it
+    '''
+    from_email = settings.EMAIL_HOST_USER
+    to_email = extract_recipient_emails(message)
+    subject = safe_email_header(message.subject)
+    visitor_email = message.visitor_email
+    print(
+        f"[Email] Sending to: {to_email}, from: {from_email}, reply to: {visitor_email} subject: {subject}")
+
+    text_content = f"{message.body}\n\nReply to: {visitor_email}"
+    # messages accepted before backfill_message_owner ran have no user yet
+    owner = message.user if message.user_id else (
+        message.apikey.route.user if message.apikey_id else None)
+    profile = getattr(owner, "profile", None)
+
+    context = {
+        'subject': subject,
+        'body_html': format_body(message.body),
+        'image_url': message.image_url,
+        # f"{settings.FRONTEND_URL}{message.get_absolute_url()}{subject.replace(' ', '-')}" if settings.FRONTEND_URL else '#',
+        'preview_link': "#",
+        # f"{settings.FRONTEND_URL}dashboard" if settings.FRONTEND_URL else '#',
+        'dashboard_link':  'https://inboxit-frontend.vercel.app/dashboard' if settings.FRONTEND_URL else '#',
+        'time': now,
+        'is_paid': profile.membership != "free" if hasattr(profile, "membership") else False
+    }
+
+    html_content = render_to_string(
+        'email/email-template.html', context)
+
+    email = EmailMultiAlternatives(
+        subject, text_content, from_email, to_email, reply_to=[visitor_email])
+    email.attach_alternative(html_content, "text/html")
+
+    if message.attachments:
+        email.attach_file(message.attachments.path)
+    return email
+
+
+def send_message_email(message, connection=None):
+    '''
+    send message using persist message object, sets the status fields on the
+    message without saving them (the caller saves, or bulk updates a batch).
+    failed messages are retried by DeliveryService.schedule_retry
+    pass `connection` to reuse an already open pooled session.
     '''
     try:
-        from_email = settings.EMAIL_HOST_USER
-        to_email = extract_recipient_emails(message)
-        subject = safe_email_header(message.subject)
-        visitor_email = message.visitor_email
         now = timezone.now()
-        print(
-            f"[Email] Sending to: {to_email}, from: {from_email}, reply to: {visitor_email} subject: {subject}")
-
-        text_content = f"{message.body}\n\nReply to: {visitor_email}"
-
-        context = {
-            'subject': subject,
-            'body_html': format_body(message.body),
-            'image_url': message.image_url,
-            # f"{settings.FRONTEND_URL}{message.get_absolute_url()}{subject.replace(' ', '-')}" if settings.FRONTEND_URL else '#',
-            'preview_link': "#",
-            # f"{settings.FRONTEND_URL}dashboard" if settings.FRONTEND_URL else '#',
-            'dashboard_link':  'https://inboxit-frontend.vercel.app/dashboard' if settings.FRONTEND_URL else '#',
-            'time': now,
-            'is_paid': message.apikey.route.user.profile.membership != "free" if hasattr(message.apikey.route.user.profile, "membership") else False
-        }
-
-        html_content = render_to_string(
-            'email/email-template.html', context)
-
-        email = EmailMultiAlternatives(
-            subject, text_content, from_email, to_email, reply_to=[visitor_email])
-        email.attach_alternative(html_content, "text/html")
-
-        if message.attachments:
-            email.attach_file(message.attachments.path)
-
-        email.send(fail_silently=False)
-        message.status = "sent"
+        email = build_message_email(message, now)
+        mail_pool.send_messages([email], connection=connection)
+        message.status = Message.Status.SENT
         message.sent_at = now
-        message.save()
+        message.error = ""
     except Exception as e:
-        message.status = "failed"
+        message.status = Message.Status.FAILED
         message.error = str(e)
-        message.save()
         raise ValidationError(f'Failed to send message: {e}') from e
-
-
-def increment_user_usage(apikey_obj):
-    '''
-    Increment the user usage for after each email
-    '''
-
-    now = timezone.now()
-
-    usage, _ = UserUsage.objects.select_for_update().get_or_create(user=apikey_obj.route.user)
-
-    if usage.last_request_at is None or usage.last_request_at.date() != now.date():
-        usage.requests_today = 0
-
-    usage.requests_today = F('requests_today') + 1
-    usage.total_requests += F('requests_today') + 1
-    usage.last_request_at = now
-
-    usage.save(update_fields=['total_requests',
-               'requests_today', 'last_request_at'])
-
-    # Update API key usage safely
-    apikey_obj.usage_count = F('usage_count') + \
-        1 if apikey_obj.usage_count else 1
-    apikey_obj.last_used_at = now
-    apikey_obj.save(update_fields=["usage_count", "last_used_at"])
@@ -1,12 +1,15 @@
 import json
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from ..models import Message, Route, UserUsage 
 from django.core.validators import EmailValidator
+from django.utils import timezone
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 class UserUsageSerializer(serializers.ModelSerializer):
 
     user_details = serializers.SerializerMethodField()
+    requests_today = serializers.SerializerMethodField()
 
     class Meta:
         model = UserUsage
@@ -18,6 +21,12 @@ class UserUsageSerializer(serializers.ModelSerializer):
             'email': obj.user.email
         }
 
+    def get_requests_today(self, obj) -> int:
+        # the counter only starts over on the first request of a new day
+        if obj.last_request_at is None or timezone.localdate(obj.last_request_at) != timezone.localdate():
+            return 0
+        return obj.requests_today
+
 
 class RouteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -100,6 +109,11 @@ class ListMessageSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class MessageExportQuerySerializer(serializers.Serializer):
+    # `format` is taken by DRF's format suffixes
+    export_format = serializers.ChoiceField(choices=("csv", "ndjson"), default="csv")
+
+
 class MessageSerializer(serializers.ModelSerializer):
     website = serializers.CharField(required=False, allow_blank=True)
     apikey = serializers.StringRelatedField()
@@ -130,4 +144,56 @@ class MessageSerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
     def create(self, validated_data):
+        validated_data.pop("website", None)  # honeypot, not a model field
         return Message.objects.create(**validated_data)
+
+
+class BulkMessageListSerializer(serializers.ListSerializer):
+    '''
+    Validates a list of messages in one pass. Invalid items are collected in
+    `item_errors` (index -> errors) instead of failing the whole list, and the
+    valid ones (`valid_indexes`) are inserted with a single bulk_create.
+    use: BulkMessageListSerializer(child=MessageSerializer(), data=[...])
+    '''
+
+    def to_internal_value(self, data):
+        self.item_errors = {}
+        self.valid_indexes = []
+
+        if not isinstance(data, list):
+            raise serializers.ValidationError(
+                {"messages": ["Expected a list of messages."]})
+        if not data:
+            raise serializers.ValidationError(
+                {"messages": ["At least one message is required."]})
+        if self.max_length is not None and len(data) > self.max_length:
+            raise serializers.ValidationError(
+                {"messages": [f"Send at most {self.max_length} messages per request."]})
+
+        validated = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                self.item_errors[index] = {
+                    api_settings.NON_FIELD_ERRORS_KEY: ["Each message must be an object."]}
+                continue
+            try:
+                validated.append(self.run_child_validation(item))
+                self.valid_indexes.append(index)
+            except serializers.ValidationError as exc:
+                self.item_errors[index] = exc.detail
+        return validated
+
+    def create(self, validated_data):
+        messages = []
+        for attrs in validated_data:
+            attrs.pop("website", None)
+            messages.append(Message(**attrs))
+
+        created = Message.objects.bulk_create(messages)
+        if created and created[0].pk is None:
+            # backends without INSERT ... RETURNING (MySQL) leave the pk unset
+            ids = dict(Message.objects.filter(
+                uid__in=[message.uid for message in created]).order_by().values_list("uid", "id"))
+            for message in created:
+                message.pk = ids[message.uid]
+        return created
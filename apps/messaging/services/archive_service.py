@@ -0,0 +1,170 @@
+import gzip
+import json
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.key.models import APIKey
+from apps.messaging.models import Message, Route
+from .search_service import MessageSearchIndex
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    # full precision, DjangoJSONEncoder cuts datetimes to milliseconds
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class MessageArchiveService:
+    '''
+    Moves sent/failed messages older than the retention window of the owner's
+    plan (MESSAGE_RETENTION_DAYS) out of the messages table into gzipped NDJSON
+    segments, MESSAGE_ARCHIVE_ROOT/<user id>/<yyyy-mm>/<first id>-<last id>.ndjson.gz
+
+    Each batch is written and fsynced to its segment before its rows are
+    deleted in a short transaction, so a crash leaves at worst a segment whose
+    rows are still in the table; the next run rewrites the same file name.
+    Daily/hourly stats keep counting archived messages, a rebuild does not.
+    '''
+    ARCHIVED_STATUSES = (Message.Status.SENT, Message.Status.FAILED)
+
+    @staticmethod
+    def fields():
+        return [field.attname for field in Message._meta.concrete_fields]
+
+    @staticmethod
+    def plan_filter(plan):
+        if plan == "free":
+            # users without a profile are on the free plan
+            return Q(user__profile__plan=plan) | Q(user__profile__isnull=True)
+        return Q(user__profile__plan=plan)
+
+    @staticmethod
+    def expired(now=None):
+        """messages past the retention window of their owner's plan"""
+        now = now or timezone.now()
+        condition = Q()
+        for plan, days in settings.MESSAGE_RETENTION_DAYS.items():
+            condition |= MessageArchiveService.plan_filter(plan) & Q(
+                accepted_at__lt=now - timedelta(days=days))
+        return Message.objects.filter(
+            condition, user__isnull=False, status__in=MessageArchiveService.ARCHIVED_STATUSES)
+
+    @staticmethod
+    def segment_path(user_id, rows):
+        first = rows[0]
+        return (Path(settings.MESSAGE_ARCHIVE_ROOT) / str(user_id) /
+                first["accepted_at"].strftime("%Y-%m") / f"{first['id']}-{rows[-1]['id']}.ndjson.gz")
+
+    @staticmethod
+    def write_segment(path, rows):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                for row in rows:
+                    gz.write(json.dumps(row, default=_json_default).encode("utf-8") + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def archive_batch(batch_size=None, now=None):
+        """Archive up to batch_size expired messages, returns how many were moved"""
+        batch_size = batch_size or settings.MESSAGE_ARCHIVE_BATCH_SIZE
+        ids = list(MessageArchiveService.expired(now)
+                   .order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        by_user = defaultdict(list)
+        rows = Message.objects.filter(id__in=ids).order_by("id").values(*MessageArchiveService.fields())
+        for row in rows:
+            by_user[row["user_id"]].append(row)
+
+        for user_id, user_rows in by_user.items():
+            MessageArchiveService.write_segment(
+                MessageArchiveService.segment_path(user_id, user_rows), user_rows)
+
+        with transaction.atomic():
+            MessageSearchIndex.remove(ids)
+            Message.objects.filter(id__in=ids).delete()
+        logger.info(f"Archived {len(ids)} messages of {len(by_user)} users")
+        return len(ids)
+
+    @staticmethod
+    def archive(batch_size=None, max_batches=None, now=None):
+        """Archive in batches until nothing is expired (or max_batches), returns the total"""
+        now = now or timezone.now()
+        total, batches = 0, 0
+        while max_batches is None or batches < max_batches:
+            moved = MessageArchiveService.archive_batch(batch_size, now=now)
+            if not moved:
+                break
+            total += moved
+            batches += 1
+        return total
+
+    @staticmethod
+    def segments(user_id=None):
+        root = Path(settings.MESSAGE_ARCHIVE_ROOT)
+        if user_id is not None:
+            root = root / str(user_id)
+        return sorted(root.glob("**/*.ndjson.gz"))
+
+    @staticmethod
+    def read_segment(path):
+        with gzip.open(path, "rt", encoding="utf-8") as segment:
+            for line in segment:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def _to_message(row, apikey_ids, route_ids):
+        for field in Message._meta.concrete_fields:
+            value = row.get(field.attname)
+            if value is not None and isinstance(field, models.DateTimeField):
+                row[field.attname] = parse_datetime(value)
+        # the key or route may have been deleted since, the message survives that
+        if row.get("apikey_id") not in apikey_ids:
+            row["apikey_id"] = None
+        if row.get("route_id") not in route_ids:
+            row["route_id"] = None
+        return Message(**row)
+
+    @staticmethod
+    def restore_segment(path, batch_size=None):
+        """Put the messages of a segment back in the table and delete the segment, returns the count"""
+        batch_size = batch_size or settings.MESSAGE_ARCHIVE_BATCH_SIZE
+        rows = list(MessageArchiveService.read_segment(path))
+        apikey_ids = set(APIKey.objects.filter(
+            id__in={row.get("apikey_id") for row in rows}).values_list("id", flat=True))
+        route_ids = set(Route.objects.filter(
+            id__in={row.get("route_id") for row in rows}).values_list("id", flat=True))
+        messages = [MessageArchiveService._to_message(row, apikey_ids, route_ids) for row in rows]
+
+        with transaction.atomic():
+            for start in range(0, len(messages), batch_size):
+                chunk = messages[start:start + batch_size]
+                accepted_at = [message.accepted_at for message in chunk]
+                # ids are kept, rows restored before are left alone
+                Message.objects.bulk_create(chunk, ignore_conflicts=True)
+                # bulk_create stamps auto_now_add fields with the current time
+                for message, value in zip(chunk, accepted_at):
+                    message.accepted_at = value
+                Message.objects.bulk_update(chunk, ["accepted_at"])
+                MessageSearchIndex.index_messages(chunk)
+        Path(path).unlink()
+        return len(messages)
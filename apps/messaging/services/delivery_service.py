@@ -0,0 +1,162 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from apps.analytics.services import record_delivery_latency, record_message_stats
+from apps.core.utils.mail_pool import mail_pool
+from apps.messaging.models import Message
+from apps.messaging.platforms.email.services import is_retryable_error, send_message_email
+from .notification_service import MessagingNotificationService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryService:
+    '''
+    Takes queued messages out of the database and delivers them.
+    Used by the `deliver_messages` management command, never by the request cycle.
+    '''
+
+    @staticmethod
+    def release_stale_claims():
+        """Put messages left in `sending` by a crashed worker back in the queue"""
+        cutoff = timezone.now() - timedelta(
+            seconds=settings.MESSAGE_DELIVERY_CLAIM_TIMEOUT)
+        released = Message.objects.filter(
+            status=Message.Status.SENDING,
+            claimed_at__lt=cutoff
+        ).update(status=Message.Status.QUEUED, claimed_at=None)
+        if released:
+            logger.warning(f"Released {released} stale message claims")
+        return released
+
+    @staticmethod
+    def claim_batch(limit):
+        """
+        Mark up to `limit` due queued messages as `sending` and return them.
+        skip_locked lets several workers claim concurrently without blocking
+        each other (ignored on sqlite, which serializes writes anyway).
+        """
+        with transaction.atomic():
+            ids = list(
+                Message.objects.select_for_update(skip_locked=True)
+                .filter(status=Message.Status.QUEUED, next_attempt_at__lte=timezone.now())
+                .order_by("next_attempt_at", "id")
+                .values_list("id", flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            Message.objects.filter(id__in=ids).update(
+                status=Message.Status.SENDING, claimed_at=timezone.now())
+
+        return list(
+            Message.objects.filter(id__in=ids)
+            .select_related("route", "user__profile")
+            .order_by("accepted_at", "id")
+        )
+
+    @staticmethod
+    def retry_delay(attempts):
+        """Exponential backoff capped at MESSAGE_RETRY_MAX_DELAY, half of it jittered"""
+        delay = min(
+            settings.MESSAGE_RETRY_MAX_DELAY,
+            settings.MESSAGE_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+        )
+        return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+    @staticmethod
+    def schedule_retry(message, exc):
+        """
+        Put a failed message back in the queue for a later attempt, or leave it
+        `failed` for good when the error is permanent or attempts are used up.
+        Returns True when a retry was scheduled.
+        """
+        if is_retryable_error(exc) and message.attempts < settings.MESSAGE_RETRY_MAX_ATTEMPTS:
+            message.status = Message.Status.QUEUED
+            message.next_attempt_at = timezone.now() + DeliveryService.retry_delay(message.attempts)
+            logger.warning(
+                f"Message {message.id} attempt {message.attempts} failed, "
+                f"retrying at {message.next_attempt_at}")
+            return True
+
+        message.status = Message.Status.FAILED
+        message.next_attempt_at = None
+        return False
+
+    @staticmethod
+    def route_sessions(messages):
+        """
+        Group claimed messages by route and cut every group into chunks of
+        MESSAGE_DELIVERY_SESSION_SIZE, each chunk is sent over one SMTP session
+        """
+        size = settings.MESSAGE_DELIVERY_SESSION_SIZE
+        by_route = defaultdict(list)
+        for message in messages:
+            by_route[message.route_id].append(message)
+
+        for route_messages in by_route.values():
+            for start in range(0, len(route_messages), size):
+                yield route_messages[start:start + size]
+
+    @staticmethod
+    def deliver_session(messages):
+        """
+        Send messages of one route over a single pooled connection and write the
+        results back with one bulk_update. Returns (sent, failed), retried
+        messages are in neither list.
+        """
+        errors = {}
+        try:
+            with mail_pool.connection() as connection:
+                for message in messages:
+                    try:
+                        send_message_email(message, connection=connection)
+                    except Exception as exc:
+                        logger.error(f"Delivery of message {message.id} failed: {exc}")
+                        errors[message.id] = exc
+        except Exception as exc:
+            # the session itself could not be opened (auth, network ...)
+            logger.error(f"Could not open a mail session: {exc}")
+            for message in messages:
+                if message.status == Message.Status.SENDING:
+                    message.status = Message.Status.FAILED
+                    message.error = str(exc)
+                    errors[message.id] = exc
+
+        for message in messages:
+            message.attempts += 1
+            message.claimed_at = None
+            if message.id in errors:
+                DeliveryService.schedule_retry(message, errors[message.id])
+            else:
+                message.next_attempt_at = None
+                message.latency_ms = max(0, int(
+                    (message.sent_at - message.accepted_at).total_seconds() * 1000))
+        sent = [m for m in messages if m.status == Message.Status.SENT]
+        failed = [m for m in messages if m.status == Message.Status.FAILED]
+        with transaction.atomic():
+            Message.objects.bulk_update(
+                messages, ["status", "sent_at", "latency_ms", "error", "claimed_at",
+                           "attempts", "next_attempt_at"])
+            record_message_stats(sent, Message.Status.SENT)
+            record_message_stats(failed, Message.Status.FAILED)
+            record_delivery_latency(sent)
+
+        MessagingNotificationService.messages_sent(sent)
+        for message in failed:
+            MessagingNotificationService.message_failed(message, reason=message.error)
+        return sent, failed
+
+    @staticmethod
+    def process_queue(limit=None):
+        """Claim and deliver one batch, returns the number of messages processed"""
+        limit = limit or settings.MESSAGE_DELIVERY_BATCH_SIZE
+        DeliveryService.release_stale_claims()
+
+        messages = DeliveryService.claim_batch(limit)
+        for session in DeliveryService.route_sessions(messages):
+            DeliveryService.deliver_session(session)
+        return len(messages)
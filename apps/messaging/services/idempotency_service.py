@@ -0,0 +1,104 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from apps.messaging.models import IdempotencyKey
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyService:
+    '''
+    Replays the stored response when a client retries a send request with the
+    same `Idempotency-Key` header, so the retry neither sends a new email nor
+    writes new rows. Lookups hit the cache first and fall back to the table.
+    '''
+    HEADER = "Idempotency-Key"
+    MAX_KEY_LENGTH = 255
+
+    @staticmethod
+    def _cache_key(apikey_id, key):
+        # hashed so any client supplied value is a valid cache key
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return f"idempotency:{apikey_id}:{digest}"
+
+    @staticmethod
+    def fingerprint(data):
+        """Hash of the request payload, detects a key reused for another request"""
+        if hasattr(data, "dict"):
+            data = data.dict()
+        encoded = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def lookup(apikey, key):
+        cache_key = IdempotencyService._cache_key(apikey.id, key)
+        record = cache.get(cache_key)
+        if record is not None:
+            return record
+
+        record = IdempotencyKey.objects.filter(
+            apikey_id=apikey.id, key=key, expires_at__gt=timezone.now()
+        ).values("request_hash", "response_status", "response_body", "expires_at").first()
+        if record is None:
+            return None
+
+        timeout = (record.pop("expires_at") - timezone.now()).total_seconds()
+        if timeout > 0:
+            cache.set(cache_key, record, timeout)
+        return record
+
+    @staticmethod
+    def replay(apikey, key, request_hash):
+        """Response for a repeated key, or None when the key has not been seen"""
+        record = IdempotencyService.lookup(apikey, key)
+        if record is None:
+            return None
+
+        if record["request_hash"] != request_hash:
+            return Response(
+                {"detail": f"{IdempotencyService.HEADER} was already used with a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        logger.info(f"Replaying response for idempotency key {key} of api key {apikey.id}")
+        return Response(
+            record["response_body"], status=record["response_status"],
+            headers={"Idempotent-Replayed": "true"})
+
+    @staticmethod
+    def store(apikey, key, request_hash, response_status, response_body):
+        """
+        Save the response, call inside the transaction that created the messages:
+        a concurrent retry with the same key then fails on the unique constraint
+        and rolls its own messages back.
+        """
+        ttl = settings.IDEMPOTENCY_KEY_TTL
+        now = timezone.now()
+        # an expired row (not purged yet) would still hold the unique constraint
+        IdempotencyKey.objects.filter(apikey_id=apikey.id, key=key, expires_at__lte=now).delete()
+        IdempotencyKey.objects.create(
+            apikey_id=apikey.id,
+            key=key,
+            request_hash=request_hash,
+            response_status=response_status,
+            response_body=response_body,
+            expires_at=now + timedelta(seconds=ttl),
+        )
+        record = {
+            "request_hash": request_hash,
+            "response_status": response_status,
+            "response_body": response_body,
+        }
+        transaction.on_commit(lambda: cache.set(
+            IdempotencyService._cache_key(apikey.id, key), record, ttl))
+
+    @staticmethod
+    def purge_expired():
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
@@ -47,9 +47,8 @@ class MessagingNotificationService:
 
     @staticmethod
     def message_sent(message):
-        route = getattr(message, 'apikey', None).route if getattr(
-            message, 'apikey', None) else None
-        user = route.user if route is not None else None
+        route = message.route if message.route_id else None
+        user = message.user if message.user_id else None
         if user is None:
             logger.warning(
                 f"Message {message.id} sent but route/user not found. Skipping notification.")
@@ -71,11 +70,35 @@ class MessagingNotificationService:
             content_object=message,
         )
 
+    @staticmethod
+    def messages_sent(messages):
+        """message_sent for a delivered batch, saved with a single bulk insert"""
+        data_list = []
+        for message in messages:
+            route = message.route if message.route_id else None
+            if route is None or message.user_id is None:
+                logger.warning(
+                    f"Message {message.id} sent but route/user not found. Skipping notification.")
+                continue
+            data_list.append({
+                "user": message.user,
+                "type": NotificationType.MESSAGE_SENT,
+                "title": "Message delivered",
+                "message": (
+                    f"A new message was sent through route '{route.label}' and is available for review."
+                ),
+                "content_object": message,
+            })
+
+        if not data_list:
+            return []
+        logger.info(f"{len(data_list)} messages sent, creating notifications")
+        return NotificationService.bulk_create(data_list)
+
     @staticmethod
     def message_failed(message, reason=None):
-        route = getattr(message, 'apikey', None).route if getattr(
-            message, 'apikey', None) else None
-        user = route.user if route is not None else None
+        route = message.route if message.route_id else None
+        user = message.user if message.user_id else None
         if user is None:
             logger.warning(
                 f"Message {message.id} failed but route/user not found. Skipping notification.")
@@ -97,3 +120,23 @@ class MessagingNotificationService:
             message=message_text,
             content_object=message,
         )
+
+    @staticmethod
+    def delivery_latency_alert(route, p95_ms, count, window_minutes):
+        user = route.user
+        title = "Slow message delivery"
+        message = (
+            f"Messages on route '{route.label}' took {p95_ms / 1000:.1f}s or more to deliver "
+            f"for 5% of the {count} messages sent in the last {window_minutes} minutes."
+        )
+        logger.warning(
+            f"Route {route.id} delivery p95 is {p95_ms}ms over {count} messages "
+            f"(user {user.id}, window {window_minutes}m)"
+        )
+        return NotificationService.create(
+            user=user,
+            notification_type=NotificationType.DELIVERY_LATENCY_ALERT,
+            title=title,
+            message=message,
+            content_object=route,
+        )
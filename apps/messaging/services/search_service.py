@@ -0,0 +1,145 @@
+import re
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# words, e-mail addresses and domains, everything else separates terms
+TERM_RE = re.compile(r"[\w.@+-]+", re.UNICODE)
+
+
+class MessageSearchIndex:
+    '''
+    Full text index of messages (subject, visitor email, recipients, body text)
+    kept in a table next to messaging_message:
+
+    - sqlite: an FTS5 virtual table, rowid is the message id
+    - mysql: an InnoDB table with a FULLTEXT key using the ngram parser and no
+      stopwords, message_id is the primary key. Terms are matched as
+      substrings, so short words ("hi") and order codes are found like on
+      sqlite; words shorter than the ngram size fall back to icontains
+
+    The table is created by the post_migrate handler in MessagingConfig and
+    filled by the send views in the transaction that creates the messages
+    (`python manage.py rebuild_search_index` for existing rows). On other
+    databases, or when FTS5 is missing, search falls back to icontains.
+    '''
+    TABLE = "messaging_message_search"
+    COLUMNS = ("subject", "visitor_email", "recipients", "body")
+    NGRAM_TOKEN_SIZE = 2  # MySQL's default ngram_token_size, shorter words are not indexed
+    _available = {}  # db alias -> bool
+
+    @staticmethod
+    def ensure_table(using=DEFAULT_DB_ALIAS):
+        connection = connections[using]
+        table = MessageSearchIndex.TABLE
+        if connection.vendor == "sqlite":
+            sql = (f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                   f"subject, visitor_email, recipients, body, tokenize='unicode61')")
+        elif connection.vendor == "mysql":
+            sql = (f"CREATE TABLE IF NOT EXISTS {table} ("
+                   f"message_id BIGINT NOT NULL PRIMARY KEY, subject VARCHAR(255) NOT NULL, "
+                   f"visitor_email VARCHAR(254) NOT NULL, recipients TEXT NOT NULL, body TEXT NOT NULL, "
+                   f"FULLTEXT KEY {table}_fulltext (subject, visitor_email, recipients, body) WITH PARSER ngram"
+                   f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4")
+        else:
+            MessageSearchIndex._available[using] = False
+            return False
+
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == "mysql":
+                    # read when the FULLTEXT key is created: ngram drops every token holding a stopword
+                    cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+                cursor.execute(sql)
+        except DatabaseError as exc:
+            logger.warning(f"Message search index unavailable, using icontains: {exc}")
+            MessageSearchIndex._available[using] = False
+            return False
+        MessageSearchIndex._available[using] = True
+        return True
+
+    @staticmethod
+    def is_available(using=DEFAULT_DB_ALIAS):
+        if using not in MessageSearchIndex._available:
+            connection = connections[using]
+            MessageSearchIndex._available[using] = (
+                connection.vendor in ("sqlite", "mysql") and
+                MessageSearchIndex.TABLE in connection.introspection.table_names())
+        return MessageSearchIndex._available[using]
+
+    @staticmethod
+    def body_text(body):
+        if isinstance(body, dict):
+            return " ".join(f"{key} {value}" for key, value in body.items())
+        if isinstance(body, (list, tuple)):
+            return " ".join(str(value) for value in body)
+        return "" if body is None else str(body)
+
+    @staticmethod
+    def document(message):
+        return (message.subject or "", message.visitor_email or "",
+                (message.recipient_emails or "").replace(",", " "),
+                MessageSearchIndex.body_text(message.body))
+
+    @staticmethod
+    def index_messages(messages, using=DEFAULT_DB_ALIAS):
+        """Add or replace the index rows of saved messages"""
+        if not messages or not MessageSearchIndex.is_available(using):
+            return
+        connection = connections[using]
+        table = MessageSearchIndex.TABLE
+        if connection.vendor == "sqlite":
+            sql = (f"INSERT OR REPLACE INTO {table} "
+                   f"(rowid, subject, visitor_email, recipients, body) VALUES (%s, %s, %s, %s, %s)")
+        else:
+            sql = (f"REPLACE INTO {table} "
+                   f"(message_id, subject, visitor_email, recipients, body) VALUES (%s, %s, %s, %s, %s)")
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (message.id, *MessageSearchIndex.document(message)) for message in messages])
+
+    @staticmethod
+    def remove(message_ids, using=DEFAULT_DB_ALIAS):
+        message_ids = list(message_ids)
+        if not message_ids or not MessageSearchIndex.is_available(using):
+            return
+        connection = connections[using]
+        id_column = "rowid" if connection.vendor == "sqlite" else "message_id"
+        placeholders = ", ".join(["%s"] * len(message_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {MessageSearchIndex.TABLE} WHERE {id_column} IN ({placeholders})",
+                message_ids)
+
+    @staticmethod
+    def words(terms):
+        return [word for term in terms for word in TERM_RE.findall(term)]
+
+    @staticmethod
+    def can_match(terms, using=DEFAULT_DB_ALIAS):
+        """False when a word is too short for the index, search with icontains then"""
+        if connections[using].vendor != "mysql":
+            return True
+        return all(len(word) >= MessageSearchIndex.NGRAM_TOKEN_SIZE for word in MessageSearchIndex.words(terms))
+
+    @staticmethod
+    def match_sql(terms, using=DEFAULT_DB_ALIAS):
+        """
+        (sql, params) selecting the ids of messages containing every term, each
+        word matched as a prefix (sqlite) or a substring (mysql). None without usable terms.
+        """
+        words = MessageSearchIndex.words(terms)
+        if not words:
+            return None
+
+        table = MessageSearchIndex.TABLE
+        if connections[using].vendor == "sqlite":
+            # quoted: '@' and '.' are not FTS5 syntax, the phrase matches the word sequence
+            query = " ".join(f'"{word}"*' for word in words)
+            return f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [query]
+
+        # boolean mode: every word required, as a phrase of its ngrams
+        query = " ".join(f'+"{word}"' for word in words)
+        return (f"SELECT message_id FROM {table} WHERE MATCH("
+                f"{', '.join(MessageSearchIndex.COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)", [query])
@@ -0,0 +1,139 @@
+import atexit
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from apps.key.models import APIKey
+from apps.messaging.models import UserUsage
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UsageAccumulator:
+    '''
+    Write-behind usage counting. Accepted messages are counted in memory per
+    user and per api key, and written to UserUsage (total_requests,
+    requests_today, last_request_at) and APIKey (usage_count, last_used_at)
+    with one bulk update per model when USAGE_FLUSH_THRESHOLD messages are
+    pending or every USAGE_FLUSH_INTERVAL seconds, instead of locking the
+    user's usage row on every request.
+
+    The flush thread (and the flush at exit) only start with the first
+    record() of a `background` accumulator, a process that never accepts a
+    message (tests, management commands) runs none. Without `background`
+    counts are written by record() past the threshold or by calling flush().
+    '''
+
+    def __init__(self, background=True):
+        self.background = background
+        self._lock = threading.Lock()
+        self._users = {}  # user_id -> [count, last_at]
+        self._keys = {}  # apikey_id -> [count, last_at]
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    @staticmethod
+    def _add(counters, pk, count, at):
+        entry = counters.setdefault(pk, [0, at])
+        entry[0] += count
+        entry[1] = max(entry[1], at)
+
+    def record(self, user_id, apikey_id, count=1):
+        at = timezone.now()
+        with self._lock:
+            self._add(self._users, user_id, count, at)
+            self._add(self._keys, apikey_id, count, at)
+            self._pending += count
+            due = (self._pending >= settings.USAGE_FLUSH_THRESHOLD or
+                   time.monotonic() - self._last_flush >= settings.USAGE_FLUSH_INTERVAL)
+        self._start_timer()
+
+        if due:
+            self.flush()
+
+    def _start_timer(self):
+        if self._timer is not None or not self.background:
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Thread(
+                    target=self._run_timer, name="usage-flush", daemon=True)
+                self._timer.start()
+                atexit.register(self.flush)
+
+    def _run_timer(self):
+        while True:
+            time.sleep(settings.USAGE_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            finally:
+                # this thread owns its own db connection
+                connection.close()
+
+    def flush(self):
+        """Write pending counts, returns the number of messages flushed"""
+        with self._lock:
+            users, keys, pending = self._users, self._keys, self._pending
+            self._users, self._keys, self._pending = {}, {}, 0
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        try:
+            self._write_users(users)
+            self._write_keys(keys)
+        except Exception as exc:
+            logger.error(f"Usage flush failed, keeping {pending} counts for the next one: {exc}")
+            with self._lock:
+                for pk, (count, at) in users.items():
+                    self._add(self._users, pk, count, at)
+                for pk, (count, at) in keys.items():
+                    self._add(self._keys, pk, count, at)
+                self._pending += pending
+            return 0
+
+        logger.debug(f"Flushed usage of {pending} messages for {len(users)} users")
+        return pending
+
+    @staticmethod
+    def _write_users(users):
+        existing = dict(UserUsage.objects.filter(
+            user_id__in=users).values_list("user_id", "id"))
+        missing = [UserUsage(user_id=user_id) for user_id in users if user_id not in existing]
+        if missing:
+            UserUsage.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = dict(UserUsage.objects.filter(
+                user_id__in=users).values_list("user_id", "id"))
+
+        rows = []
+        for user_id, (count, last_at) in users.items():
+            usage = UserUsage(id=existing[user_id], user_id=user_id)
+            usage.total_requests = F("total_requests") + count
+            # requests_today starts over on the first request of a new day
+            usage.requests_today = Case(
+                When(last_request_at__date=timezone.localdate(last_at),
+                     then=F("requests_today") + count),
+                default=Value(count),
+            )
+            usage.last_request_at = last_at
+            rows.append(usage)
+        UserUsage.objects.bulk_update(
+            rows, ["total_requests", "requests_today", "last_request_at"])
+
+    @staticmethod
+    def _write_keys(keys):
+        rows = []
+        for apikey_id, (count, last_at) in keys.items():
+            key = APIKey(id=apikey_id)
+            key.usage_count = F("usage_count") + count
+            key.last_used_at = last_at
+            rows.append(key)
+        APIKey.objects.bulk_update(rows, ["usage_count", "last_used_at"])
+
+
+usage_accumulator = UsageAccumulator()
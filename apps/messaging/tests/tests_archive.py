@@ -0,0 +1,83 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.account.models import Profile
+from apps.key.models import APIKey
+from apps.messaging.models import Message
+from apps.messaging.services.archive_service import MessageArchiveService
+from apps.messaging.services.route_service import RouteService
+from apps.messaging.services.search_service import MessageSearchIndex
+
+User = get_user_model()
+
+
+class TestMessageArchive(TestCase):
+    def setUp(self):
+        self.archive_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_root)
+        override = override_settings(
+            MESSAGE_ARCHIVE_ROOT=self.archive_root,
+            MESSAGE_RETENTION_DAYS={"free": 30, "pro": 365, "enterprise": 730})
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.free_user = self.create_user("free@gmail.com")
+        self.pro_user = self.create_user("pro@gmail.com")
+        Profile.objects.create(user=self.pro_user, email=self.pro_user.email, plan="pro")
+
+        self.old_sent = self.create_message(self.free_user, days_old=40, subject="Old refund")
+        self.old_failed = self.create_message(self.free_user, days_old=35, status=Message.Status.FAILED)
+        self.recent = self.create_message(self.free_user, days_old=10)
+        self.old_queued = self.create_message(self.free_user, days_old=40, status=Message.Status.QUEUED)
+        self.pro_old = self.create_message(self.pro_user, days_old=40)
+
+    def create_user(self, email):
+        user = User.objects.create_user(email=email, password="password@123")
+        route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=user)
+        user.test_route, user.test_key = route, APIKey.objects.get(id=keys["live"]["id"])
+        return user
+
+    def create_message(self, user, days_old, status=Message.Status.SENT, subject="Hello"):
+        message = Message.objects.create(
+            apikey=user.test_key, route=user.test_route, user=user, status=status,
+            recipient_emails="inbox@gmail.com", visitor_email="visitor@gmail.com",
+            subject=subject, body={"message": "hi"})
+        Message.objects.filter(id=message.id).update(
+            accepted_at=timezone.now() - timedelta(days=days_old))
+        MessageSearchIndex.index_messages([message])
+        return message
+
+    def test_archive_moves_expired_messages_per_plan(self):
+        call_command("archive_messages", batch_size=1, stdout=StringIO())
+
+        remaining = set(Message.objects.values_list("id", flat=True))
+        self.assertEqual(remaining, {self.recent.id, self.old_queued.id, self.pro_old.id})
+        segments = MessageArchiveService.segments(self.free_user.id)
+        self.assertEqual(len(segments), 2)
+        archived = [row for path in segments for row in MessageArchiveService.read_segment(path)]
+        self.assertEqual({row["id"] for row in archived}, {self.old_sent.id, self.old_failed.id})
+
+    def test_restore_puts_messages_back(self):
+        original = Message.objects.get(id=self.old_sent.id)
+        MessageArchiveService.archive()
+
+        call_command("restore_messages", user="free@gmail.com", stdout=StringIO())
+
+        restored = Message.objects.get(id=self.old_sent.id)
+        self.assertEqual(restored.accepted_at, original.accepted_at)
+        self.assertEqual(restored.body, {"message": "hi"})
+        self.assertEqual(restored.uid, original.uid)
+        self.assertTrue(Message.objects.filter(id=self.old_failed.id).exists())
+        self.assertEqual(MessageArchiveService.segments(self.free_user.id), [])
+
+        sql, params = MessageSearchIndex.match_sql(["refund"])
+        self.assertEqual(Message.objects.raw(f"SELECT id FROM messaging_message WHERE id IN ({sql})", params)[0].id,
+                         self.old_sent.id)
@@ -0,0 +1,218 @@
+import smtplib
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.test import APITestCase, override_settings
+from apps.account.models import Profile
+from apps.core.models import Notification, NotificationType
+from apps.core.utils.mail_pool import mail_pool
+from apps.messaging.models import IdempotencyKey, Message
+from apps.messaging.services.route_service import RouteService
+from apps.messaging.services.delivery_service import DeliveryService
+
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class TestQueuedMessageDelivery(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.send_url = reverse('send-email')
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        Profile.objects.create(user=self.user, email=self.user.email)
+        self.route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com", "team@gmail.com"]}},
+            user=self.user)
+        self.raw_key = keys["live"]["key"]
+        self.message_data = {
+            "visitor_email": "visitor@gmail.com",
+            "subject": "Hello",
+            "body": "Tell me more",
+        }
+
+    def send(self, data=None):
+        return self.client.post(
+            self.send_url, data or self.message_data, format='json',
+            HTTP_X_API_KEY=self.raw_key)
+
+    def test_send_email_queues_message_and_returns_202(self):
+        response = self.send()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        message = Message.objects.get()
+        self.assertEqual(message.status, Message.Status.QUEUED)
+        self.assertEqual(message.recipient_emails, "inbox@gmail.com,team@gmail.com")
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_delivers_queued_message(self):
+        self.send()
+
+        processed = DeliveryService.process_queue()
+
+        self.assertEqual(processed, 1)
+        message = Message.objects.get()
+        self.assertEqual(message.status, Message.Status.SENT)
+        self.assertIsNotNone(message.sent_at)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["inbox@gmail.com", "team@gmail.com"])
+        self.assertTrue(Notification.objects.filter(
+            user=self.user, type=NotificationType.MESSAGE_SENT).exists())
+
+    def test_worker_delivers_message_accepted_before_owner_backfill(self):
+        self.send()
+        Message.objects.update(user=None, route=None)
+
+        self.assertEqual(DeliveryService.process_queue(), 1)
+
+        self.assertEqual(Message.objects.get().status, Message.Status.SENT)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_worker_skips_messages_claimed_by_another_worker(self):
+        self.send()
+        self.assertEqual(len(DeliveryService.claim_batch(10)), 1)
+
+        self.assertEqual(DeliveryService.process_queue(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_messages_of_a_route_share_one_session(self):
+        for _ in range(3):
+            self.send()
+
+        with mock.patch.object(mail_pool, "connection", wraps=mail_pool.connection) as connection:
+            DeliveryService.process_queue()
+
+        connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            Message.objects.filter(status=Message.Status.SENT, claimed_at__isnull=True).count(), 3)
+        self.assertEqual(Notification.objects.filter(
+            user=self.user, type=NotificationType.MESSAGE_SENT).count(), 3)
+
+    def test_transient_failure_is_retried_later(self):
+        self.send()
+
+        with mock.patch.object(mail_pool, "send_messages",
+                               side_effect=smtplib.SMTPServerDisconnected("gone")):
+            DeliveryService.process_queue()
+
+        message = Message.objects.get()
+        self.assertEqual(message.status, Message.Status.QUEUED)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, message.accepted_at)
+        # not due yet
+        self.assertEqual(DeliveryService.process_queue(), 0)
+        self.assertFalse(Notification.objects.filter(
+            type=NotificationType.MESSAGE_FAILED).exists())
+
+    def test_permanent_failure_gives_up(self):
+        self.send()
+        refused = smtplib.SMTPRecipientsRefused({"inbox@gmail.com": (550, b"no such user")})
+
+        with mock.patch.object(mail_pool, "send_messages", side_effect=refused):
+            DeliveryService.process_queue()
+
+        message = Message.objects.get()
+        self.assertEqual(message.status, Message.Status.FAILED)
+        self.assertIsNone(message.next_attempt_at)
+        self.assertTrue(Notification.objects.filter(
+            user=self.user, type=NotificationType.MESSAGE_FAILED).exists())
+
+    @override_settings(MESSAGE_RETRY_MAX_ATTEMPTS=1)
+    def test_gives_up_after_max_attempts(self):
+        self.send()
+
+        with mock.patch.object(mail_pool, "send_messages",
+                               side_effect=smtplib.SMTPServerDisconnected("gone")):
+            DeliveryService.process_queue()
+
+        self.assertEqual(Message.objects.get().status, Message.Status.FAILED)
+
+    def test_retry_with_same_idempotency_key_replays_response(self):
+        first = self.client.post(
+            self.send_url, self.message_data, format='json',
+            HTTP_X_API_KEY=self.raw_key, HTTP_IDEMPOTENCY_KEY="form-submit-1")
+        second = self.client.post(
+            self.send_url, self.message_data, format='json',
+            HTTP_X_API_KEY=self.raw_key, HTTP_IDEMPOTENCY_KEY="form-submit-1")
+
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_idempotency_key_reused_with_other_payload_is_rejected(self):
+        self.client.post(
+            self.send_url, self.message_data, format='json',
+            HTTP_X_API_KEY=self.raw_key, HTTP_IDEMPOTENCY_KEY="form-submit-1")
+        response = self.client.post(
+            self.send_url, {**self.message_data, "subject": "Other"}, format='json',
+            HTTP_X_API_KEY=self.raw_key, HTTP_IDEMPOTENCY_KEY="form-submit-1")
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_expired_idempotency_key_can_be_reused(self):
+        self.client.post(
+            self.send_url, self.message_data, format='json',
+            HTTP_X_API_KEY=self.raw_key, HTTP_IDEMPOTENCY_KEY="form-submit-1")
+        # expired but not purged yet
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+
+        response = self.client.post(
+            self.send_url, self.message_data, format='json',
+            HTTP_X_API_KEY=self.raw_key, HTTP_IDEMPOTENCY_KEY="form-submit-1")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_bulk_send_queues_valid_items_and_reports_rejected_ones(self):
+        payload = {"messages": [
+            self.message_data,
+            {**self.message_data, "visitor_email": "not-an-email"},
+            {**self.message_data, "subject": "Second"},
+        ]}
+
+        response = self.client.post(
+            reverse('send-email-bulk'), payload, format='json', HTTP_X_API_KEY=self.raw_key)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         ['queued', 'rejected', 'queued'])
+        self.assertIn('visitor_email', response.data['results'][1]['errors'])
+        self.assertEqual(Message.objects.filter(status=Message.Status.QUEUED).count(), 2)
+
+    def test_bulk_send_rejects_items_that_are_not_objects(self):
+        payload = {"messages": [self.message_data, "visitor@gmail.com", None]}
+
+        response = self.client.post(
+            reverse('send-email-bulk'), payload, format='json', HTTP_X_API_KEY=self.raw_key)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         ['queued', 'rejected', 'rejected'])
+        self.assertIn('non_field_errors', response.data['results'][1]['errors'])
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_bulk_send_without_valid_items_returns_400(self):
+        response = self.client.post(
+            reverse('send-email-bulk'), {"messages": [{"subject": "no sender"}]},
+            format='json', HTTP_X_API_KEY=self.raw_key)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Message.objects.exists())
@@ -0,0 +1,171 @@
+import csv
+import gzip
+import json
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, override_settings
+from apps.key.models import APIKey
+from apps.messaging.models import Message
+from apps.messaging.services.route_service import RouteService
+from apps.messaging.services.search_service import MessageSearchIndex
+
+User = get_user_model()
+
+
+class TestMessageList(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        apikey = APIKey.objects.get(id=keys["live"]["id"])
+        Message.objects.bulk_create([
+            Message(apikey=apikey, route=route, user=self.user, recipient_emails="inbox@gmail.com",
+                    visitor_email="visitor@gmail.com", subject=f"Hello {i}", body="hi")
+            for i in range(15)
+        ])
+        self.client.force_authenticate(self.user)
+
+    def test_messages_are_cursor_paginated(self):
+        response = self.client.get(reverse('messages-list'), {"page_size": 10})
+
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 10)
+
+        rest = self.client.get(response.data["next"])
+        self.assertEqual(len(rest.data["results"]), 5)
+        self.assertIsNone(rest.data["next"])
+
+        ids = [m["id"] for m in response.data["results"] + rest.data["results"]]
+        expected = list(Message.objects.order_by("-accepted_at", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_other_users_do_not_see_the_messages(self):
+        other = User.objects.create_user(email="other@gmail.com", password="password@123")
+        self.client.force_authenticate(other)
+
+        response = self.client.get(reverse('messages-list'))
+
+        self.assertEqual(response.data["results"], [])
+
+    def test_backfill_copies_owner_from_api_key(self):
+        Message.objects.update(route=None, user=None)
+
+        call_command("backfill_message_owner", batch_size=4, stdout=StringIO())
+
+        self.assertFalse(Message.objects.filter(user__isnull=True).exists())
+        self.assertEqual(Message.objects.filter(user=self.user, route__isnull=False).count(), 15)
+
+
+class TestMessageSearch(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        apikey = APIKey.objects.get(id=keys["live"]["id"])
+        self.invoice, self.pricing, self.failed = Message.objects.bulk_create([
+            Message(apikey=apikey, route=route, user=self.user, recipient_emails="inbox@gmail.com",
+                    visitor_email="ada@example.com", subject="Invoice question",
+                    body={"name": "Ada", "message": "Where is my refund?"}),
+            Message(apikey=apikey, route=route, user=self.user, recipient_emails="sales@gmail.com",
+                    visitor_email="bob@example.com", subject="Pricing", body="Do you have a team plan?"),
+            Message(apikey=apikey, route=route, user=self.user, recipient_emails="inbox@gmail.com", status=Message.Status.FAILED,
+                    visitor_email="bob@example.com", subject="Pricing again", body="Hello?"),
+        ])
+        MessageSearchIndex.index_messages([self.invoice, self.pricing, self.failed])
+        self.client.force_authenticate(self.user)
+
+    def search(self, **params):
+        response = self.client.get(reverse('messages-list'), params)
+        return [m["id"] for m in response.data["results"]]
+
+    def test_search_uses_full_text_index(self):
+        self.assertTrue(MessageSearchIndex.is_available())
+
+        self.assertEqual(self.search(search="refund"), [self.invoice.id])
+        self.assertEqual(self.search(search="ada@example.com"), [self.invoice.id])
+        self.assertEqual(self.search(search="sales"), [self.pricing.id])
+        self.assertEqual(self.search(search="team pla"), [self.pricing.id])
+        self.assertEqual(sorted(self.search(search="pricing")), [self.pricing.id, self.failed.id])
+
+    def test_search_combines_with_status_filter(self):
+        self.assertEqual(self.search(search="pricing", status="failed"), [self.failed.id])
+
+    def test_short_words_and_stopwords_are_found(self):
+        self.assertEqual(self.search(search="is my"), [self.invoice.id])
+
+    def test_mysql_matches_ngram_phrases_and_falls_back_for_single_letters(self):
+        with mock.patch.object(connection, "vendor", "mysql"):
+            sql, params = MessageSearchIndex.match_sql(["hi ORD-42"])
+            self.assertIn("IN BOOLEAN MODE", sql)
+            self.assertEqual(params, ['+"hi" +"ORD-42"'])
+            self.assertTrue(MessageSearchIndex.can_match(["hi"]))
+            self.assertFalse(MessageSearchIndex.can_match(["a b"]))
+
+class TestMessageExport(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        route, _ = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        Message.objects.bulk_create([
+            Message(route=route, user=self.user, recipient_emails="inbox@gmail.com",
+                    visitor_email="visitor@gmail.com", subject=f"Hello {i}", body={"name": "Ada"},
+                    status="failed" if i % 3 == 0 else "sent")
+            for i in range(7)
+        ])
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('messages-export'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_csv_export_has_every_message(self):
+        response = self.export()
+
+        rows = list(csv.reader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:2], ["id", "uid"])
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(json.loads(rows[1][rows[0].index("body")]), {"name": "Ada"})
+
+    @override_settings(MESSAGE_EXPORT_CHUNK_SIZE=3)
+    def test_export_pages_through_every_message_by_id(self):
+        with self.assertNumQueries(3):
+            lines = b"".join(self.export(export_format="ndjson").streaming_content).decode().splitlines()
+
+        ids = [json.loads(line)["id"] for line in lines]
+        self.assertEqual(ids, sorted(Message.objects.values_list("id", flat=True)))
+
+    def test_csv_export_neutralises_formulas(self):
+        Message.objects.update(subject="=HYPERLINK(\"http://evil\")", visitor_email="@visitor")
+
+        rows = list(csv.reader(StringIO(b"".join(self.export().streaming_content).decode())))
+
+        self.assertEqual(rows[1][rows[0].index("subject")], "'=HYPERLINK(\"http://evil\")")
+        self.assertEqual(rows[1][rows[0].index("visitor_email")], "'@visitor")
+
+    def test_ndjson_export_follows_filters_and_gzip(self):
+        response = self.client.get(
+            reverse('messages-export'), {"export_format": "ndjson", "status": "failed"},
+            HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)["status"] for line in lines], ["failed"] * 3)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('messages-export'), {"export_format": "xml"})
+
+        self.assertEqual(response.status_code, 400)
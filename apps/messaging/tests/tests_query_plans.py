@@ -0,0 +1,149 @@
+import uuid
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from apps.analytics.models import MessageDailyStat
+from apps.core.models import Notification, NotificationType
+from apps.messaging.models import Message, Route
+
+User = get_user_model()
+
+
+def query_plan(queryset):
+    """EXPLAIN output of a queryset, one entry per plan step"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [{"detail": row[-1]} for row in cursor.fetchall()]
+        cursor.execute(f"EXPLAIN {sql}", params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def is_full_scan(step):
+    """reads the whole table, or walks a whole index without seeking into it"""
+    if connection.vendor == "sqlite":
+        return step["detail"].startswith("SCAN ")
+    return step.get("type") in ("ALL", "index")
+
+
+def is_index_scan(step):
+    """walks an index in its order, fine when a LIMIT stops it after a page"""
+    if connection.vendor == "sqlite":
+        return step["detail"].startswith("SCAN ") and " USING " in step["detail"]
+    return step.get("type") == "index"
+
+
+def is_sort(step):
+    if connection.vendor == "sqlite":
+        return "TEMP B-TREE" in step["detail"]
+    return "filesort" in (step.get("Extra") or "")
+
+
+class TestHotQueryPlans(TestCase):
+    '''
+    The queries below mirror the hot paths (delivery worker, message list,
+    dashboard, notifications). A query that stops using an index, or needs a
+    sort for a paginated ORDER BY, fails here instead of in production.
+    '''
+
+    USERS = 5
+    MESSAGES_PER_USER = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = timezone.now()
+        users = [User.objects.create_user(email=f"owner{i}@gmail.com", password="password@123")
+                 for i in range(cls.USERS)]
+        cls.user = users[0]
+        statuses = [Message.Status.SENT] * 6 + [
+            Message.Status.QUEUED, Message.Status.SENDING, Message.Status.FAILED]
+
+        # enough rows, spread over users and statuses, for the planner to pick
+        # the plans it would pick on a real table
+        for user in users:
+            route = Route.objects.create(user=user, label="contact", channel=Route.Channel.EMAIL)
+            messages = Message.objects.bulk_create([
+                Message(user=user, route=route, visitor_email="visitor@gmail.com", body={"text": "hi"},
+                        status=statuses[i % len(statuses)],
+                        sent_at=cls.now - timedelta(minutes=i) if i % len(statuses) < 6 else None,
+                        claimed_at=cls.now if i % len(statuses) == 7 else None)
+                for i in range(cls.MESSAGES_PER_USER)])
+            Notification.objects.bulk_create([
+                Notification(user=user, type=NotificationType.MESSAGE_SENT, title=f"Message {message.id}",
+                             message="sent", is_read=i % 3 != 0)
+                for i, message in enumerate(messages)])
+            MessageDailyStat.objects.bulk_create([
+                MessageDailyStat(user=user, route=route, day=(cls.now - timedelta(days=day)).date(),
+                                 status=status, count=day + 1)
+                for day in range(10) for status in (Message.Status.QUEUED, Message.Status.SENT)])
+
+        tables = [model._meta.db_table for model in (Message, Notification, MessageDailyStat)]
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+            else:
+                cursor.execute(f"ANALYZE TABLE {', '.join(tables)}")
+
+    def assertUsesIndex(self, queryset, ordered=False, index_scan=False):
+        """
+        `index_scan`: the query has no filter an index can seek with, walking
+        an index in order until the LIMIT is allowed
+        """
+        plan = query_plan(queryset)
+        self.assertFalse([step for step in plan if is_full_scan(step)
+                          and not (index_scan and is_index_scan(step))], f"full scan: {plan}")
+        if ordered:
+            self.assertFalse([step for step in plan if is_sort(step)], f"sort: {plan}")
+
+    # ---- delivery worker, DeliveryService
+    def test_claim_due_messages(self):
+        self.assertUsesIndex(
+            Message.objects.filter(status=Message.Status.QUEUED, next_attempt_at__lte=self.now)
+            .order_by("next_attempt_at", "id").values_list("id", flat=True)[:50],
+            ordered=True)
+
+    def test_release_stale_claims(self):
+        self.assertUsesIndex(Message.objects.filter(
+            status=Message.Status.SENDING, claimed_at__lt=self.now - timedelta(minutes=10)))
+
+    # ---- bulk send, BulkMessageListSerializer.create without RETURNING
+    def test_bulk_created_messages_read_back_by_uid(self):
+        self.assertUsesIndex(Message.objects.filter(
+            uid__in=[uuid.uuid4() for _ in range(50)]).order_by().values_list("uid", "id"))
+
+    # ---- MessageViewSet with MessagePagination
+    def test_message_list_page(self):
+        self.assertUsesIndex(
+            Message.objects.filter(user=self.user).order_by("-accepted_at", "-id")[:11],
+            ordered=True)
+
+    def test_staff_message_list_pages(self):
+        first = Message.objects.order_by("-accepted_at", "-id")
+        self.assertUsesIndex(first[:11], ordered=True, index_scan=True)
+        self.assertUsesIndex(first.filter(accepted_at__lt=self.now)[:11], ordered=True)
+        self.assertUsesIndex(first.filter(status=Message.Status.FAILED)[:11], ordered=True)
+
+    # ---- dashboard, analytics/services.py
+    def test_dashboard_rollup(self):
+        stats = MessageDailyStat.objects.filter(user=self.user)
+        self.assertUsesIndex(stats.filter(status=Message.Status.SENT, day__gte=self.now.date()))
+        self.assertUsesIndex(stats.filter(status=Message.Status.QUEUED).values("route_id"))
+
+    def test_dashboard_recent_activity(self):
+        self.assertUsesIndex(
+            Message.objects.filter(user=self.user).order_by("-sent_at")[:5], ordered=True)
+
+    # ---- NotificationListView with NotificationPagination
+    def test_notification_list_page(self):
+        notifications = Notification.objects.filter(user=self.user)
+        self.assertUsesIndex(notifications.order_by("-created_at", "-id")[:21], ordered=True)
+        self.assertUsesIndex(notifications.filter(is_read=False))
+
+    # ---- WebSocket replay, SSE and long poll, NotificationService.missed
+    def test_notifications_after_last_seen_id(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(user=self.user, id__gt=1).order_by("id")[:101], ordered=True)
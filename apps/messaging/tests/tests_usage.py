@@ -0,0 +1,66 @@
+import atexit
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from apps.key.models import APIKey
+from apps.messaging.models import UserUsage
+from apps.messaging.services.route_service import RouteService
+from apps.messaging.services.usage_service import UsageAccumulator
+
+User = get_user_model()
+
+
+class TestUsageAccumulator(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="owner@gmail.com", password="password@123")
+        route, keys = RouteService.create_route(
+            {"channel": "email", "label": "contact",
+             "config": {"recipient_emails": ["inbox@gmail.com"]}},
+            user=self.user)
+        self.apikey = APIKey.objects.get(id=keys["live"]["id"])
+        # flushed by the tests only, no background thread
+        self.accumulator = UsageAccumulator(background=False)
+
+    def test_counts_are_written_on_flush(self):
+        self.accumulator.record(self.user.id, self.apikey.id)
+        self.accumulator.record(self.user.id, self.apikey.id, count=2)
+        self.assertFalse(UserUsage.objects.filter(user=self.user).exists())
+
+        self.assertEqual(self.accumulator.flush(), 3)
+        self.assertIsNone(self.accumulator._timer)
+
+        usage = UserUsage.objects.get(user=self.user)
+        self.assertEqual(usage.total_requests, 3)
+        self.assertEqual(usage.requests_today, 3)
+        self.assertIsNotNone(usage.last_request_at)
+        self.apikey.refresh_from_db()
+        self.assertEqual(self.apikey.usage_count, 3)
+        self.assertIsNotNone(self.apikey.last_used_at)
+
+    def test_requests_today_starts_over_on_a_new_day(self):
+        UserUsage.objects.create(
+            user=self.user, total_requests=10, requests_today=4,
+            last_request_at=timezone.now() - timedelta(days=1))
+
+        self.accumulator.record(self.user.id, self.apikey.id)
+        self.accumulator.flush()
+
+        usage = UserUsage.objects.get(user=self.user)
+        self.assertEqual(usage.total_requests, 11)
+        self.assertEqual(usage.requests_today, 1)
+
+    def test_background_thread_starts_on_first_record(self):
+        accumulator = UsageAccumulator()
+        self.assertIsNone(accumulator._timer)
+
+        with mock.patch.object(threading.Thread, "start") as start, \
+                mock.patch.object(atexit, "register") as register:
+            accumulator.record(self.user.id, self.apikey.id)
+            accumulator.record(self.user.id, self.apikey.id)
+
+        start.assert_called_once()
+        register.assert_called_once_with(accumulator.flush)
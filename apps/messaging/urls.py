@@ -1,5 +1,6 @@
 from rest_framework.routers import DefaultRouter
-from .views import RouteViewSet, MessageViewSet, SendEmailWithApiKeyView, UserUsageView,RouteApiKeyViewSet
+from .views import (RouteViewSet, MessageViewSet, SendEmailWithApiKeyView, BulkSendEmailWithApiKeyView,
+                    UserUsageView, RouteApiKeyViewSet)
 from django.urls import path
 
 
@@ -12,5 +13,6 @@ router.register("messages", MessageViewSet, basename="messages")
 urlpatterns = [
   path('user-usage/', UserUsageView.as_view(), name='user-usage'),
   path("send-email/", SendEmailWithApiKeyView.as_view(), name="send-email"),
+  path("send-email/bulk/", BulkSendEmailWithApiKeyView.as_view(), name="send-email-bulk"),
 
 ] + router.urls
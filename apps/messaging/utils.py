@@ -1,5 +1,8 @@
-from django.core.cache import cache
+from django.db import transaction
+from apps.analytics.services import dashboard_cache
 
 
 def invalidate_dashboard_cache(user_id):
-    cache.delete(f"dashboard_metrics:{user_id}")
+    # bump the version once the change is committed, the previous metrics
+    # are served until one request has recomputed them
+    transaction.on_commit(lambda: dashboard_cache.invalidate(user_id))
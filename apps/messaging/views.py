@@ -1,5 +1,10 @@
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
@@ -8,18 +13,27 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.throttling import ScopedRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
-from apps.messaging.platforms.email.services import send_message_email, increment_user_usage
+from apps.messaging.platforms.email.services import extract_recipient_emails
 from apps.key.authentication import ApiKeyAuthentication
 from apps.key.models import APIKey
+from apps.analytics.services import record_message_stats
+from apps.core.pagination import MessagePagination
 
 from rest_framework.throttling import ScopedRateThrottle
 from apps.messaging.documentation.schemas import (user_usage_doc, route_docs, message_docs,
-                                                   send_email_with_apikey_doc, route_api_key_docs )
+                                                   send_email_with_apikey_doc, send_email_bulk_doc, route_api_key_docs )
 
 from .models import Route, Message, UserUsage
-from .serializers.main_serializers import RouteSerializer, ListMessageSerializer, MessageSerializer, UserUsageSerializer
+from .serializers.main_serializers import (RouteSerializer, ListMessageSerializer, MessageSerializer,
+                                           BulkMessageListSerializer, UserUsageSerializer,
+                                           MessageExportQuerySerializer)
 from .serializers.api_key_and_route_serializer import RouteApiKeySerializer
 from .utils import invalidate_dashboard_cache
+from .filters import MessageSearchFilter
+from .services.export_service import MessageExportService
+from .services.idempotency_service import IdempotencyService
+from .services.search_service import MessageSearchIndex
+from .services.usage_service import usage_accumulator
 
 @route_api_key_docs
 class RouteApiKeyViewSet(ModelViewSet):
@@ -111,22 +125,131 @@ class MessageViewSet(ReadOnlyModelViewSet):
     http_method_names = ['get']
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [SearchFilter]
-    search_fields = ['apikey__key_hash', 'recipient_emails', 'status']
+    pagination_class = MessagePagination
+    filter_backends = [MessageSearchFilter, DjangoFilterBackend]
+    filterset_fields = ['status']
+    # icontains fallback when the full text index is not available
+    search_fields = ['subject', 'visitor_email', 'recipient_emails']
 
     def get_queryset(self):
+        queryset = Message.objects.select_related("apikey")
         if self.request.user.is_staff:
-            return Message.objects.all()
-        return Message.objects.filter(apikey__user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
     def get_serializer_class(self):
         if self.action in ['list']:
             return ListMessageSerializer
         return super().get_serializer_class()
 
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def export(self, request, *args, **kwargs):
+        """All the filtered messages in one streamed CSV/NDJSON download"""
+        query = MessageExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        export_format = query.validated_data["export_format"]
+
+        queryset = self.filter_queryset(self.get_queryset())
+        compress = "gzip" in request.headers.get("Accept-Encoding", "")
+        content_type, extension = MessageExportService.FORMATS[export_format]
+
+        response = StreamingHttpResponse(
+            MessageExportService.stream(queryset, export_format, compress=compress),
+            content_type=f"{content_type}; charset=utf-8")
+        response["Content-Disposition"] = (
+            f'attachment; filename="messages-{timezone.now():%Y%m%d}.{extension}"')
+        if compress:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+
+class ApiKeySendView(GenericAPIView):
+    """
+    Shared part of the send endpoints: api key authentication, route checks,
+    Idempotency-Key replay and the transaction around `accept()`.
+    Subclasses implement `accept()` and return the 202 response.
+    """
+    authentication_classes = [ApiKeyAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    queryset = Message.objects.all()
+    serializer_class = MessageSerializer
+
+    def accept(self, request, apikey_obj, recipient_emails):
+        raise NotImplementedError
+
+    def post(self, request, *args, **kwargs):
+        apikey_obj = request.auth
+        route = apikey_obj.route
+
+        if not route or not route.is_active or route.channel.lower() != "email":
+            return Response({"detail": "Email route not active."}, status=400)
+
+        # a retried request with the same Idempotency-Key gets the original response
+        idempotency_key = request.headers.get(IdempotencyService.HEADER)
+        if idempotency_key:
+            if len(idempotency_key) > IdempotencyService.MAX_KEY_LENGTH:
+                return Response(
+                    {"detail": f"{IdempotencyService.HEADER} must be at most "
+                               f"{IdempotencyService.MAX_KEY_LENGTH} characters."},
+                    status=status.HTTP_400_BAD_REQUEST)
+            request_hash = IdempotencyService.fingerprint(request.data)
+            replay = IdempotencyService.replay(apikey_obj, idempotency_key, request_hash)
+            if replay is not None:
+                return replay
+
+        try:
+            # route config (list) first, legacy comma separated field as fallback
+            recipient_emails = ",".join(extract_recipient_emails(route))
+
+            with transaction.atomic():
+                # delivery happens in the `deliver_messages` worker, not in the request
+                response = self.accept(request, apikey_obj, recipient_emails)
+                if response.status_code != status.HTTP_202_ACCEPTED:
+                    return response
+
+                # invalidate cache
+                try:
+                    invalidate_dashboard_cache(apikey_obj.route.user.id)
+                except Exception as e:
+                    print(f"cache invalidation in route apikey {str(e)}")
+                    pass
+
+                if idempotency_key:
+                    IdempotencyService.store(
+                        apikey_obj, idempotency_key, request_hash,
+                        response.status_code, response.data)
+            return response
+
+        except IntegrityError as e:
+            if not idempotency_key:
+                # not a key collision, nothing to replay
+                print({"error": str(e)})
+                return Response(
+                    {"detail": f"An unexpected error occurred:{str(e)}", },
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            # a concurrent retry with the same key committed first, our messages were rolled back
+            replay = IdempotencyService.replay(
+                apikey_obj, idempotency_key, request_hash)
+            if replay:
+                return replay
+            return Response(
+                {"detail": "A request with the same Idempotency-Key is already being processed."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        except Exception as e:
+            print({"error": str(e)})
+            return Response(
+                {"detail": f"An unexpected error occurred:{str(e)}", },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 
 @send_email_with_apikey_doc
-class SendEmailWithApiKeyView(GenericAPIView):
+class SendEmailWithApiKeyView(ApiKeySendView):
     """
     8h97nIIS9JvC2Ez8zF7EWy91Ja240jCdCcXnjTzz2C4
 
@@ -145,20 +268,9 @@ class SendEmailWithApiKeyView(GenericAPIView):
     The recipient_email is derived from the route tied to the API key.
 
     """
-    authentication_classes = [ApiKeyAuthentication]
-    permission_classes = [IsAuthenticated]
-    throttle_classes = [ScopedRateThrottle]
     throttle_scope = 'send_email_with_apikey'
-    queryset = Message.objects.all()
-    serializer_class = MessageSerializer
-
-    def post(self, request, *args, **kwargs):
-        apikey_obj = request.auth
-        route = apikey_obj.route
-
-        if not route or not route.is_active or route.channel.lower() != "email":
-            return Response({"detail": "Email route not active."}, status=400)
 
+    def accept(self, request, apikey_obj, recipient_emails):
         serializer = self.get_serializer(data=request.data)
 
         if not serializer.is_valid():
@@ -167,38 +279,74 @@ class SendEmailWithApiKeyView(GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            recipient_emails = None  
-            if hasattr(route, "config") and route.config:
-                recipient_emails = route.config.get("recipient_emails", None)
-            if not recipient_emails:
-                recipient_emails = getattr(route, "recipients_emails", None)
+        message = serializer.save(
+            apikey=apikey_obj, route=apikey_obj.route, user_id=apikey_obj.route.user_id,
+            recipient_emails=recipient_emails, status=Message.Status.QUEUED)
+        record_message_stats([message], Message.Status.QUEUED)
+        MessageSearchIndex.index_messages([message])
+        transaction.on_commit(lambda: usage_accumulator.record(
+            apikey_obj.route.user_id, apikey_obj.id))
 
-            with transaction.atomic():
-                # invalidate cache
-                try:
-                    invalidate_dashboard_cache(apikey_obj.route.user.id)
-                except Exception as e:
-                    print(f"cache invalidation in route apikey {str(e)}")
-                    pass
+        return Response({
+            "detail": "Message queued for delivery.",
+            "status": message.status,
+            "preview_link": message.get_absolute_url(),
+            "api_key_prefix": apikey_obj.key_hash[:6]
+        }, status=status.HTTP_202_ACCEPTED)
 
-                message = serializer.save(
-                    apikey=apikey_obj, recipient_emails=recipient_emails)
-                print("initializing send email message")
-                send_message_email(message)
-                from .services.notification_service import MessagingNotificationService
-                MessagingNotificationService.message_sent(message)
-                # increment_user_usage(apikey_obj)
 
-                return Response({
-                    "detail": f"Message sent successfully.",
-                    "preview_link": message.get_absolute_url(),
-                    "api_key_prefix": apikey_obj.key_hash[:6]
-                }, status=status.HTTP_200_OK)
+@send_email_bulk_doc
+class BulkSendEmailWithApiKeyView(ApiKeySendView):
+    """
+    Queue up to MESSAGE_BULK_MAX_ITEMS messages in one request:
+    {"messages": [{visitor_email, subject, body, ...}, ...]}
 
-        except Exception as e:
-            print({"error": str(e)})
+    Items are validated individually, valid ones are queued even when others
+    are rejected. The response lists the result of every item by its index.
+    """
+    throttle_scope = 'send_email_bulk'
+
+    def accept(self, request, apikey_obj, recipient_emails):
+        items = request.data.get("messages") if isinstance(request.data, dict) else None
+        serializer = BulkMessageListSerializer(
+            child=MessageSerializer(), data=items,
+            max_length=settings.MESSAGE_BULK_MAX_ITEMS)
+
+        if not serializer.is_valid():
             return Response(
-                {"detail": f"An unexpected error occurred:{str(e)}", },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {"detail": "Validation failed", "errors": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
             )
+
+        messages = []
+        if serializer.valid_indexes:
+            messages = serializer.save(
+                apikey=apikey_obj, route=apikey_obj.route, user_id=apikey_obj.route.user_id,
+                recipient_emails=recipient_emails, status=Message.Status.QUEUED)
+            record_message_stats(messages, Message.Status.QUEUED)
+            MessageSearchIndex.index_messages(messages)
+            transaction.on_commit(lambda: usage_accumulator.record(
+                apikey_obj.route.user_id, apikey_obj.id, count=len(messages)))
+
+        results = [
+            {"index": index, "status": "rejected", "errors": errors}
+            for index, errors in serializer.item_errors.items()
+        ]
+        results += [
+            {"index": index, "status": message.status, "id": message.id,
+             "preview_link": message.get_absolute_url()}
+            for index, message in zip(serializer.valid_indexes, messages)
+        ]
+        results.sort(key=lambda result: result["index"])
+
+        data = {
+            "detail": f"{len(messages)} message(s) queued for delivery, "
+                      f"{len(serializer.item_errors)} rejected.",
+            "accepted": len(messages),
+            "rejected": len(serializer.item_errors),
+            "results": results,
+            "api_key_prefix": apikey_obj.key_hash[:6],
+        }
+        if not messages:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
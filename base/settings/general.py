@@ -169,9 +169,13 @@ if os.getenv('REDIS_URL'):
         },
     }
 else:
+    # without Redis, processes of the same host share a SQLite file, see apps/core/utils/channel_layer.py
     CHANNEL_LAYERS = {
         'default': {
-            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'BACKEND': 'apps.core.utils.channel_layer.SQLiteChannelLayer',
+            'CONFIG': {
+                'path': os.getenv('CHANNEL_LAYER_PATH', str(BASE_DIR / 'channels.sqlite3')),
+            },
         },
     }
 
@@ -179,6 +183,79 @@ OTP_EMAIL_EXPIRY_TIME = os.getenv('OTP_EMAIL_VERIFY_EXPIRY_TIME', '10')
 OTP_PASSWORD_EXPIRY_TIME = os.getenv('OTP_PASSWORD_RESET_EXPIRY_TIME', '10')
 FRONTEND_URL = os.environ.setdefault('FRONTEND_URL', 'http://localhost:3000')
 
+# pooled mail connections per process, see apps/core/utils/mail_pool.py
+EMAIL_POOL_SIZE = int(os.getenv('EMAIL_POOL_SIZE', '2'))
+EMAIL_POOL_MAX_IDLE = int(os.getenv('EMAIL_POOL_MAX_IDLE', '120'))  # seconds
+EMAIL_POOL_TIMEOUT = int(os.getenv('EMAIL_POOL_TIMEOUT', '30'))  # wait for a free connection
+
+# per process cache of authenticated api keys, see apps/key/cache.py
+APIKEY_AUTH_CACHE_SIZE = int(os.getenv('APIKEY_AUTH_CACHE_SIZE', '1024'))
+APIKEY_AUTH_CACHE_TTL = int(os.getenv('APIKEY_AUTH_CACHE_TTL', '30'))  # seconds
+APIKEY_AUTH_NEGATIVE_TTL = int(os.getenv('APIKEY_AUTH_NEGATIVE_TTL', '10'))  # unknown keys
+# seconds a revocation in another process may take to reach this one's cache
+APIKEY_AUTH_REVOCATION_CHECK_INTERVAL = int(os.getenv('APIKEY_AUTH_REVOCATION_CHECK_INTERVAL', '5'))
+
+# message delivery worker: python manage.py deliver_messages
+MESSAGE_DELIVERY_BATCH_SIZE = int(os.getenv('MESSAGE_DELIVERY_BATCH_SIZE', '50'))
+MESSAGE_DELIVERY_POLL_INTERVAL = float(os.getenv('MESSAGE_DELIVERY_POLL_INTERVAL', '2'))
+# messages of the same route sent over one SMTP session
+MESSAGE_DELIVERY_SESSION_SIZE = int(os.getenv('MESSAGE_DELIVERY_SESSION_SIZE', '20'))
+# failed deliveries are retried with exponential backoff (seconds) and jitter
+MESSAGE_RETRY_MAX_ATTEMPTS = int(os.getenv('MESSAGE_RETRY_MAX_ATTEMPTS', '5'))
+MESSAGE_RETRY_BASE_DELAY = int(os.getenv('MESSAGE_RETRY_BASE_DELAY', '60'))
+MESSAGE_RETRY_MAX_DELAY = int(os.getenv('MESSAGE_RETRY_MAX_DELAY', '3600'))
+# usage counters are kept in memory and written every USAGE_FLUSH_INTERVAL seconds
+# or once USAGE_FLUSH_THRESHOLD messages are pending, see apps/messaging/services/usage_service.py
+USAGE_FLUSH_INTERVAL = int(os.getenv('USAGE_FLUSH_INTERVAL', '30'))
+USAGE_FLUSH_THRESHOLD = int(os.getenv('USAGE_FLUSH_THRESHOLD', '100'))
+# max messages accepted by one send-email/bulk/ request
+MESSAGE_BULK_MAX_ITEMS = int(os.getenv('MESSAGE_BULK_MAX_ITEMS', '500'))
+# how long (seconds) a send response is replayed for the same Idempotency-Key header
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(60 * 60 * 24)))
+# seconds before a message stuck in "sending" (crashed worker) is queued again
+MESSAGE_DELIVERY_CLAIM_TIMEOUT = int(os.getenv('MESSAGE_DELIVERY_CLAIM_TIMEOUT', '600'))
+# dashboard metrics cache (seconds), see apps/core/utils/tiered_cache.py
+# fresh for DASHBOARD_CACHE_TTL, then served stale for up to DASHBOARD_CACHE_STALE_TTL while
+# one request recomputes, per process copies are kept for DASHBOARD_CACHE_LOCAL_TTL
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '60'))
+DASHBOARD_CACHE_STALE_TTL = int(os.getenv('DASHBOARD_CACHE_STALE_TTL', '600'))
+DASHBOARD_CACHE_LOCAL_TTL = int(os.getenv('DASHBOARD_CACHE_LOCAL_TTL', '5'))
+# check_delivery_latency alerts a route owner when the p95 accepted -> sent time of at least
+# MIN_COUNT messages over the last WINDOW minutes is above P95_MS
+DELIVERY_LATENCY_ALERT_P95_MS = int(os.getenv('DELIVERY_LATENCY_ALERT_P95_MS', str(5 * 60 * 1000)))
+DELIVERY_LATENCY_ALERT_WINDOW = int(os.getenv('DELIVERY_LATENCY_ALERT_WINDOW', '60'))
+DELIVERY_LATENCY_ALERT_MIN_COUNT = int(os.getenv('DELIVERY_LATENCY_ALERT_MIN_COUNT', '20'))
+# days a sent/failed message stays in the messages table per Profile.plan, older ones are moved
+# to gzipped NDJSON segments under MESSAGE_ARCHIVE_ROOT by `python manage.py archive_messages`
+MESSAGE_RETENTION_DAYS = {
+    'free': int(os.getenv('MESSAGE_RETENTION_DAYS_FREE', '30')),
+    'pro': int(os.getenv('MESSAGE_RETENTION_DAYS_PRO', '365')),
+    'enterprise': int(os.getenv('MESSAGE_RETENTION_DAYS_ENTERPRISE', '730')),
+}
+# outside MEDIA_ROOT on purpose, archived messages must never be served as media
+MESSAGE_ARCHIVE_ROOT = Path(os.getenv('MESSAGE_ARCHIVE_ROOT', BASE_DIR / 'archive' / 'messages'))
+MESSAGE_ARCHIVE_BATCH_SIZE = int(os.getenv('MESSAGE_ARCHIVE_BATCH_SIZE', '500'))
+# seconds the unread notification count of a user is cached, see apps/core/services/counter_service.py
+NOTIFICATION_UNREAD_CACHE_TTL = int(os.getenv('NOTIFICATION_UNREAD_CACHE_TTL', '300'))
+# most notifications replayed to a reconnecting WebSocket (?last_seen_id= / ?since=)
+NOTIFICATION_REPLAY_LIMIT = int(os.getenv('NOTIFICATION_REPLAY_LIMIT', '100'))
+# WebSocket notification frames arriving within this many milliseconds are sent together, 0 sends each at once
+NOTIFICATION_COALESCE_MS = int(os.getenv('NOTIFICATION_COALESCE_MS', '5'))
+# SSE (notifications/stream/) and long-poll (notifications/poll/) fallbacks of the WebSocket, seconds.
+# Both hold a worker thread while they wait. Under WSGI (PythonAnywhere) an open stream takes a whole
+# worker for up to MAX_DURATION, so SSE is off unless the app is served by daphne/ASGI with threads to
+# spare; the long poll holds one for at most LONG_POLL_TIMEOUT and is the fallback to use under WSGI.
+# Both read the database every POLL_INTERVAL for notifications of other processes, QUEUE_SIZE bounds
+# the events waiting per open stream
+NOTIFICATION_SSE_ENABLED = os.getenv('NOTIFICATION_SSE_ENABLED', 'False').lower() == 'true'
+NOTIFICATION_STREAM_HEARTBEAT = int(os.getenv('NOTIFICATION_STREAM_HEARTBEAT', '15'))
+NOTIFICATION_STREAM_POLL_INTERVAL = int(os.getenv('NOTIFICATION_STREAM_POLL_INTERVAL', '5'))
+NOTIFICATION_STREAM_MAX_DURATION = int(os.getenv('NOTIFICATION_STREAM_MAX_DURATION', '300'))
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv('NOTIFICATION_STREAM_QUEUE_SIZE', '100'))
+NOTIFICATION_LONG_POLL_TIMEOUT = int(os.getenv('NOTIFICATION_LONG_POLL_TIMEOUT', '10'))
+# rows read from the database (and written to the response) at a time by messages/export/
+MESSAGE_EXPORT_CHUNK_SIZE = int(os.getenv('MESSAGE_EXPORT_CHUNK_SIZE', '2000'))
+
 
 # debug toolbar
 if DEBUG:
@@ -210,6 +287,7 @@ REST_FRAMEWORK = {
         'register': '2/m',
         'login': '5/m',
         'send_email_with_apikey': '10/m',
+        'send_email_bulk': '10/m',
         "route":"20/day",
         "apikey":"20/day",
     }